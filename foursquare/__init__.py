@@ -15,10 +15,26 @@ except ImportError:
     except ImportError:
         import json
 
-import inspect
+import binascii
+import bisect
+import collections
+import copy
+import email.utils
+import fnmatch
+import gzip
+import hashlib
+import io
+import itertools
 import math
+import os
+import random
+import re
+import threading
+from concurrent import futures
 import time
 import sys
+import tempfile
+import weakref
 
 # 3rd party libraries that might not be present during initial install
 #  but we need to import for the version #
@@ -26,7 +42,7 @@ try:
     import requests
 
     from six.moves.urllib import parse
-    from six.moves import xrange
+    from six.moves import http_cookiejar, xrange
     import six
 
     # Monkey patch to requests' json using ujson when available;
@@ -35,6 +51,12 @@ try:
 except ImportError:
     pass
 
+# Incremental JSON parser, only needed for streamed responses
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 
 # Helpful for debugging what goes in and out
 NETWORK_DEBUG = False
@@ -74,9 +96,16 @@ API_ENDPOINT = "https://api.foursquare.com/v2"
 # Number of times to retry http requests
 NUM_REQUEST_RETRIES = 3
 
+# Exponential backoff between retries, in seconds
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+
 # Max number of sub-requests per multi request
 MAX_MULTI_REQUESTS = 5
 
+# Seconds an auto-batched GET waits for others to share its multi request
+AUTO_BATCH_WINDOW = 0.01
+
 # Timeout for GET/POST requests
 GET_TIMEOUT = 60
 POST_TIMEOUT = 60
@@ -87,6 +116,67 @@ USER_AGENT = u"https://pypi.org/project/foursquare/"
 # Change this if your Python distribution has issues with Foursquare's SSL cert
 VERIFY_SSL = True
 
+# Connection pool sizing for the shared keep-alive transport
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+
+# Bytes of an upload read and sent at a time
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Response headers a CassetteTransport records (fnmatch-style, case-insensitive)
+CASSETTE_HEADERS = (
+    "content-type",
+    "x-ratelimit-*",
+    "retry-after",
+    "etag",
+    "last-modified",
+    "cache-control",
+)
+# Params a CassetteTransport leaves out of cassettes and ignores when matching
+CASSETTE_REDACTED_PARAMS = ("client_id", "client_secret", "oauth_token")
+
+# Length of foursquare's rate limit window, used when no reset header is sent
+RATE_LIMIT_WINDOW = 3600
+# Calls a RateGovernor lets through back-to-back before pacing kicks in
+RATE_LIMIT_BURST = 10
+
+# Max entries held by a response cache backend
+CACHE_MAX_ENTRIES = 1024
+# Seconds a stale cached response with an ETag or Last-Modified is kept around
+# after its ttl, so it can be revalidated with a conditional GET
+CACHE_KEEP_STALE = 86400
+# Seconds a cached GET stays fresh, by path. Segments match fnmatch-style and
+# the first matching pattern wins. Paths with no match (or a ttl of 0) aren't cached.
+CACHE_TTLS = (
+    ("/venues/categories", 86400),
+    ("/events/categories", 86400),
+    ("/venues/search", 0),
+    ("/venues/explore", 0),
+    ("/venues/trending", 0),
+    ("/venues/suggestcompletion", 0),
+    ("/venues/managed", 0),
+    ("/venues/*", 3600),
+    ("/users/requests", 0),
+    ("/users/*", 600),
+)
+
+# Smallest tile, in degrees of latitude or longitude, a VenueCrawler subdivides
+CRAWL_MIN_SPAN = 0.0005
+
+# Seconds a VenueCompleter waits for the next keystroke before calling the API
+COMPLETION_DEBOUNCE = 0.1
+# Geohash characters a VenueCompleter keeps of ll (6 is a ~1.2km x 0.6km cell)
+COMPLETION_GEOHASH_PRECISION = 6
+# Locations a VenueCompleter keeps results for
+COMPLETION_MAX_CELLS = 256
+# Results venues.suggestcompletion returns when no limit is given
+SUGGEST_COMPLETION_LIMIT = 10
+
+# Seconds before a saved CategoryIndex is refreshed in the background
+CATEGORY_INDEX_MAX_AGE = 7 * 86400
+# Raw pages a pipeline queues for each of its worker processes
+PIPELINE_PAGES_PER_PROCESS = 2
+
 
 # Generic foursquare exception
 class FoursquareException(Exception):
@@ -134,6 +224,9 @@ class Other(FoursquareException):
     pass
 
 
+# Params every request carries, added by Requester._enrich_params
+_CONSTANT_PARAMS = frozenset(("v", "client_id", "client_secret", "oauth_token"))
+
 error_types = {
     "invalid_auth": InvalidAuth,
     "param_error": ParamError,
@@ -161,10 +254,17 @@ class Foursquare(object):
         lang=None,
         get_timeout=GET_TIMEOUT,
         post_timeout=POST_TIMEOUT,
+        transport=None,
+        auto_batch_window=None,
+        rate_governor=None,
+        retry_policy=None,
+        cache=None,
+        observers=None,
+        single_flight=False,
     ):
         """Sets up the api object"""
         # Set up OAuth
-        self.oauth = self.OAuth(client_id, client_secret, redirect_uri)
+        self.oauth = self.OAuth(client_id, client_secret, redirect_uri, transport)
         # Set up endpoints
         self.base_requester = self.Requester(
             client_id,
@@ -174,25 +274,76 @@ class Foursquare(object):
             lang,
             get_timeout,
             post_timeout,
+            transport,
+            auto_batch_window,
+            rate_governor,
+            retry_policy,
+            cache,
+            observers,
+            single_flight,
         )
-        # Dynamically enable endpoints
-        self._attach_endpoints()
-
-    def _attach_endpoints(self):
-        """Dynamically attach endpoint callables to this client"""
-        for name, endpoint in inspect.getmembers(self):
-            if (
-                inspect.isclass(endpoint)
-                and issubclass(endpoint, self._Endpoint)
-                and (endpoint is not self._Endpoint)
-            ):
-                endpoint_instance = endpoint(self.base_requester)
-                setattr(self, endpoint_instance.endpoint, endpoint_instance)
+        # Endpoints are attached lazily, see _LazyEndpoint
+
+    def __init_subclass__(cls, **kwargs):
+        """Registers the endpoints of subclasses, including any they add"""
+        super().__init_subclass__(**kwargs)
+        _register_endpoints(cls)
+
+    def _endpoint_class(self, name):
+        """The endpoint class this client uses for an endpoint name, or None"""
+        class_name = self._endpoints.get(name)
+        return getattr(self, class_name) if class_name else None
 
     def set_access_token(self, access_token):
         """Update the access token to use"""
         self.base_requester.set_token(access_token)
 
+    def for_token(self, access_token):
+        """
+        Returns a view of this client that calls the API as another user
+
+            user_api = api.for_token(USER_ACCESS_TOKEN)
+
+        Views share this client's transport, cache, rate governor, retry
+        policy and observers, and carry only their own token, lang and
+        version, so one client can cheaply serve many users from many threads.
+        """
+        return self._view(access_token=access_token)
+
+    def with_lang(self, lang):
+        """Returns a view of this client that asks for responses in lang"""
+        return self._view(lang=lang)
+
+    def with_version(self, version):
+        """Returns a view of this client that calls another API version"""
+        return self._view(version=version)
+
+    def _view(self, **changes):
+        """Cheap copy of this client with its own token, lang or version"""
+        requester = self.base_requester
+        view = object.__new__(self.__class__)
+        view.oauth = self.oauth
+        view.base_requester = requester._view(
+            changes.get("access_token", requester.oauth_token),
+            changes.get("lang", requester.lang),
+            changes.get("version", requester.version),
+        )
+        return view
+
+    def batch(self, max_workers=1):
+        """
+        Returns a new Batch that queues GET calls into /multi requests
+
+            with api.batch() as b:
+                venue = b.venues(VENUE_ID)
+                user = b.users(USER_ID)
+            venue.result()
+
+        Each batch owns its queue, so many threads can share one client.
+        max_workers > 1 sends that many /multi chunks concurrently.
+        """
+        return self.Batch(self, max_workers=max_workers)
+
     @property
     def rate_limit(self):
         """Returns the maximum rate limit for the last API call i.e. X-RateLimit-Limit"""
@@ -203,13 +354,28 @@ class Foursquare(object):
         """Returns the remaining rate limit for the last API call i.e. X-RateLimit-Remaining"""
         return self.base_requester.rate_remaining
 
+    @property
+    def rate_governor(self):
+        """Returns the RateGovernor pacing this client's calls, if any"""
+        return self.base_requester.rate_governor
+
+    @property
+    def single_flight(self):
+        """Returns the SingleFlight collapsing this client's identical GETs, if any"""
+        return self.base_requester.single_flight
+
     class OAuth(object):
         """Handles OAuth authentication procedures and helps retrieve tokens"""
 
-        def __init__(self, client_id, client_secret, redirect_uri):
+        def __init__(self, client_id, client_secret, redirect_uri, transport=None):
             self.client_id = client_id
             self.client_secret = client_secret
             self.redirect_uri = redirect_uri
+            self.transport = transport if transport else self._default_transport()
+
+        def _default_transport(self):
+            """Transport used when the client doesn't supply one"""
+            return default_transport()
 
         def auth_url(self):
             """Gets the url a user needs to access to give up a user token"""
@@ -227,6 +393,13 @@ class Foursquare(object):
             if not code:
                 log.error(u"Code not provided")
                 return None
+            # Get the response from the token uri and attempt to parse
+            return _get(
+                TOKEN_ENDPOINT, params=self._token_query(code), transport=self.transport
+            )["data"]["access_token"]
+
+        def _token_query(self, code):
+            """Query string of a token request, kept out of the quote memo"""
             params = {
                 "client_id": self.client_id,
                 "client_secret": self.client_secret,
@@ -234,8 +407,7 @@ class Foursquare(object):
                 "redirect_uri": self.redirect_uri,
                 "code": six.u(code),
             }
-            # Get the response from the token uri and attempt to parse
-            return _get(TOKEN_ENDPOINT, params=params)["data"]["access_token"]
+            return _foursquare_urlencode(params, memoize=False)
 
     class Requester(object):
         """Api requesting object"""
@@ -249,23 +421,85 @@ class Foursquare(object):
             lang=None,
             get_timeout=GET_TIMEOUT,
             post_timeout=POST_TIMEOUT,
+            transport=None,
+            auto_batch_window=None,
+            rate_governor=None,
+            retry_policy=None,
+            cache=None,
+            observers=None,
+            single_flight=False,
         ):
             """Sets up the api object"""
             self.client_id = client_id
             self.client_secret = client_secret
+            # True shares one governor between every client with these credentials
+            self._shared_governor = rate_governor is True
+            self.rate_governor = None if self._shared_governor else rate_governor
             self.set_token(access_token)
             self.version = version if version else API_VERSION
             self.lang = lang
             self.get_timeout = get_timeout
             self.post_timeout = post_timeout
+            # Shared by default so every client reuses the same warm connections
+            self.transport = transport if transport else self._default_transport()
+            self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+            self.cache = cache
+            # Told about every request's start, retries, response and errors
+            self.observers = list(observers) if observers else list()
             self.multi_requests = list()
+            self._multi_lock = threading.Lock()
+            self._constant_query = None
+            self._constant_query_key = None
             self.rate_limit = None
             self.rate_remaining = None
+            # Opt-in coalescing of plain GETs into /multi requests
+            self.auto_batcher = None
+            if auto_batch_window is not None:
+                self.auto_batcher = self._auto_batcher(auto_batch_window)
+            # Opt-in sharing of one call between identical concurrent GETs.
+            # True makes one for this client, or pass one to share it
+            self.single_flight = single_flight if single_flight else None
+            if single_flight is True:
+                self.single_flight = self._single_flight()
+
+        def _default_transport(self):
+            """Transport used when the client doesn't supply one"""
+            return default_transport()
+
+        def _auto_batcher(self, window):
+            """AutoBatcher used when auto batching is enabled"""
+            return AutoBatcher(self, window)
+
+        def _single_flight(self):
+            """SingleFlight used when single flight is enabled"""
+            return SingleFlight()
 
         def set_token(self, access_token):
             """Set the OAuth token for this requester"""
             self.oauth_token = access_token
             self.userless = not bool(access_token)  # Userless if no access_token
+            # Stands in for the token in cache keys, which may be written to disk
+            self._token_key = u"" if self.userless else _token_digest(access_token)
+            if self._shared_governor:
+                self.rate_governor = shared_rate_governor(
+                    self.client_id if self.userless else self.oauth_token
+                )
+
+        def _view(self, access_token, lang, version):
+            """Copy sharing this requester's transport, cache, governor..."""
+            view = copy.copy(self)
+            view.lang = lang
+            view.version = version
+            view.set_token(access_token)
+            view.multi_requests = list()
+            view._multi_lock = threading.Lock()
+            view._constant_query = None
+            view._constant_query_key = None
+            view.rate_limit = None
+            view.rate_remaining = None
+            if self.auto_batcher is not None:
+                view.auto_batcher = view._auto_batcher(self.auto_batcher.window)
+            return view
 
         def GET(self, path, params={}, **kwargs):
             """GET request that returns processed data"""
@@ -273,41 +507,219 @@ class Foursquare(object):
             # Short-circuit multi requests
             if kwargs.get("multi") is True:
                 return self.add_multi_request(path, params)
+            # Streamed responses are decoded item by item as they arrive
+            if kwargs.get("stream"):
+                return self._stream("get", path, kwargs["stream"], params=params)
+            # Identical GETs already in flight share their result
+            if self.single_flight is not None:
+                key = self._request_key(path, params)
+                return self.single_flight.do(key, self._fetch, path, params)
+            return self._fetch(path, params)
+
+        def _fetch(self, path, params):
+            """GET from the cache, the auto batcher or the network"""
+            # Serve read-only reference data from the cache when we can
+            cache_key, response, stale = self._cached(path, params)
+            if response is not None:
+                return response
+            # Coalesce with other GETs into a shared multi request
+            if self.auto_batcher is not None:
+                response = self.auto_batcher.submit(path, params).result()
+                return self._cache_batched(cache_key, path, response)
             # Continue processing normal requests
+            self._throttle()
+            result = _get(**self._get_request(path, params, stale))
+            return self._cache_result(cache_key, path, stale, result)
+
+        def _get_request(self, path, params, stale=None, process=None):
+            """Keyword arguments of the _get call for a GET"""
             headers = self._create_headers()
-            params = self._enrich_params(params)
-            url = "{API_ENDPOINT}{path}".format(API_ENDPOINT=API_ENDPOINT, path=path)
-            result = _get(url, headers=headers, params=params, timeout=self.get_timeout)
-            self.rate_limit = result["headers"]["X-RateLimit-Limit"]
-            self.rate_remaining = result["headers"]["X-RateLimit-Remaining"]
-            return result["data"]["response"]
+            if stale is not None:
+                headers.update(ResponseCache.validators(stale))
+            event = self._event("GET", path)
+            return dict(
+                url=self._url(path),
+                headers=headers,
+                params=self._encode_params(params, event),
+                timeout=self.get_timeout,
+                transport=self.transport,
+                retry_policy=self.retry_policy,
+                event=event,
+                process=process,
+            )
+
+        def _cached(self, path, params):
+            """Cache key of a GET, its fresh cached response and its stale entry"""
+            cache_key = self._cache_key(path, params)
+            if cache_key is None:
+                return None, None, None
+            response, stale = self.cache.lookup(cache_key)
+            return cache_key, response, stale
+
+        def _cache_batched(self, cache_key, path, response):
+            """Cache a response the auto batcher fetched and return it"""
+            if cache_key is not None:
+                self.cache.set(cache_key, path, response)
+            return response
+
+        def _cache_result(self, cache_key, path, stale, result):
+            """Payload of a GET result, refreshing or replacing its cache entry"""
+            if result["data"] is None:
+                # 304 Not Modified: the stale copy is good for another ttl
+                if "X-RateLimit-Remaining" in result["headers"]:
+                    self._record_rate_limit(result["headers"])
+                return self.cache.refresh(cache_key, path, stale)
+            response = self._unpack(result)
+            if cache_key is not None:
+                self.cache.set(cache_key, path, response, result["headers"])
+            return response
+
+        def _cache_key(self, path, params):
+            """Cache key for a GET, or None if it shouldn't be cached"""
+            if self.cache is None or not self.cache.ttl(path):
+                return None
+            return self._request_key(path, params)
+
+        def _request_key(self, path, params):
+            """Identifies a GET by its path, params, version, lang and token"""
+            # Userless responses don't depend on whose app asked for them
+            return u"{path}?{params}|{version}|{lang}|{token}".format(
+                path=path,
+                params=_foursquare_urlencode(sorted(params.items())),
+                version=self.version,
+                lang=self.lang or u"",
+                token=self._token_key,
+            )
 
         def add_multi_request(self, path, params={}):
             """Add multi request to list and return the number of requests added"""
-            url = path
-            if params:
-                # First convert the params into a query string then quote the whole string
-                # so it will fit into the multi request query -as a value for the requests= query param-
-                url += "?{0}".format(parse.quote_plus(parse.urlencode(params)))
-            self.multi_requests.append(url)
-            return len(self.multi_requests)
-
-        def POST(self, path, data={}, files=None):
-            """POST request that returns processed data"""
+            url = _multi_request_url(path, params)
+            with self._multi_lock:
+                self.multi_requests.append(url)
+                return len(self.multi_requests)
+
+        def pop_multi_requests(self, count=MAX_MULTI_REQUESTS):
+            """Atomically remove and return up to count queued multi requests"""
+            with self._multi_lock:
+                requests = self.multi_requests[:count]
+                del self.multi_requests[:count]
+                return requests
+
+        def POST(self, path, data={}, files=None, idempotent=False, stream=None):
+            """
+            POST request that returns processed data
+
+            Only idempotent POSTs (or every POST, if the retry policy opts in) are retried.
+            """
             if data is not None:
                 data = data.copy()
             if files is not None:
                 files = files.copy()
-            headers = self._create_headers()
-            data = self._enrich_params(data)
-            url = "{API_ENDPOINT}{path}".format(API_ENDPOINT=API_ENDPOINT, path=path)
-            result = _post(
-                url, headers=headers, data=data, files=files, timeout=self.post_timeout
+            if stream:
+                return self._stream(
+                    "post", path, stream, data=data, idempotent=idempotent
+                )
+            self._throttle()
+            return self._unpack(
+                _post(**self._post_request(path, data, files, idempotent))
+            )
+
+        def _post_request(self, path, data, files=None, idempotent=False):
+            """Keyword arguments of the _post call for a POST"""
+            return dict(
+                url=self._url(path),
+                headers=self._create_headers(),
+                data=self._enrich_params(data),
+                files=files,
+                timeout=self.post_timeout,
+                transport=self.transport,
+                retry_policy=self.retry_policy,
+                idempotent=idempotent,
+                event=self._event("POST", path),
+            )
+
+        def _event(self, method, path):
+            """RequestEvent for observers to follow, or None if nobody's watching"""
+            if self.observers:
+                return RequestEvent(method, path, self.observers)
+            return None
+
+        def _url(self, path):
+            """Full API url for an endpoint path"""
+            return "{API_ENDPOINT}{path}".format(API_ENDPOINT=API_ENDPOINT, path=path)
+
+        def _throttle(self):
+            """Wait for the rate governor to let the next call through"""
+            if self.rate_governor is not None:
+                delay = self.rate_governor.reserve()
+                if delay > 0:
+                    time.sleep(delay)
+
+        def _stream(
+            self, method, path, items, params=None, data=None, idempotent=False
+        ):
+            """
+            Generator over the items of a response, decoded as they arrive
+
+            items is the dotted path of the items within the response, in ijson's
+            prefix syntax (e.g. "checkins.items.item"), so peak memory stays flat
+            however large the response is.
+            """
+            self._throttle()
+            headers, body = _open_stream(
+                **self._stream_request(method, path, params, data, idempotent)
+            )
+            self._record_rate_limit(headers)
+            try:
+                for item in ijson.items(body, "response." + items, use_float=True):
+                    yield item
+            finally:
+                body.close()
+
+        def _stream_request(
+            self, method, path, params=None, data=None, idempotent=False
+        ):
+            """Keyword arguments of the _open_stream call for a streamed request"""
+            event = self._event(method.upper(), path)
+            return dict(
+                method=method,
+                url=self._url(path),
+                headers=self._create_headers(),
+                params=(
+                    self._encode_params(params, event) if params is not None else None
+                ),
+                data=self._enrich_params(data) if data is not None else None,
+                timeout=self.get_timeout if method == "get" else self.post_timeout,
+                transport=self.transport,
+                retry_policy=self.retry_policy,
+                retry=method == "get" or idempotent or self.retry_policy.retry_posts,
+                event=event,
             )
-            self.rate_limit = result["headers"]["X-RateLimit-Limit"]
-            self.rate_remaining = result["headers"]["X-RateLimit-Remaining"]
+
+        def _get_raw(self, path, params={}):
+            """GET that returns the undecoded body, e.g. for another process to parse"""
+            self._throttle()
+            return self._unpack_raw(
+                _get(**self._get_request(path, params, process=_raw_response))
+            )
+
+        def _unpack(self, result):
+            """Record the rate limit headers and return the response payload"""
+            self._record_rate_limit(result["headers"])
             return result["data"]["response"]
 
+        def _unpack_raw(self, result):
+            """Record the rate limit headers and return the undecoded body"""
+            self._record_rate_limit(result["headers"])
+            return result["data"]
+
+        def _record_rate_limit(self, headers):
+            """Record the rate limit headers of a response"""
+            self.rate_limit = headers["X-RateLimit-Limit"]
+            self.rate_remaining = headers["X-RateLimit-Remaining"]
+            if self.rate_governor is not None:
+                self.rate_governor.update(headers)
+
         def _enrich_params(self, params):
             """Enrich the params dict"""
             if self.version:
@@ -319,6 +731,37 @@ class Foursquare(object):
                 params["oauth_token"] = self.oauth_token
             return params
 
+        def _encode_params(self, params, event=None):
+            """
+            Query string for a GET: params plus the version and credentials
+
+            Same output as _foursquare_urlencode(self._enrich_params(params)),
+            but the constant version/credential part is only encoded once.
+            """
+            encode_started = time.perf_counter()
+            key = (
+                self.version,
+                self.userless,
+                self.client_id,
+                self.client_secret,
+                self.oauth_token,
+            )
+            if self._constant_query_key != key:
+                self._constant_query = _foursquare_urlencode(self._enrich_params({}))
+                self._constant_query_key = key
+            if not params:
+                query = self._constant_query
+            elif _CONSTANT_PARAMS.intersection(params):
+                # Overriding a constant param keeps its position in params
+                query = _foursquare_urlencode(self._enrich_params(params))
+            else:
+                query = _foursquare_urlencode(params)
+                if self._constant_query:
+                    query += "&" + self._constant_query
+            if event is not None:
+                event.timings["encode"] = time.perf_counter() - encode_started
+            return query
+
         def _create_headers(self):
             """Get the headers we need"""
             headers = {
@@ -329,6 +772,97 @@ class Foursquare(object):
                 headers["Accept-Language"] = self.lang
             return headers
 
+    class Batch(object):
+        """
+        Explicit, thread-safe /multi batch
+
+        Endpoints accessed through the batch (b.venues, b.users, ...) queue
+        their GET sub-requests and return a concurrent.futures.Future for each.
+        The futures are resolved with the response, or the exception for that
+        sub-request, when the batch is executed.
+        """
+
+        def __init__(self, client, max_workers=1):
+            self.client = client
+            self.max_workers = max_workers
+            self.requester = Foursquare._BatchRequester(self)
+            self._lock = threading.Lock()
+            self._queue = list()
+
+        def __getattr__(self, name):
+            endpoint_class = self.client._endpoint_class(name)
+            if endpoint_class is None:
+                raise AttributeError(name)
+            return endpoint_class(self.requester)
+
+        def __len__(self):
+            with self._lock:
+                return len(self._queue)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            if exc_type is None:
+                self.execute()
+            else:
+                self.cancel()
+
+        def add(self, path, params={}):
+            """Queue a GET sub-request and return the Future for its response"""
+            future = futures.Future()
+            url = _multi_request_url(path, params)
+            with self._lock:
+                self._queue.append((url, future))
+            return future
+
+        def _drain(self):
+            """Atomically take everything queued so far"""
+            with self._lock:
+                queue = self._queue
+                self._queue = list()
+            return queue
+
+        def cancel(self):
+            """Cancel every sub-request that hasn't been sent yet"""
+            for _, future in self._drain():
+                future.cancel()
+
+        def execute(self):
+            """Send the queued sub-requests and resolve their futures"""
+            queue = self._drain()
+            chunks = _chunked(queue, MAX_MULTI_REQUESTS)
+            try:
+                for index, responses in _map_chunks(
+                    self._process, chunks, self.max_workers, ordered=False
+                ):
+                    for (_, future), response in zip(chunks[index], responses):
+                        _resolve_future(future, response)
+            except BaseException as e:
+                _fail_futures([future for _, future in queue], e)
+                raise
+            _fail_futures([future for _, future in queue], _missing_sub_response())
+
+        def _process(self, chunk):
+            """Send one chunk, turning a failed /multi call into per-request errors"""
+            try:
+                return self.client.multi._process([url for url, _ in chunk])
+            except Exception as e:
+                return [e] * len(chunk)
+
+    class _BatchRequester(object):
+        """Requester stand-in that queues GETs onto a Batch"""
+
+        def __init__(self, batch):
+            self.batch = batch
+
+        def GET(self, path, params={}, **kwargs):
+            """Queue the GET on the batch instead of sending it"""
+            return self.batch.add(path, params)
+
+        def POST(self, path, *args, **kwargs):
+            raise ValueError(u"Only GET requests can be batched: {0}".format(path))
+
     class _Endpoint(object):
         """Generic endpoint class"""
 
@@ -350,6 +884,137 @@ class Foursquare(object):
             """Use the requester to post the data"""
             return self.requester.POST(self._expanded_path(path), *args, **kwargs)
 
+        def _many(self, ids, max_workers=1):
+            """
+            Each ID's details, keyed by ID, fetched MAX_MULTI_REQUESTS to a /multi
+
+            Duplicate IDs are fetched once and cached responses aren't fetched
+            at all; max_workers > 1 sends that many /multi requests concurrently.
+            Each value is the response, or the FoursquareException for that ID.
+            """
+            results, pending = self._many_pending(ids)
+            chunks = _chunked(pending, MAX_MULTI_REQUESTS)
+            for index, responses in _map_chunks(
+                self._many_process, chunks, max_workers, ordered=False
+            ):
+                for ID, response in zip(chunks[index], responses):
+                    results[ID] = self._many_store(ID, response)
+            return results
+
+        def _many_pending(self, ids):
+            """Results with cached responses filled in, and the IDs left to fetch"""
+            results = collections.OrderedDict()
+            pending = list()
+            for ID in ids:
+                if ID in results:
+                    continue
+                key = self._many_cache_key(ID)
+                results[ID] = self.requester.cache.get(key) if key else None
+                if results[ID] is None:
+                    pending.append(ID)
+            return results, pending
+
+        def _many_cache_key(self, ID):
+            """Cache key for an ID's details, or None if they aren't cached"""
+            if getattr(self.requester, "cache", None) is None:
+                return None
+            return self.requester._cache_key(self._many_path(ID), {})
+
+        def _many_path(self, ID):
+            """Path of an ID's details; IDs may be ints, as with __call__"""
+            return self._expanded_path(six.text_type(ID))
+
+        def _many_urls(self, chunk):
+            """Encoded /multi sub-request urls for a chunk of IDs"""
+            return [_multi_request_url(self._many_path(ID), {}) for ID in chunk]
+
+        def _many_process(self, chunk):
+            """Fetch one chunk, turning a failed /multi call into per-ID errors"""
+            try:
+                return _multi_post(self.requester, self._many_urls(chunk))
+            except FoursquareException as e:
+                return [e] * len(chunk)
+
+        def _many_store(self, ID, response):
+            """Cache a freshly fetched response and return it"""
+            key = self._many_cache_key(ID)
+            if key and not isinstance(response, FoursquareException):
+                self.requester.cache.set(key, self._many_path(ID), response)
+            return response
+
+        def _paged(self, path, key, limit, params={}, window=1, multi=False):
+            """
+            Generator over every item of an offset-paged list, in order
+
+            The first page tells us the total count, so the remaining pages are
+            then fetched up to window at a time, or packed MAX_MULTI_REQUESTS to
+            a /multi request when multi is set.
+            """
+            params = dict(params, limit=limit)
+            first = self.GET(path, dict(params, offset=0))[key]
+            for item in first["items"]:
+                yield item
+            offsets = _page_offsets(first["count"], len(first["items"]))
+            for page in self._pages(path, params, offsets, window, multi):
+                for item in _page_items(page, key):
+                    yield item
+
+        def _paged_forward(self, path, key, limit, params={}, window=1, multi=False):
+            """
+            Generator over every item of an offset-paged list, whatever its count says
+
+            Filters such as afterTimestamp leave count at the size of the whole
+            list, so pages are requested in order (window at a time, or packed
+            to /multi requests when multi is set) until one comes back empty or
+            shorter than limit.
+            """
+            params = dict(params, limit=limit)
+            offsets = itertools.count(0, limit)
+            for page in self._pages(path, params, offsets, window, multi):
+                items = _page_items(page, key)
+                for item in items:
+                    yield item
+                if len(items) < limit:
+                    return
+
+        def _pages(self, path, params, offsets, window=1, multi=False):
+            """Iterator over the page at each offset, in order; offsets may be endless"""
+            if not multi:
+                return _map_window(
+                    lambda o: self.GET(path, dict(params, offset=o)), offsets, window
+                )
+            batches = _map_window(
+                lambda chunk: _multi_post(self.requester, chunk),
+                self._page_chunks(path, params, offsets),
+                window,
+            )
+            return (page for batch in batches for page in batch)
+
+        def _page_chunks(self, path, params, offsets):
+            """The /multi sub-request urls of the page at each offset, in chunks"""
+            urls = (
+                _multi_request_url(self._expanded_path(path), dict(params, offset=o))
+                for o in offsets
+            )
+            return _lazy_chunks(urls, MAX_MULTI_REQUESTS)
+
+        def _pipelined(self, path, key, limit, transform, processes, window, params={}):
+            """
+            Generator over transform(item) for every item of an offset-paged list
+
+            Pages are fetched up to window at a time and handed over as raw bytes
+            to a pool of processes, which decode them and apply transform.
+            """
+            return _pipeline(
+                self._raw_pages(path, limit, params), key, transform, processes, window
+            )
+
+        def _raw_pages(self, path, limit, params={}):
+            """fetch(offset) returning the raw body of the page at offset"""
+            params = dict(params, limit=limit)
+            path = self._expanded_path(path)
+            return lambda o: self.requester._get_raw(path, dict(params, offset=o))
+
     class Users(_Endpoint):
         """User specific endpoint"""
 
@@ -359,6 +1024,10 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/users/users"""
             return self.GET("{USER_ID}".format(USER_ID=USER_ID), multi=multi)
 
+        def many(self, USER_IDS, max_workers=1):
+            """Utility function: Get many users, keyed by ID, via /multi"""
+            return self._many(USER_IDS, max_workers)
+
         """
         General
         """
@@ -371,29 +1040,81 @@ class Foursquare(object):
         Aspects
         """
 
-        def checkins(self, USER_ID=u"self", params={}, multi=False):
-            """https://developer.foursquare.com/docs/users/checkins"""
+        def checkins(self, USER_ID=u"self", params={}, multi=False, stream=False):
+            """
+            https://developer.foursquare.com/docs/users/checkins
+
+            With stream, returns a generator over the checkins as they are decoded.
+            """
             return self.GET(
-                "{USER_ID}/checkins".format(USER_ID=USER_ID), params, multi=multi
+                "{USER_ID}/checkins".format(USER_ID=USER_ID),
+                params,
+                multi=multi,
+                stream="checkins.items.item" if stream else None,
             )
 
-        def all_checkins(self, USER_ID=u"self"):
+        def all_checkins(self, USER_ID=u"self", window=1, multi=False):
             """Utility function: Get every checkin this user has ever made"""
-            offset = 0
-            while True:
-                checkins = self.checkins(
-                    USER_ID=USER_ID, params={"limit": 250, "offset": offset}
-                )
-                # Yield out each checkin
-                for checkin in checkins["checkins"]["items"]:
+            return self._paged(
+                "{USER_ID}/checkins".format(USER_ID=USER_ID),
+                "checkins",
+                250,
+                window=window,
+                multi=multi,
+            )
+
+        def sync_checkins(self, store, USER_ID=u"self", window=1, multi=False):
+            """
+            Utility function: Generator over the checkins made since the last sync
+
+            store remembers each user's high-water mark (the newest createdAt
+            synced) between runs: a MemoryCursorStore, FileCursorStore or any
+            object with get(key)/set(key, value). Only newer checkins are
+            requested, oldest first, and the mark is saved when the generator
+            finishes or is closed, covering every checkin it yielded.
+            """
+            cursor, args = self._checkins_sync(store, USER_ID)
+            try:
+                for checkin in self._paged_forward(*args, window=window, multi=multi):
+                    cursor.advance(checkin["createdAt"])
                     yield checkin
-                # Determine if we should stop here or query again
-                offset += len(checkins["checkins"]["items"])
-                if (offset >= checkins["checkins"]["count"]) or (
-                    len(checkins["checkins"]["items"]) == 0
-                ):
-                    # Break once we've processed everything
-                    break
+            finally:
+                cursor.save()
+
+        def _checkins_sync(self, store, USER_ID):
+            """A checkin sync's cursor, and the _paged_forward arguments it needs"""
+            cursor = _Cursor(store, self._cursor_key(u"checkins", USER_ID))
+            params = {"sort": u"oldestfirst"}
+            if cursor.start is not None:
+                params["afterTimestamp"] = cursor.start
+            path = "{USER_ID}/checkins".format(USER_ID=USER_ID)
+            return cursor, (path, "checkins", 250, params)
+
+        def map_checkins(
+            self, transform=None, USER_ID=u"self", processes=None, window=1
+        ):
+            """
+            Utility function: Generator over transform(checkin) for every checkin
+
+            Decoding and transform run in a pool of processes (one per core by
+            default) while the next pages download, so heavy post-processing
+            isn't held back by the GIL. transform must be picklable, e.g. a
+            module-level function, and gets each checkin as a dict.
+            """
+            return self._pipelined(
+                "{USER_ID}/checkins".format(USER_ID=USER_ID),
+                "checkins",
+                250,
+                transform,
+                processes,
+                window,
+            )
+
+        def _cursor_key(self, name, USER_ID):
+            """Cursor store key for a user; "self" is told apart by its token"""
+            if USER_ID == u"self":
+                USER_ID = u"self:" + _token_digest(self.requester.oauth_token)
+            return u"{0}:{1}".format(name, USER_ID)
 
         def lists(self, USER_ID=u"self", params={}, multi=False):
             """https://developer.foursquare.com/docs/users/lists"""
@@ -413,12 +1134,34 @@ class Foursquare(object):
                 "{USER_ID}/photos".format(USER_ID=USER_ID), params, multi=multi
             )
 
+        def all_photos(self, USER_ID=u"self", params={}, window=1, multi=False):
+            """Utility function: Get every photo this user has added"""
+            return self._paged(
+                "{USER_ID}/photos".format(USER_ID=USER_ID),
+                "photos",
+                500,
+                params,
+                window=window,
+                multi=multi,
+            )
+
         def tips(self, USER_ID=u"self", params={}, multi=False):
             """https://developer.foursquare.com/docs/users/tips"""
             return self.GET(
                 "{USER_ID}/tips".format(USER_ID=USER_ID), params, multi=multi
             )
 
+        def all_tips(self, USER_ID=u"self", params={}, window=1, multi=False):
+            """Utility function: Get every tip this user has left"""
+            return self._paged(
+                "{USER_ID}/tips".format(USER_ID=USER_ID),
+                "tips",
+                500,
+                params,
+                window=window,
+                multi=multi,
+            )
+
         def venuehistory(self, USER_ID=u"self", params={}, multi=False):
             """https://developer.foursquare.com/docs/users/venuehistory"""
             return self.GET(
@@ -451,10 +1194,23 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/users/unfriend"""
             return self.POST("{USER_ID}/unfriend".format(USER_ID=USER_ID))
 
-        def update(self, params={}, photo_data=None, photo_content_type="image/jpeg"):
-            """https://developer.foursquare.com/docs/users/update"""
+        def update(
+            self,
+            params={},
+            photo_data=None,
+            photo_content_type="image/jpeg",
+            progress=None,
+        ):
+            """
+            https://developer.foursquare.com/docs/users/update
+
+            photo_data may be bytes, a path, a binary file object or an iterable
+            of bytes; it is streamed. See Upload for progress.
+            """
             if photo_data:
-                files = {"photo": ("photo", photo_data, photo_content_type)}
+                files = {
+                    "photo": Upload(photo_data, photo_content_type, progress=progress)
+                }
             else:
                 files = None
             return self.POST("self/update", data=params, files=files)
@@ -472,6 +1228,10 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/venues/venues"""
             return self.GET("{VENUE_ID}".format(VENUE_ID=VENUE_ID), params, multi=multi)
 
+        def many(self, VENUE_IDS, max_workers=1):
+            """Utility function: Get many venues, keyed by ID, via /multi"""
+            return self._many(VENUE_IDS, max_workers)
+
         def add(self, params):
             """https://developer.foursquare.com/docs/venues/add"""
             return self.POST("add", params)
@@ -480,9 +1240,34 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/venues/categories"""
             return self.GET("categories", params, multi=multi)
 
-        def explore(self, params, multi=False):
-            """https://developer.foursquare.com/docs/venues/explore"""
-            return self.GET("explore", params, multi=multi)
+        def category_index(self, path=None, max_age=CATEGORY_INDEX_MAX_AGE):
+            """
+            Utility function: CategoryIndex of the venue category taxonomy
+
+            With a path, the index is loaded from there when it was saved for
+            this API version, refreshed in the background once older than
+            max_age seconds, and saved back after every fetch.
+            """
+            index = CategoryIndex.load(path, self.requester.version) if path else None
+            if index is None:
+                index = CategoryIndex()
+                index.refresh(self, path)
+            elif index.age() > max_age:
+                index.refresh_in_background(self, path)
+            return index
+
+        def explore(self, params, multi=False, stream=False):
+            """
+            https://developer.foursquare.com/docs/venues/explore
+
+            With stream, returns a generator over the recommended items as they are decoded.
+            """
+            return self.GET(
+                "explore",
+                params,
+                multi=multi,
+                stream="groups.item.items.item" if stream else None,
+            )
 
         def managed(self, multi=False):
             """https://developer.foursquare.com/docs/venues/managed"""
@@ -490,9 +1275,42 @@ class Foursquare(object):
 
         MAX_SEARCH_LIMIT = 50
 
-        def search(self, params, multi=False):
-            """https://developer.foursquare.com/docs/venues/search"""
-            return self.GET("search", params, multi=multi)
+        def search(self, params, multi=False, stream=False):
+            """
+            https://developer.foursquare.com/docs/venues/search
+
+            With stream, returns a generator over the venues as they are decoded.
+            """
+            return self.GET(
+                "search", params, multi=multi, stream="venues.item" if stream else None
+            )
+
+        def crawl(
+            self, sw, ne, params={}, window=1, min_span=CRAWL_MIN_SPAN, checkpoint=None
+        ):
+            """
+            Utility function: Generator over every venue in a bounding box
+
+            sw and ne are (lat, lng) corners. See VenueCrawler.
+            """
+            return self._crawler(sw, ne, params, window, min_span, checkpoint)
+
+        def _crawler(self, *args):
+            """VenueCrawler used by crawl"""
+            return VenueCrawler(self, *args)
+
+        def completer(
+            self,
+            debounce=COMPLETION_DEBOUNCE,
+            precision=COMPLETION_GEOHASH_PRECISION,
+            max_cells=COMPLETION_MAX_CELLS,
+        ):
+            """Utility function: Autocomplete over suggestcompletion. See VenueCompleter"""
+            return self._completer(debounce, precision, max_cells)
+
+        def _completer(self, *args):
+            """VenueCompleter used by completer"""
+            return VenueCompleter(self, *args)
 
         def suggestcompletion(self, params, multi=False):
             """https://developer.foursquare.com/docs/venues/suggestcompletion"""
@@ -540,6 +1358,17 @@ class Foursquare(object):
                 "{VENUE_ID}/photos".format(VENUE_ID=VENUE_ID), params, multi=multi
             )
 
+        def all_photos(self, VENUE_ID, params={}, window=1, multi=False):
+            """Utility function: Get every photo of this venue"""
+            return self._paged(
+                "{VENUE_ID}/photos".format(VENUE_ID=VENUE_ID),
+                "photos",
+                200,
+                params,
+                window=window,
+                multi=multi,
+            )
+
         def similar(self, VENUE_ID, multi=False):
             """https://developer.foursquare.com/docs/venues/similar"""
             return self.GET("{VENUE_ID}/similar".format(VENUE_ID=VENUE_ID), multi=multi)
@@ -554,6 +1383,17 @@ class Foursquare(object):
                 "{VENUE_ID}/tips".format(VENUE_ID=VENUE_ID), params, multi=multi
             )
 
+        def all_tips(self, VENUE_ID, params={}, window=1, multi=False):
+            """Utility function: Get every tip left at this venue"""
+            return self._paged(
+                "{VENUE_ID}/tips".format(VENUE_ID=VENUE_ID),
+                "tips",
+                500,
+                params,
+                window=window,
+                multi=multi,
+            )
+
         def nextvenues(self, VENUE_ID, params={}, multi=False):
             """https://developer.foursquare.com/docs/venues/nextvenues"""
             return self.GET(
@@ -611,9 +1451,15 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/checkins/add"""
             return self.POST("add", params)
 
-        def recent(self, params={}, multi=False):
-            """https://developer.foursquare.com/docs/checkins/recent"""
-            return self.GET("recent", params, multi=multi)
+        def recent(self, params={}, multi=False, stream=False):
+            """
+            https://developer.foursquare.com/docs/checkins/recent
+
+            With stream, returns a generator over the checkins as they are decoded.
+            """
+            return self.GET(
+                "recent", params, multi=multi, stream="recent.item" if stream else None
+            )
 
         """
         Actions
@@ -646,6 +1492,10 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/tips/tips"""
             return self.GET("{TIP_ID}".format(TIP_ID=TIP_ID), multi=multi)
 
+        def many(self, TIP_IDS, max_workers=1):
+            """Utility function: Get many tips, keyed by ID, via /multi"""
+            return self._many(TIP_IDS, max_workers)
+
         def add(self, params):
             """https://developer.foursquare.com/docs/tips/add"""
             return self.POST("add", params)
@@ -677,6 +1527,10 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/lists/lists"""
             return self.GET("{LIST_ID}".format(LIST_ID=LIST_ID), params, multi=multi)
 
+        def many(self, LIST_IDS, max_workers=1):
+            """Utility function: Get many lists, keyed by ID, via /multi"""
+            return self._many(LIST_IDS, max_workers)
+
         def add(self, params):
             """https://developer.foursquare.com/docs/lists/add"""
             return self.POST("add", params)
@@ -752,11 +1606,54 @@ class Foursquare(object):
             """https://developer.foursquare.com/docs/photos/photos"""
             return self.GET("{PHOTO_ID}".format(PHOTO_ID=PHOTO_ID), multi=multi)
 
-        def add(self, photo_data, params, photo_content_type="image/jpeg"):
-            """https://developer.foursquare.com/docs/photos/add"""
-            files = {"photo": ("photo", photo_data, photo_content_type)}
+        def many(self, PHOTO_IDS, max_workers=1):
+            """Utility function: Get many photos, keyed by ID, via /multi"""
+            return self._many(PHOTO_IDS, max_workers)
+
+        def add(
+            self, photo_data, params, photo_content_type="image/jpeg", progress=None
+        ):
+            """
+            https://developer.foursquare.com/docs/photos/add
+
+            photo_data may be bytes, a path, a binary file object or an iterable
+            of bytes; it is streamed. See Upload for progress.
+            """
+            files = {"photo": Upload(photo_data, photo_content_type, progress=progress)}
             return self.POST("add", data=params, files=files)
 
+        def add_many(
+            self, uploads, window=4, photo_content_type="image/jpeg", progress=None
+        ):
+            """
+            Utility function: Add each (photo_data, params) pair, window at a time
+
+            A generator over each upload's response or FoursquareException, in
+            order. uploads is consumed lazily, so it can be an endless stream.
+            progress is called as progress(index, bytes_sent, total_bytes).
+            """
+            return _map_window(
+                self._add_one,
+                (
+                    (index, upload, photo_content_type, progress)
+                    for index, upload in enumerate(uploads)
+                ),
+                window,
+            )
+
+        def _add_one(self, job):
+            """Add one photo of add_many, returning any error instead of raising"""
+            index, (photo_data, params), photo_content_type, progress = job
+            try:
+                return self.add(
+                    photo_data,
+                    params,
+                    photo_content_type,
+                    _indexed_progress(progress, index),
+                )
+            except FoursquareException as e:
+                return e
+
     class Settings(_Endpoint):
         """Setting specific endpoint"""
 
@@ -837,6 +1734,17 @@ class Foursquare(object):
                 "{PAGE_ID}/venues".format(PAGE_ID=PAGE_ID), params, multi=multi
             )
 
+        def all_venues(self, PAGE_ID, params={}, window=1, multi=False):
+            """Utility function: Get every venue managed by this page"""
+            return self._paged(
+                "{PAGE_ID}/venues".format(PAGE_ID=PAGE_ID),
+                "venues",
+                100,
+                params,
+                window=window,
+                multi=multi,
+            )
+
     class Multi(_Endpoint):
         """Multi request endpoint handler"""
 
@@ -845,31 +1753,62 @@ class Foursquare(object):
         def __len__(self):
             return len(self.requester.multi_requests)
 
-        def __call__(self):
+        def __call__(self, max_workers=1, as_completed=False, stream=False):
             """
             Generator to process the current queue of multi's
 
             note: This generator will yield both data and FoursquareException's
             The code processing this sequence must check the yields for their type.
             The exceptions should be handled by the calling code, or raised.
+
+            max_workers > 1 sends that many /multi chunks concurrently; responses
+            are still yielded in the order they were queued. With as_completed,
+            (index, response) pairs are yielded as soon as each chunk returns,
+            where index is the sub-request's position in the queue. With stream,
+            each sub-response is yielded as soon as it has been decoded.
             """
-            while self.requester.multi_requests:
+            if max_workers > 1 or as_completed:
+                for response in self._dispatch(max_workers, as_completed):
+                    yield response
+                return
+            while True:
                 # Pull n requests from the multi-request queue
-                requests = self.requester.multi_requests[:MAX_MULTI_REQUESTS]
-                del self.requester.multi_requests[:MAX_MULTI_REQUESTS]
-                # Process the 4sq multi request
-                params = {
-                    "requests": ",".join(requests),
-                }
-                responses = self.POST(data=params)["responses"]
-                # ... and yield out each individual response
+                requests = self.requester.pop_multi_requests(MAX_MULTI_REQUESTS)
+                if not requests:
+                    break
+                responses = (
+                    self._stream(requests) if stream else self._process(requests)
+                )
                 for response in responses:
-                    # Make sure the response was valid
-                    try:
-                        _raise_error_from_response(response)
-                        yield response["response"]
-                    except FoursquareException as e:
-                        yield e
+                    yield response
+
+        def _stream(self, requests):
+            """Send one 4sq multi request and decode each sub-response as it arrives"""
+            for response in self.POST(
+                data=_multi_data(requests), idempotent=True, stream="responses.item"
+            ):
+                yield _unpack_multi_response(response)
+
+        def _dispatch(self, max_workers, as_completed):
+            """Send the whole queue as concurrent chunks over a bounded pool"""
+            chunks = list()
+            while True:
+                requests = self.requester.pop_multi_requests(MAX_MULTI_REQUESTS)
+                if not requests:
+                    break
+                chunks.append(requests)
+            for index, responses in _map_chunks(
+                self._process, chunks, max_workers, ordered=not as_completed
+            ):
+                for offset, response in enumerate(responses):
+                    if as_completed:
+                        yield (index * MAX_MULTI_REQUESTS + offset, response)
+                    else:
+                        yield response
+
+        def _process(self, requests):
+            """Send one 4sq multi request and return each sub-response or exception"""
+            return _multi_post(self.requester, requests)
 
         @property
         def num_required_api_calls(self):
@@ -881,6 +1820,1831 @@ class Foursquare(object):
             )
 
 
+class _LazyEndpoint(object):
+    """
+    Descriptor that builds a client's endpoint on first access
+
+    The endpoint class is looked up by name on the client's own class, so
+    subclasses (AsyncFoursquare) get their overridden endpoint classes; see
+    Foursquare.__init_subclass__ for endpoint classes they add. The
+    instance is then stored on the client, shadowing this descriptor.
+    """
+
+    def __init__(self, name, class_name):
+        self.name = name
+        self.class_name = class_name
+
+    def __get__(self, client, owner=None):
+        if client is None:
+            return self
+        endpoint = getattr(client, self.class_name)(client.base_requester)
+        return client.__dict__.setdefault(self.name, endpoint)
+
+
+def _register_endpoints(cls):
+    """Build cls's endpoint registry and lazy attributes, inherited ones included"""
+    cls._endpoints = dict()
+    for class_name in dir(cls):
+        endpoint = getattr(cls, class_name)
+        if (
+            isinstance(endpoint, type)
+            and issubclass(endpoint, cls._Endpoint)
+            and endpoint is not cls._Endpoint
+        ):
+            cls._endpoints[endpoint.endpoint] = class_name
+            setattr(
+                cls, endpoint.endpoint, _LazyEndpoint(endpoint.endpoint, class_name)
+            )
+
+
+_register_endpoints(Foursquare)
+
+
+class Transport(object):
+    """
+    Pooled, keep-alive HTTP transport backed by a requests.Session
+
+    A single instance can be shared by any number of clients (e.g. one per
+    user token) so they all reuse the same connections to the API. Unless a
+    session is given, cookies are never kept, so nothing set for one user's
+    request is sent along with another's.
+    """
+
+    def __init__(
+        self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, session=None
+    ):
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(
+                http_cookiejar.DefaultCookiePolicy(allowed_domains=[])
+            )
+        self.session = session
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, **kwargs):
+        """Send a GET over the pooled session"""
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, headers=None, data=None, files=None, **kwargs):
+        """Send a POST over the pooled session, streaming any files"""
+        if files:
+            data = MultipartEncoder(data or {}, files)
+            headers = dict(headers or {}, **{"Content-Type": data.content_type})
+        return self.session.post(url, headers=headers, data=data, **kwargs)
+
+    def close(self):
+        """Close every pooled connection"""
+        self.session.close()
+
+
+class Upload(object):
+    """
+    A file to send in a multipart POST, read UPLOAD_CHUNK_SIZE bytes at a time
+
+    source may be bytes, a path, a file object or an iterable of bytes chunks,
+    so memory use doesn't grow with the size of the file. Files opened in
+    text mode are read through their underlying binary buffer. progress is
+    called as progress(bytes_sent, total_bytes) as chunks go out; total_bytes
+    is None when the size isn't known up front (iterables).
+    """
+
+    def __init__(
+        self, source, content_type=u"image/jpeg", filename=u"photo", progress=None
+    ):
+        self.source = source
+        self.content_type = content_type
+        self.filename = filename
+        self.progress = progress
+
+    def size(self):
+        """Bytes left to send, or None if unknown"""
+        if isinstance(self.source, six.binary_type):
+            return len(self.source)
+        if isinstance(self.source, six.string_types):
+            return os.path.getsize(self.source)
+        try:
+            f = self._file()
+            position = f.tell()
+            end = f.seek(0, os.SEEK_END)
+            f.seek(position)
+            return end - position
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+
+    def chunks(self):
+        """Generator over the bytes to send"""
+        total, sent = self.size(), 0
+        for chunk in self._read():
+            sent += len(chunk)
+            if self.progress is not None:
+                self.progress(sent, total)
+            yield chunk
+
+    def _read(self):
+        if isinstance(self.source, six.binary_type):
+            for start in xrange(0, len(self.source), UPLOAD_CHUNK_SIZE):
+                yield self.source[start : start + UPLOAD_CHUNK_SIZE]
+        elif isinstance(self.source, six.string_types):
+            with open(self.source, "rb") as f:
+                for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                    yield chunk
+        elif hasattr(self.source, "read"):
+            f = self._file()
+            while True:
+                chunk = f.read(UPLOAD_CHUNK_SIZE)
+                # Text streams without a buffer (StringIO) end with u"", not b""
+                if not chunk:
+                    break
+                yield _as_bytes(chunk)
+        else:
+            for chunk in self.source:
+                yield chunk
+
+    def _file(self):
+        """The file object to read, reaching past text mode to the bytes"""
+        if isinstance(self.source, io.TextIOBase):
+            return getattr(self.source, "buffer", self.source)
+        return self.source
+
+
+class MultipartEncoder(object):
+    """
+    multipart/form-data body that is generated while it is being sent
+
+    files maps field names to Uploads, or to (filename, source, content_type)
+    tuples. As with requests, fields whose value is None are left out and a
+    list value repeats its field once per item. Iterating yields the body in
+    chunks; len is its size in bytes, or None (sent chunked) when an upload's
+    size isn't known up front.
+    """
+
+    def __init__(self, fields, files):
+        boundary = binascii.hexlify(os.urandom(16)).decode("ascii")
+        self.content_type = u"multipart/form-data; boundary=" + boundary
+        self._parts = list()
+        for name, values in six.iteritems(fields):
+            if isinstance(values, (six.string_types, six.binary_type)) or not hasattr(
+                values, "__iter__"
+            ):
+                values = [values]
+            header = u'--{0}\r\nContent-Disposition: form-data; name="{1}"\r\n\r\n'
+            for value in values:
+                if value is None:
+                    continue
+                self._parts.append(
+                    (_as_bytes(header.format(boundary, name)), _as_bytes(value))
+                )
+        for name, upload in six.iteritems(files):
+            if not isinstance(upload, Upload):
+                filename, source, content_type = upload
+                upload = Upload(source, content_type, filename)
+            header = (
+                u"--{0}\r\n"
+                u'Content-Disposition: form-data; name="{1}"; filename="{2}"\r\n'
+                u"Content-Type: {3}\r\n\r\n"
+            )
+            self._parts.append(
+                (
+                    _as_bytes(
+                        header.format(
+                            boundary, name, upload.filename, upload.content_type
+                        )
+                    ),
+                    upload,
+                )
+            )
+        self._tail = _as_bytes(u"--{0}--\r\n".format(boundary))
+        # requests reads len to send a Content-Length instead of chunks
+        self.len = len(self._tail)
+        for header, value in self._parts:
+            size = value.size() if isinstance(value, Upload) else len(value)
+            if size is None or self.len is None:
+                self.len = None
+            else:
+                self.len += len(header) + size + 2
+
+    def __iter__(self):
+        for header, value in self._parts:
+            yield header
+            if isinstance(value, Upload):
+                for chunk in value.chunks():
+                    yield chunk
+            else:
+                yield value
+            yield b"\r\n"
+        yield self._tail
+
+
+class CassetteMiss(LookupError):
+    """A CassetteTransport replaying a cassette was sent an unrecorded request"""
+
+    pass
+
+
+class CassetteTransport(object):
+    """
+    Records API traffic to a cassette file, and replays it offline
+
+        transport = foursquare.CassetteTransport(u"venues.json.gz", mode=u"once")
+        client = foursquare.Foursquare(access_token=ACCESS_TOKEN, transport=transport)
+        ...
+        transport.close()  # Saves what was recorded
+
+    Modes: "record" sends every request through `transport` and records it,
+    "replay" only ever answers from the cassette (raising CassetteMiss for
+    anything it doesn't have), and "once" replays the cassette if it exists
+    and records it otherwise.
+
+    Requests match on method, path, query and form fields, including /multi
+    POSTs' requests=, but not on credentials, which are never recorded either.
+    Repeats of a request replay its recorded responses in turn, starting over
+    after the last. Cassettes are JSON, gzipped when the path ends in .gz.
+
+    Replays can be slowed by `latency` seconds each, and error_rate of them
+    (picked by a `seed`ed random generator) answered instead with an error
+    status from `errors`.
+    """
+
+    def __init__(
+        self,
+        path,
+        mode=u"replay",
+        transport=None,
+        latency=0,
+        error_rate=0,
+        errors=(500, 503, 429),
+        seed=None,
+    ):
+        self.path = path
+        if mode == u"once":
+            mode = u"replay" if os.path.exists(path) else u"record"
+        if mode not in (u"record", u"replay"):
+            raise ValueError(u"Unknown cassette mode: {0}".format(mode))
+        self.mode = mode
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = errors
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._interactions = collections.OrderedDict()
+        self._cursors = dict()
+        if mode == u"record":
+            self.transport = transport if transport else self._default_transport()
+        else:
+            self.transport = None
+            self.load()
+
+    def _default_transport(self):
+        """Transport recordings are made through when none is given"""
+        return default_transport()
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        key = self._key("GET", url, params)
+        if self.mode == u"replay":
+            return self._replay_response(key)
+        response = self.transport.get(url, headers=headers, params=params, **kwargs)
+        return self._record_response(key, response)
+
+    def post(self, url, headers=None, data=None, files=None, **kwargs):
+        key = self._key("POST", url, data=data)
+        if self.mode == u"replay":
+            return self._replay_response(key)
+        response = self.transport.post(
+            url, headers=headers, data=data, files=files, **kwargs
+        )
+        return self._record_response(key, response)
+
+    def close(self):
+        """Save the cassette, if recording"""
+        if self.mode == u"record":
+            self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _key(self, method, url, params=None, data=None):
+        """What a request is matched on: everything but its credentials"""
+        url = parse.urlsplit(url)
+        fields = parse.parse_qsl(params or url.query, keep_blank_values=True)
+        if isinstance(data, dict):
+            fields += [(k, six.text_type(v)) for k, v in data.items()]
+        fields = sorted((k, v) for k, v in fields if k not in CASSETTE_REDACTED_PARAMS)
+        return u"{0} {1}?{2}".format(method, url.path, parse.urlencode(fields))
+
+    def _record(self, key, status_code, headers, content):
+        """Add a response to the cassette and return it as replayed"""
+        recorded_headers = dict(
+            (k, v)
+            for k, v in headers.items()
+            if any(fnmatch.fnmatch(k.lower(), p) for p in CASSETTE_HEADERS)
+        )
+        interaction = {
+            "status": status_code,
+            "headers": recorded_headers,
+            "body": content.decode("utf-8", "replace"),
+        }
+        with self._lock:
+            self._interactions.setdefault(key, list()).append(interaction)
+        return interaction
+
+    def _replay(self, key):
+        """The next recorded (or injected) response to a request"""
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise CassetteMiss(u"Not in {0}: {1}".format(self.path, key))
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = (index + 1) % len(interactions)
+            inject = self.error_rate and self._random.random() < self.error_rate
+            status = self._random.choice(self.errors) if inject else None
+        if status is not None:
+            return _injected_error(status)
+        return interactions[index]
+
+    def _delay(self):
+        """Seconds to hold each replayed response back"""
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _record_response(self, key, response):
+        interaction = self._record(
+            key, response.status_code, response.headers, response.content
+        )
+        return _CassetteResponse(interaction)
+
+    def _replay_response(self, key):
+        interaction = self._replay(key)
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return _CassetteResponse(interaction)
+
+    def load(self):
+        """Read the cassette at path"""
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rb") as f:
+            cassette = json.loads(f.read().decode("utf-8"))
+        with self._lock:
+            self._interactions = collections.OrderedDict(
+                (item["request"], item["responses"])
+                for item in cassette["interactions"]
+            )
+            self._cursors = dict()
+
+    def save(self):
+        """Write everything recorded to the cassette at path"""
+        with self._lock:
+            cassette = {
+                "version": 1,
+                "interactions": [
+                    {"request": key, "responses": responses}
+                    for key, responses in self._interactions.items()
+                ],
+            }
+        data = json.dumps(cassette).encode("utf-8")
+        if self.path.endswith(".gz"):
+            data = gzip.compress(data)
+        _write_atomically(self.path, data)
+
+
+class _CassetteResponse(object):
+    """requests.Response stand-in for a recorded interaction"""
+
+    def __init__(self, interaction):
+        self.status_code = interaction["status"]
+        self.headers = requests.structures.CaseInsensitiveDict(interaction["headers"])
+        self.content = interaction["body"].encode("utf-8")
+        # What _open_stream reads streamed responses from
+        self.raw = io.BytesIO(self.content)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AutoBatcher(object):
+    """
+    Transparently merges plain GETs into /multi requests
+
+    The first GET submitted opens a window of `window` seconds; every GET
+    submitted before it closes, up to MAX_MULTI_REQUESTS, is sent along in the
+    same multi request. Each submitter gets a Future for its own sub-response.
+    """
+
+    def __init__(
+        self, requester, window=AUTO_BATCH_WINDOW, max_size=MAX_MULTI_REQUESTS
+    ):
+        self.requester = requester
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._queue = list()
+        self._timer = None
+
+    def submit(self, path, params={}):
+        """Queue a GET and return the Future for its response"""
+        future = futures.Future()
+        url = _multi_request_url(path, params)
+        with self._lock:
+            self._queue.append((url, future))
+            if len(self._queue) >= self.max_size:
+                queue = self._take()
+            else:
+                queue = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        # A full batch is sent right away, on the submitting thread
+        if queue:
+            self._send(queue)
+        return future
+
+    def flush(self):
+        """Send whatever is queued without waiting for the window to close"""
+        with self._lock:
+            queue = self._take()
+        if queue:
+            self._send(queue)
+
+    def _take(self):
+        """Take the queue and close the window. Must hold the lock"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        queue = self._queue
+        self._queue = list()
+        return queue
+
+    def _send(self, queue):
+        """Send one multi request and resolve each submitter's future"""
+        try:
+            responses = _multi_post(self.requester, [url for url, _ in queue])
+        except Exception as e:
+            # Nobody else will settle these futures, so never leave one pending
+            responses = [e] * len(queue)
+        for (_, future), response in zip(queue, responses):
+            _resolve_future(future, response)
+
+
+class SingleFlight(object):
+    """
+    Collapses identical concurrent calls into one
+
+    While a call for a key is in flight, any other thread calling with the
+    same key waits for it and gets its result or exception instead of making
+    its own. Each waiter gets its own deep copy of the result, so one caller
+    mutating a response can't change another's. `collapsed` counts the calls
+    that were spared that way.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()
+        self.collapsed = 0
+
+    def do(self, key, function, *args):
+        """Returns function(*args), sharing the call with others for key"""
+        future, leader = self._join(key, futures.Future)
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Even after a KeyboardInterrupt, later calls must start a new flight
+            self._forget(key)
+
+    def _join(self, key, start):
+        """The call in flight for key, or one from start(); and whether it's new"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.collapsed += 1
+                return call, False
+            call = self._calls[key] = start()
+            return call, True
+
+    def _forget(self, key):
+        """Let later calls for key start a new flight"""
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self):
+        """Collapsed/in flight counters, e.g. for a dashboard"""
+        with self._lock:
+            return {"collapsed": self.collapsed, "in_flight": len(self._calls)}
+
+
+class RetryPolicy(object):
+    """
+    Decides whether, and after how long, a failed request is retried
+
+    Delays grow exponentially from base_delay up to max_delay with full
+    jitter, so workers that failed together don't retry together. A
+    Retry-After header on a 429/503 response is honored instead. No retry is
+    scheduled past `deadline` seconds after the first attempt. Errors whose
+    errorType is in no_retry_error_types are never retried.
+    """
+
+    no_retry_error_types = (
+        "invalid_auth",
+        "param_error",
+        "endpoint_error",
+        "not_authorized",
+        "deprecated",
+    )
+
+    def __init__(
+        self,
+        max_attempts=NUM_REQUEST_RETRIES,
+        base_delay=RETRY_BASE_DELAY,
+        max_delay=RETRY_MAX_DELAY,
+        deadline=None,
+        retry_posts=False,
+        no_retry_error_types=None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_posts = retry_posts
+        if no_retry_error_types is not None:
+            self.no_retry_error_types = no_retry_error_types
+        self._no_retry = tuple(error_types[name] for name in self.no_retry_error_types)
+
+    def should_retry(self, e, attempt):
+        """Whether the exception from a (zero-based) attempt is worth another try"""
+        # Some errors don't bear repeating
+        if e.__class__ in self._no_retry:
+            return False
+        # If we've reached our last try, give up
+        return (attempt + 1) < self.max_attempts
+
+    def delay(self, e, attempt):
+        """Seconds to wait before retrying after the given attempt"""
+        if getattr(e, "status_code", None) in (429, 503):
+            retry_after = _parse_retry_after(
+                getattr(e, "headers", {}).get("Retry-After")
+            )
+            if retry_after is not None:
+                return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def backoff(self, e, attempt, started):
+        """Seconds to wait before the next attempt, or None to give up"""
+        if not self.should_retry(e, attempt):
+            return None
+        delay = self.delay(e, attempt)
+        if self.deadline is not None and time.time() + delay - started > self.deadline:
+            return None
+        return delay
+
+
+class _Attempts(object):
+    """
+    Retry bookkeeping of one request, shared by the blocking and asyncio loops
+
+    The loop only sends and sleeps; failed() decides whether and when there
+    is another attempt, and every step is told to the request's observers.
+    """
+
+    def __init__(self, retry_policy=None, retry=True, event=None):
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.retry = retry
+        self.event = event
+        self.started = time.time()
+        self.attempt = 0
+        if event is not None:
+            event.fire("start")
+
+    def succeeded(self, result):
+        """Tell the observers the request succeeded, and return its result"""
+        if self.event is not None:
+            self.event.fire("response")
+        return result
+
+    def failed(self, e):
+        """Seconds to wait before the next attempt, or None to give up"""
+        delay = None
+        if self.retry:
+            delay = self.retry_policy.backoff(e, self.attempt, self.started)
+        if self.event is not None:
+            self.event.error = e
+            self.event.fire("error" if delay is None else "retry", delay=delay)
+        if delay is not None:
+            self.attempt += 1
+            if self.event is not None:
+                self.event.next_attempt()
+        return delay
+
+
+class RateGovernor(object):
+    """
+    Token bucket that paces calls to stay under foursquare's rate limit
+
+    The refill rate is re-derived from the X-RateLimit-Remaining (and, when
+    sent, X-RateLimit-Reset) headers of every response, so the calls left in
+    the window are spread evenly over the time left in it. Calls are delayed,
+    never refused. One instance may be shared by any number of threads and clients.
+    """
+
+    def __init__(self, window=RATE_LIMIT_WINDOW, burst=RATE_LIMIT_BURST):
+        self.window = window
+        self.burst = burst
+        self._lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self._rate = None  # Tokens per second, None until we've seen headers
+        self._tokens = float(burst)
+        self._last = time.time()
+        self.calls = 0
+        self.delayed = 0
+        self.total_delay = 0.0
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it"""
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            self._tokens -= 1
+            self.calls += 1
+            if self._tokens >= 0:
+                return 0
+            if self._rate:
+                delay = -self._tokens / self._rate
+            else:
+                # Out of quota: hold everything until the window resets
+                delay = max((self.reset or now + self.window) - now, 0)
+            self.delayed += 1
+            self.total_delay += delay
+            return delay
+
+    def update(self, headers):
+        """Re-derive the refill rate from a response's X-RateLimit headers"""
+        try:
+            limit = int(headers["X-RateLimit-Limit"])
+            remaining = int(headers["X-RateLimit-Remaining"])
+        except (KeyError, TypeError, ValueError):
+            return
+        reset = headers.get("X-RateLimit-Reset")
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            self.limit = limit
+            self.remaining = remaining
+            try:
+                self.reset = float(reset)
+            except (TypeError, ValueError):
+                self.reset = None
+            seconds_left = (self.reset or now + self.window) - now
+            self._rate = remaining / max(seconds_left, 1.0)
+            # Never hand out more tokens than the server says we have left
+            self._tokens = min(self._tokens, float(remaining))
+
+    def _refill(self, now):
+        """Accrue tokens for the time elapsed. Must hold the lock"""
+        if self._rate is None:
+            # Nothing known about the quota yet, don't pace
+            self._tokens = max(self._tokens, 1.0)
+        elif self.reset is not None and now >= self.reset:
+            # A new window has begun with a full quota
+            self._rate = self.limit / float(self.window)
+            self._tokens = max(self._tokens, float(min(self.burst, self.limit)))
+            self.reset = None
+        else:
+            self._tokens = min(
+                self._tokens + (now - self._last) * self._rate, self.burst
+            )
+        self._last = now
+
+    def state(self):
+        """Snapshot of the governor, e.g. for a dashboard"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "remaining": self.remaining,
+                "reset": self.reset,
+                "rate": self._rate,
+                "tokens": self._tokens,
+                "calls": self.calls,
+                "delayed": self.delayed,
+                "total_delay": self.total_delay,
+            }
+
+
+class RequestEvent(object):
+    """
+    What an observer is told about a request
+
+    timings holds seconds spent per phase: "encode" (building the query
+    string), "request" (sending it until the response headers arrived,
+    including any connection setup), "download" (reading the body), "decode"
+    (parsing the JSON) and "error" (turning an error response into an
+    exception). Only the phases a request went through are present.
+    Connection setup isn't a phase of its own: requests (urllib3) doesn't
+    report it, and pooled keep-alive connections mostly skip it anyway.
+
+    timings, status and the response details describe the current attempt
+    (attempt, zero-based): observers see each failed attempt's on_retry
+    before they are cleared for the next one. duration spans every attempt.
+    """
+
+    def __init__(self, method, path, observers):
+        self.method = method
+        self.path = path
+        self.observers = observers
+        self.attempt = 0
+        self.status = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.timings = dict()
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.error = None
+        self.delay = None
+        self.started = time.time()
+
+    @property
+    def duration(self):
+        """Seconds since the request started"""
+        return time.time() - self.started
+
+    def next_attempt(self):
+        """Clear what the failed attempt recorded, before it is retried"""
+        self.attempt += 1
+        # The query string is only encoded once, ahead of the first attempt
+        self.timings = dict(
+            (phase, seconds)
+            for phase, seconds in self.timings.items()
+            if phase == "encode"
+        )
+        self.status = None
+        self.response_bytes = 0
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.error = None
+        self.delay = None
+
+    def record_rate_limit(self, headers):
+        self.rate_limit = headers.get("X-RateLimit-Limit")
+        self.rate_remaining = headers.get("X-RateLimit-Remaining")
+
+    def fire(self, kind, delay=None):
+        """Call on_<kind>(event) on every observer"""
+        self.delay = delay
+        for observer in self.observers:
+            try:
+                getattr(observer, "on_" + kind)(self)
+            except Exception:
+                # A broken observer must never break the request itself
+                log.exception(u"Request observer %r failed", observer)
+
+
+class Observer(object):
+    """
+    Base class for request observers; override the events you care about
+
+    Pass observers to the client to have them called on every request:
+
+        client = Foursquare(access_token=TOKEN, observers=[LoggingObserver()])
+    """
+
+    def on_start(self, event):
+        pass
+
+    def on_retry(self, event):
+        pass
+
+    def on_response(self, event):
+        pass
+
+    def on_error(self, event):
+        pass
+
+
+class LoggingObserver(Observer):
+    """Logs every request through the stdlib logging module"""
+
+    def __init__(self, logger=log, level=logging.DEBUG):
+        self.logger = logger
+        self.level = level
+
+    def on_response(self, event):
+        self.logger.log(
+            self.level,
+            u"%s %s %s in %.1fms (%d bytes, %s/%s remaining) %s",
+            event.method,
+            event.path,
+            event.status,
+            event.duration * 1000,
+            event.response_bytes,
+            event.rate_remaining,
+            event.rate_limit,
+            u" ".join(
+                u"{0}={1:.1f}ms".format(phase, seconds * 1000)
+                for phase, seconds in sorted(event.timings.items())
+            ),
+        )
+
+    def on_retry(self, event):
+        self.logger.warning(
+            u"%s %s failed (attempt %d), retrying in %.2fs: %s",
+            event.method,
+            event.path,
+            event.attempt + 1,
+            event.delay,
+            event.error,
+        )
+
+    def on_error(self, event):
+        self.logger.warning(
+            u"%s %s failed after %d attempt(s): %s",
+            event.method,
+            event.path,
+            event.attempt + 1,
+            event.error,
+        )
+
+
+class HistogramObserver(Observer):
+    """
+    In-process latency histogram per endpoint and phase
+
+    Requests are grouped by method and first path segment ("GET /venues"),
+    so ids don't explode the number of series.
+    """
+
+    # Upper bounds of the buckets, in milliseconds
+    BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = dict()
+
+    def _key(self, event):
+        return u"{0} /{1}".format(event.method, event.path.strip("/").split("/")[0])
+
+    def _observe(self, event, error):
+        key = self._key(event)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "count": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "response_bytes": 0,
+                    "phases": dict(),
+                }
+            series["count"] += 1
+            series["errors"] += int(error)
+            series["retries"] += event.attempt
+            series["response_bytes"] += event.response_bytes
+            phases = dict(event.timings, total=event.duration)
+            for phase, seconds in phases.items():
+                histogram = series["phases"].get(phase)
+                if histogram is None:
+                    histogram = series["phases"][phase] = [0] * len(self.buckets)
+                histogram[bisect.bisect_left(self.buckets, seconds * 1000)] += 1
+
+    def on_response(self, event):
+        self._observe(event, False)
+
+    def on_error(self, event):
+        self._observe(event, True)
+
+    def percentile(self, key, fraction, phase="total"):
+        """Upper bound (ms) of the bucket holding the given percentile"""
+        with self._lock:
+            histogram = self._series[key]["phases"][phase]
+            rank = fraction * sum(histogram)
+            seen = 0
+            for bound, count in zip(self.buckets, histogram):
+                seen += count
+                if count and seen >= rank:
+                    return bound
+            return self.buckets[-1]
+
+    def snapshot(self):
+        """Copy of every series, with per-phase bucket counts keyed by bound"""
+        with self._lock:
+            snapshot = dict()
+            for key, series in self._series.items():
+                snapshot[key] = dict(
+                    series,
+                    phases=dict(
+                        (phase, dict(zip(self.buckets, histogram)))
+                        for phase, histogram in series["phases"].items()
+                    ),
+                )
+            return snapshot
+
+
+class ResponseCache(object):
+    """
+    Caches the responses of read-only GETs
+
+    Entries are kept in a pluggable backend: the in-process MemoryCache by
+    default, a DiskCache, or any object with get(key) and set(key, value, ttl)
+    methods. How long a path stays fresh is looked up in ttls, a sequence of
+    (path pattern, seconds) pairs (see CACHE_TTLS).
+
+    Responses that came with an ETag or Last-Modified header are kept for
+    keep_stale seconds past their ttl. Once stale they are revalidated with
+    a conditional GET, and a 304 makes them fresh again without a download.
+    """
+
+    def __init__(self, backend=None, ttls=CACHE_TTLS, keep_stale=CACHE_KEEP_STALE):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttls = [(pattern.strip("/").split("/"), ttl) for pattern, ttl in ttls]
+        self.keep_stale = keep_stale
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def ttl(self, path):
+        """Seconds a response for this path stays fresh; 0 if it isn't cached"""
+        segments = path.strip("/").split("/")
+        for pattern, ttl in self.ttls:
+            if len(pattern) == len(segments) and all(
+                fnmatch.fnmatchcase(segment, p) for segment, p in zip(segments, pattern)
+            ):
+                return ttl
+        return 0
+
+    def get(self, key):
+        """Returns the fresh cached response for key, or None"""
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """
+        Returns (fresh response, None) on a hit
+
+        On a miss, returns (None, stale entry) if there is a stale entry that
+        can be revalidated, or (None, None).
+        """
+        entry = self.backend.get(key)
+        fresh = entry is not None and entry["expires"] > time.time()
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if fresh:
+            return entry["response"], None
+        if entry is not None and (entry.get("etag") or entry.get("last_modified")):
+            return None, entry
+        return None, None
+
+    def set(self, key, path, response, headers=None):
+        """Cache a response for as long as its path's ttl, with its validators"""
+        ttl = self.ttl(path)
+        if ttl:
+            entry = {"response": response, "expires": time.time() + ttl}
+            if headers is not None:
+                if headers.get("ETag"):
+                    entry["etag"] = headers["ETag"]
+                if headers.get("Last-Modified"):
+                    entry["last_modified"] = headers["Last-Modified"]
+            self._store(key, entry, ttl)
+
+    def refresh(self, key, path, entry):
+        """Make a revalidated entry fresh for another ttl and return its response"""
+        with self._lock:
+            self.revalidations += 1
+        entry = dict(entry, expires=time.time() + self.ttl(path))
+        self._store(key, entry, self.ttl(path))
+        return entry["response"]
+
+    def _store(self, key, entry, ttl):
+        """Hand an entry to the backend, keeping revalidatable ones longer"""
+        if entry.get("etag") or entry.get("last_modified"):
+            ttl += self.keep_stale
+        self.backend.set(key, entry, ttl)
+
+    @staticmethod
+    def validators(entry):
+        """Conditional request headers for revalidating a stale entry"""
+        headers = dict()
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def stats(self):
+        """Hit/miss/revalidation counters, e.g. for a dashboard"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+            }
+
+
+class MemoryCache(object):
+    """
+    In-process cache backend with LRU eviction
+
+    Values are kept as JSON, like DiskCache, so every get returns a fresh copy
+    that callers are free to mutate.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.pop(key, None)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.time():
+                return None
+            # Re-insert to mark it most recently used
+            self._entries[key] = item
+        return json.loads(value)
+
+    def set(self, key, value, ttl):
+        value = json.dumps(value)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Cursor(object):
+    """High-water mark of one incremental sync, saved back once it's done"""
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        self.start = self.mark = store.get(key)
+
+    def advance(self, value):
+        self.mark = max(self.mark or 0, value)
+
+    def save(self):
+        if self.mark != self.start:
+            self.store.set(self.key, self.mark)
+
+
+class MemoryCursorStore(object):
+    """In-process store for sync cursors, e.g. users.sync_checkins high-water marks"""
+
+    def __init__(self):
+        self._cursors = dict()
+
+    def get(self, key):
+        return self._cursors.get(key)
+
+    def set(self, key, value):
+        self._cursors[key] = value
+
+
+class FileCursorStore(object):
+    """On-disk store for sync cursors, one small JSON file per key"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get(self, key):
+        try:
+            with open(_key_path(self.directory, key), "r") as f:
+                item = json.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        return item["value"] if item["key"] == key else None
+
+    def set(self, key, value):
+        item = {"key": key, "value": value}
+        _write_atomically(_key_path(self.directory, key), _as_bytes(json.dumps(item)))
+
+
+class DiskCache(object):
+    """
+    On-disk cache backend, one JSON file per entry
+
+    Reads touch a file's mtime, so the least recently used files are the ones
+    evicted once there are more than max_entries.
+    """
+
+    def __init__(self, directory, max_entries=CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get(self, key):
+        path = _key_path(self.directory, key)
+        try:
+            with open(path, "r") as f:
+                item = json.loads(f.read())
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        if item["key"] != key or item["expires"] <= time.time():
+            return None
+        return item["value"]
+
+    def set(self, key, value, ttl):
+        item = {"key": key, "value": value, "expires": time.time() + ttl}
+        _write_atomically(_key_path(self.directory, key), _as_bytes(json.dumps(item)))
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """Drop the least recently used files beyond max_entries. Must hold the lock"""
+        names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.directory, n) for n in names]
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in paths[: len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class VenueCrawler(object):
+    """
+    Quadtree sweep of a bounding box with venues.search
+
+        crawler = api.venues.crawl((40.70, -74.02), (40.80, -73.93), window=4)
+        for venue in crawler:
+            ...
+        state = crawler.checkpoint()  # later: api.venues.crawl(..., checkpoint=state)
+
+    Each tile is searched with intent=browse. A tile that comes back full (or
+    too big for the API) is split into four, until tiles are min_span degrees
+    across; venues seen in an earlier tile are skipped. Up to window tiles
+    are searched at once, all through the client's rate governor.
+
+    checkpoint() captures the tiles still to search and the venues already
+    yielded, as plain JSON-serializable data.
+    """
+
+    def __init__(
+        self,
+        venues,
+        sw,
+        ne,
+        params={},
+        window=1,
+        min_span=CRAWL_MIN_SPAN,
+        checkpoint=None,
+    ):
+        self.venues = venues
+        self.limit = params.get("limit", venues.MAX_SEARCH_LIMIT)
+        self.params = dict(params, intent=u"browse", limit=self.limit)
+        self.window = max(window, 1)
+        self.min_span = min_span
+        if checkpoint:
+            self.pending = [tuple(tile) for tile in checkpoint["pending"]]
+            self.seen = set(checkpoint["seen"])
+        else:
+            # Tiles are (south, west, north, east)
+            self.pending = [(sw[0], sw[1], ne[0], ne[1])]
+            self.seen = set()
+        self.searches = 0
+
+    def checkpoint(self):
+        """Resumable state of the crawl so far"""
+        return {
+            "pending": [list(tile) for tile in self.pending],
+            "seen": sorted(self.seen),
+        }
+
+    def __iter__(self):
+        queue = collections.deque(self.pending)
+        in_flight = dict()
+        with futures.ThreadPoolExecutor(max_workers=self.window) as pool:
+            try:
+                while queue or in_flight:
+                    while queue and len(in_flight) < self.window:
+                        tile = queue.popleft()
+                        in_flight[pool.submit(self._search, tile)] = tile
+                    done, _ = futures.wait(
+                        in_flight, return_when=futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        tile = in_flight.pop(future)
+                        venues, saturated = future.result()
+                        for venue in self._unseen(venues):
+                            yield venue
+                        queue.extend(self._settle(tile, saturated))
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def _search(self, tile):
+        """Search one tile; returns its venues and whether it needs splitting"""
+        self.searches += 1
+        try:
+            venues = self.venues.search(self._search_params(tile))["venues"]
+        except GeocodeTooBig:
+            return [], True
+        return venues, len(venues) >= self.limit
+
+    def _search_params(self, tile):
+        """venues.search params covering a tile"""
+        south, west, north, east = tile
+        return dict(
+            self.params,
+            sw=u"{0},{1}".format(south, west),
+            ne=u"{0},{1}".format(north, east),
+        )
+
+    def _unseen(self, venues):
+        """The venues not yielded before, marking them as seen"""
+        for venue in venues:
+            if venue["id"] not in self.seen:
+                self.seen.add(venue["id"])
+                yield venue
+
+    def _settle(self, tile, saturated):
+        """Retire a searched tile, returning the sub-tiles that replace it"""
+        self.pending.remove(tile)
+        south, west, north, east = tile
+        if not saturated or min(north - south, east - west) / 2 < self.min_span:
+            return []
+        lat, lng = (south + north) / 2.0, (west + east) / 2.0
+        children = [
+            (south, west, lat, lng),
+            (south, lng, lat, east),
+            (lat, west, north, lng),
+            (lat, lng, north, east),
+        ]
+        self.pending.extend(children)
+        return children
+
+
+class _TrieNode(object):
+    """Prefix trie node holding the suggestions fetched for that prefix"""
+
+    __slots__ = ("children", "minivenues", "complete")
+
+    def __init__(self):
+        self.children = dict()
+        self.minivenues = None
+        # Fewer results than the limit: nothing matching a longer prefix is missing
+        self.complete = False
+
+
+class VenueCompleter(object):
+    """
+    Autocomplete accelerator for venues.suggestcompletion
+
+        completer = api.venues.completer()
+        future = completer.submit(u"blue bo", {"ll": u"40.7,-74.0"})  # per keystroke
+        response = completer(u"blue bottle", {"ll": u"40.7,-74.0"})  # blocking
+
+    Results are kept in a prefix trie per location, where ll is rounded to a
+    geohash cell of `precision` characters. A query is answered locally if it
+    was fetched before, or if a shorter prefix of it was fetched and its
+    results weren't cut off by the limit: those results are then filtered.
+
+    submit() waits `debounce` seconds before calling the API, and each submit
+    cancels the future of the one before it, along with its call if that
+    hasn't started yet. Results of superseded calls are still cached.
+    """
+
+    def __init__(
+        self,
+        venues,
+        debounce=COMPLETION_DEBOUNCE,
+        precision=COMPLETION_GEOHASH_PRECISION,
+        max_cells=COMPLETION_MAX_CELLS,
+    ):
+        self.venues = venues
+        self.debounce = debounce
+        self.precision = precision
+        self.max_cells = max_cells
+        self.fetches = 0
+        self.local_hits = 0
+        self._lock = threading.Lock()
+        self._cells = collections.OrderedDict()
+        self._pending = None
+
+    def __call__(self, query, params={}):
+        """suggestcompletion response for query, served locally when possible"""
+        key = self._key(params)
+        response = self._lookup(key, query, params)
+        if response is None:
+            response = self._fetch(key, query, params)
+        return response
+
+    def submit(self, query, params={}):
+        """Future for query's response, superseding the previous submit"""
+        key = self._key(params)
+        future = futures.Future()
+        response = self._lookup(key, query, params)
+        with self._lock:
+            if self._pending is not None:
+                pending_future, timer = self._pending
+                timer.cancel()
+                pending_future.cancel()
+                self._pending = None
+            if response is None:
+                timer = threading.Timer(
+                    self.debounce, self._run, (future, key, query, params)
+                )
+                timer.daemon = True
+                self._pending = (future, timer)
+        if response is None:
+            timer.start()
+        else:
+            _resolve_future(future, response)
+        return future
+
+    def _run(self, future, key, query, params):
+        """Fetch a debounced submit, unless it was superseded meanwhile"""
+        if future.cancelled():
+            return
+        try:
+            response = self._fetch(key, query, params)
+        except FoursquareException as e:
+            response = e
+        with self._lock:
+            if self._pending is not None and self._pending[0] is future:
+                self._pending = None
+        _resolve_future(future, response)
+
+    def _fetch(self, key, query, params):
+        """Call the API and remember its suggestions"""
+        self.fetches += 1
+        response = self.venues.suggestcompletion(dict(params, query=query))
+        self._store(key, query, params, response.get("minivenues", []))
+        return response
+
+    def _key(self, params):
+        """Trie key: the location rounded to a cell, plus the other params"""
+        params = dict(params)
+        params.pop("query", None)
+        if "ll" in params:
+            lat, lng = [float(x) for x in params["ll"].split(",")[:2]]
+            params["ll"] = _geohash(lat, lng, self.precision)
+        if "near" in params:
+            params["near"] = _normalize_completion(params["near"])
+        return _foursquare_urlencode(sorted(params.items()))
+
+    def _lookup(self, key, query, params):
+        """Response answered from the trie, or None"""
+        text = _normalize_completion(query)
+        with self._lock:
+            node = self._cells.get(key)
+            if node is None:
+                return None
+            self._cells.move_to_end(key)
+            prefix = None
+            for char in text:
+                if node.complete:
+                    prefix = node
+                node = node.children.get(char)
+                if node is None:
+                    break
+            else:
+                if node.minivenues is not None:
+                    self.local_hits += 1
+                    return {"minivenues": list(node.minivenues)}
+            if prefix is None:
+                return None
+            self.local_hits += 1
+            candidates = prefix.minivenues
+        limit = int(params.get("limit", SUGGEST_COMPLETION_LIMIT))
+        matches = [v for v in candidates if _completion_matches(v.get("name"), text)]
+        return {"minivenues": matches[:limit]}
+
+    def _store(self, key, query, params, minivenues):
+        """Remember the suggestions fetched for query"""
+        limit = int(params.get("limit", SUGGEST_COMPLETION_LIMIT))
+        with self._lock:
+            node = self._cells.get(key)
+            if node is None:
+                node = self._cells[key] = _TrieNode()
+                while len(self._cells) > self.max_cells:
+                    self._cells.popitem(last=False)
+            for char in _normalize_completion(query):
+                node = node.children.setdefault(char, _TrieNode())
+            node.minivenues = list(minivenues)
+            node.complete = len(minivenues) < limit
+
+
+class CategoryIndex(object):
+    """
+    Flattened venue category taxonomy with O(1) lookups by ID
+
+        index = api.venues.category_index(u"/var/cache/foursquare/categories.json")
+        index[CATEGORY_ID]["name"]
+        index.ancestors(CATEGORY_ID)  # parent first
+        CATEGORY_ID in index.descendants(FOOD_ID)
+        index.search(u"coffee")
+
+    Nodes are the category dicts of venues.categories(), without their
+    nested "categories". A refresh swaps in the new taxonomy all at once, so
+    readers in other threads always see a consistent index.
+    """
+
+    def __init__(self, categories=(), version=None, fetched=None):
+        self.update(categories, version, fetched)
+
+    def update(self, categories, version=None, fetched=None):
+        """Replace the index with a categories tree"""
+        nodes, parents, descendants = dict(), dict(), dict()
+
+        def visit(category, parent_id):
+            node = dict((k, v) for k, v in category.items() if k != "categories")
+            nodes[node["id"]] = node
+            parents[node["id"]] = parent_id
+            below = set()
+            for child in category.get("categories", ()):
+                below.add(child["id"])
+                below.update(visit(child, node["id"]))
+            descendants[node["id"]] = frozenset(below)
+            return below
+
+        for category in categories:
+            visit(category, None)
+        self._categories = list(categories)
+        self.version = version if version else API_VERSION
+        self.fetched = fetched if fetched is not None else time.time()
+        # One assignment, so lookups never mix old and new taxonomies
+        self._index = (nodes, parents, descendants)
+
+    def __getitem__(self, CATEGORY_ID):
+        return self._index[0][CATEGORY_ID]
+
+    def __contains__(self, CATEGORY_ID):
+        return CATEGORY_ID in self._index[0]
+
+    def __iter__(self):
+        return iter(self._index[0].values())
+
+    def __len__(self):
+        return len(self._index[0])
+
+    def get(self, CATEGORY_ID, default=None):
+        return self._index[0].get(CATEGORY_ID, default)
+
+    def parent(self, CATEGORY_ID):
+        """The category's parent node, or None for a top-level category"""
+        nodes, parents, _ = self._index
+        parent_id = parents[CATEGORY_ID]
+        return nodes[parent_id] if parent_id else None
+
+    def ancestors(self, CATEGORY_ID):
+        """The category's ancestor nodes, parent first"""
+        nodes, parents, _ = self._index
+        chain = list()
+        parent_id = parents[CATEGORY_ID]
+        while parent_id:
+            chain.append(nodes[parent_id])
+            parent_id = parents[parent_id]
+        return chain
+
+    def descendants(self, CATEGORY_ID):
+        """frozenset of the IDs of every category below this one"""
+        return self._index[2][CATEGORY_ID]
+
+    def search(self, text):
+        """Nodes whose name contains text, those starting with it first"""
+        text = text.lower()
+        matches = [
+            node
+            for node in self._index[0].values()
+            if text in node.get("name", u"").lower()
+        ]
+        matches.sort(
+            key=lambda node: not node.get("name", u"").lower().startswith(text)
+        )
+        return matches
+
+    def age(self):
+        """Seconds since the taxonomy was fetched"""
+        return time.time() - self.fetched
+
+    def refresh(self, venues, path=None):
+        """Fetch the taxonomy now, saving it to path if given"""
+        response = venues.categories()
+        self.update(response["categories"], venues.requester.version)
+        if path:
+            self.save(path)
+        return self
+
+    def refresh_in_background(self, venues, path=None):
+        """Start refreshing on a daemon thread; the old taxonomy serves until then"""
+
+        def run():
+            try:
+                self.refresh(venues, path)
+            except (FoursquareException, IOError, OSError) as e:
+                log.warning(u"Category index refresh failed: %s", e)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def save(self, path):
+        """Write the taxonomy to path"""
+        data = {
+            "version": self.version,
+            "fetched": self.fetched,
+            "categories": self._categories,
+        }
+        _write_atomically(path, _as_bytes(json.dumps(data)))
+
+    @classmethod
+    def load(cls, path, version=None):
+        """Index saved at path, or None if missing, unreadable or for another version"""
+        try:
+            with open(path, "r") as f:
+                data = json.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get("version") != (version if version else API_VERSION):
+            return None
+        return cls(data["categories"], data["version"], data["fetched"])
+
+
+# Held weakly, so a governor goes away with the last client using it instead of
+# piling up one per access token ever seen
+_shared_rate_governors = weakref.WeakValueDictionary()
+_shared_rate_governors_lock = threading.Lock()
+
+
+def shared_rate_governor(credentials):
+    """
+    Returns the process-wide RateGovernor for a client_id or access token
+
+    Every client holding it shares it; once none does, the next call for
+    those credentials starts a new one.
+    """
+    with _shared_rate_governors_lock:
+        governor = _shared_rate_governors.get(credentials)
+        if governor is None:
+            governor = _shared_rate_governors[credentials] = RateGovernor()
+        return governor
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def default_transport():
+    """Returns the process-wide Transport shared by clients that don't supply one"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = Transport()
+    return _default_transport
+
+
+def _multi_request_url(path, params):
+    """Encode a sub-request so it fits in the requests= param of a multi request"""
+    url = path
+    if params:
+        # First convert the params into a query string then quote the whole string
+        # so it will fit into the multi request query -as a value for the requests= query param-
+        url += "?{0}".format(parse.quote_plus(parse.urlencode(params)))
+    return url
+
+
+def _multi_post(requester, urls):
+    """Send encoded sub-request urls as one /multi request; returns each sub-response"""
+    response = requester.POST("/multi", data=_multi_data(urls), idempotent=True)
+    return _unpack_multi_responses(response)
+
+
+def _multi_data(urls):
+    """POST data of a /multi request for encoded sub-request urls"""
+    return {"requests": ",".join(urls)}
+
+
+def _unpack_multi_responses(response):
+    """Each sub-response's data, or the exception it represents, of a /multi response"""
+    return [_unpack_multi_response(r) for r in response["responses"]]
+
+
+def _unpack_multi_response(response):
+    """Returns a multi sub-response's data, or the exception it represents"""
+    # Make sure the response was valid
+    try:
+        _raise_error_from_response(response)
+        return response["response"]
+    except FoursquareException as e:
+        return e
+
+
+def _chunked(items, size):
+    """Splits a list into consecutive chunks of at most size items"""
+    return [items[i : i + size] for i in xrange(0, len(items), size)]
+
+
+def _lazy_chunks(items, size):
+    """Like _chunked, but consumes items lazily, so it may be endless"""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _map_chunks(process, chunks, max_workers=1, ordered=True):
+    """
+    Runs process over each chunk on a bounded thread pool
+
+    Yields (chunk index, result) pairs, in chunk order or as each completes.
+    """
+    if max_workers <= 1 or len(chunks) <= 1:
+        for index, chunk in enumerate(chunks):
+            yield index, process(chunk)
+        return
+    with futures.ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        pending = dict(
+            (pool.submit(process, chunk), index) for index, chunk in enumerate(chunks)
+        )
+        if ordered:
+            completed = sorted(pending, key=pending.get)
+        else:
+            completed = futures.as_completed(pending)
+        for future in completed:
+            yield pending[future], future.result()
+
+
+def _map_window(process, items, window=1):
+    """
+    Yields process(item) for each item, in order, with up to window in flight
+
+    Unlike _map_chunks, only window results are ever fetched ahead of the
+    consumer, so arbitrarily long sequences stay bounded in memory.
+    """
+    if window <= 1:
+        for item in items:
+            yield process(item)
+        return
+    pending = collections.deque()
+    with futures.ThreadPoolExecutor(max_workers=window) as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(process, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _pipeline(fetch, key, transform=None, processes=None, window=1):
+    """
+    Yields transform(item) for every item of an offset-paged list, in order
+
+    fetch(offset) returns a page's raw body. Bodies are decoded and transformed
+    by a pool of processes, which are kept PIPELINE_PAGES_PER_PROCESS pages
+    ahead of the consumer; fetching stops whenever that queue is full.
+    """
+    processes = processes or os.cpu_count() or 1
+    max_pending = processes * PIPELINE_PAGES_PER_PROCESS
+    with futures.ProcessPoolExecutor(processes) as pool:
+        count, page_size, items = pool.submit(
+            _decode_page, fetch(0), key, transform
+        ).result()
+        for item in items:
+            yield item
+        offsets = _page_offsets(count, page_size)
+        pending = collections.deque()
+        try:
+            for body in _map_window(fetch, offsets, window):
+                pending.append(pool.submit(_decode_page, body, key, transform))
+                if len(pending) >= max_pending:
+                    for item in pending.popleft().result()[2]:
+                        yield item
+            while pending:
+                for item in pending.popleft().result()[2]:
+                    yield item
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _page_offsets(count, page_size):
+    """Offsets of the pages after the first of an offset-paged list"""
+    # Step by what the server actually returned, in case it capped the limit
+    return xrange(page_size, count, page_size) if page_size else []
+
+
+def _page_items(page, key):
+    """Items of a page of an offset-paged list, raising if it failed"""
+    if isinstance(page, FoursquareException):
+        raise page
+    return page[key]["items"]
+
+
+def _decode_page(body, key, transform=None):
+    """
+    Decode a raw page of an offset-paged list and transform its items
+
+    Runs in a pipeline's worker processes; returns the list's total count,
+    the number of items on the page and the transformed items.
+    """
+    try:
+        page = json.loads(body)["response"][key]
+    except ValueError:
+        _log_and_raise_exception("Invalid response", body)
+    items = page["items"]
+    if transform is not None:
+        items = [transform(item) for item in items]
+    return page["count"], len(page["items"]), items
+
+
+def _indexed_progress(progress, index):
+    """Upload progress callback that also reports which upload it is"""
+    if progress is None:
+        return None
+    return lambda sent, total: progress(index, sent, total)
+
+
+def _injected_error(status):
+    """Interaction for an error a CassetteTransport injects"""
+    error_type = {429: u"rate_limit_exceeded"}.get(status, u"server_error")
+    body = {
+        "meta": {
+            "code": status,
+            "errorType": error_type,
+            "errorDetail": u"Injected by CassetteTransport",
+        },
+        "response": {},
+    }
+    return {
+        "status": status,
+        "headers": {"Content-Type": u"application/json", "Retry-After": u"0"},
+        "body": json.dumps(body),
+    }
+
+
+def _resolve_future(future, response):
+    """Settle a Future with a multi sub-response or exception"""
+    if not future.set_running_or_notify_cancel():
+        return
+    if isinstance(response, Exception):
+        future.set_exception(response)
+    else:
+        future.set_result(response)
+
+
+def _fail_futures(futures, e):
+    """
+    Settle each of futures still pending with e
+
+    Futures are cancelled instead when e isn't an Exception (KeyboardInterrupt,
+    a cancelled task), so their waiters aren't handed control-flow exceptions.
+    """
+    for future in futures:
+        if future.done() or future.running():
+            continue
+        if isinstance(e, Exception):
+            _resolve_future(future, e)
+        else:
+            future.cancel()
+
+
+def _missing_sub_response():
+    """The error for a batched request its /multi response had no answer to"""
+    return FoursquareException(u"No sub-response in the /multi response")
+
+
 def _log_and_raise_exception(msg, data, cls=FoursquareException):
     """Calls log.error() then raises an exception of class cls"""
     data = u"{0}".format(data)
@@ -895,66 +3659,262 @@ Network helper functions
 """
 
 
-def _get(url, headers={}, params=None, timeout=GET_TIMEOUT):
+def _get(
+    url,
+    headers={},
+    params=None,
+    timeout=GET_TIMEOUT,
+    transport=None,
+    retry_policy=None,
+    event=None,
+    process=None,
+):
     """Tries to GET data from an endpoint using retries"""
-    param_string = _foursquare_urlencode(params)
-    for i in xrange(NUM_REQUEST_RETRIES):
+    transport = transport if transport else default_transport()
+    param_string = _encode_get(url, params, event)
+
+    def send():
+        started = time.perf_counter()
         try:
-            try:
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    params=param_string,
-                    verify=VERIFY_SSL,
-                    timeout=timeout,
-                )
-                return _process_response(response)
-            except requests.exceptions.RequestException as e:
-                _log_and_raise_exception("Error connecting with foursquare API", e)
-        except FoursquareException as e:
-            # Some errors don't bear repeating
-            if e.__class__ in [
-                InvalidAuth,
-                ParamError,
-                EndpointError,
-                NotAuthorized,
-                Deprecated,
-            ]:
-                raise
-            # If we've reached our last try, re-raise
-            if (i + 1) == NUM_REQUEST_RETRIES:
-                raise
-        time.sleep(1)
+            response = transport.get(
+                url,
+                headers=headers,
+                params=param_string,
+                verify=VERIFY_SSL,
+                timeout=timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            _connection_failed(event, started, e)
+        return _received(response, event, started, process)
+
+    return _with_retries(send, retry_policy, event=event)
+
+
+def _post(
+    url,
+    headers={},
+    data=None,
+    files=None,
+    timeout=POST_TIMEOUT,
+    transport=None,
+    retry_policy=None,
+    idempotent=False,
+    event=None,
+):
+    """Tries to POST data to an endpoint, retrying only if it is safe to"""
+    transport = transport if transport else default_transport()
+
+    def send():
+        started = time.perf_counter()
+        try:
+            response = transport.post(
+                url,
+                headers=headers,
+                data=data,
+                files=files,
+                verify=VERIFY_SSL,
+                timeout=timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            _connection_failed(event, started, e)
+        return _received(response, event, started)
+
+    return _with_retries(
+        send,
+        retry_policy,
+        _should_retry_post(retry_policy, files, idempotent),
+        event=event,
+    )
+
+
+def _encode_query(params, event=None):
+    """Query string for params, which may already be encoded"""
+    if isinstance(params, six.string_types):
+        param_string = params
+    else:
+        encode_started = time.perf_counter()
+        param_string = _foursquare_urlencode(params)
+        if event is not None:
+            event.timings["encode"] = time.perf_counter() - encode_started
+    return param_string
 
 
-def _post(url, headers={}, data=None, files=None, timeout=POST_TIMEOUT):
-    """Tries to POST data to an endpoint"""
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            data=data,
-            files=files,
-            verify=VERIFY_SSL,
-            timeout=timeout,
-        )
-        return _process_response(response)
-    except requests.exceptions.RequestException as e:
-        _log_and_raise_exception("Error connecting with foursquare API", e)
+def _encode_get(url, params, event=None):
+    """Query string of a GET, counted towards its request bytes"""
+    param_string = _encode_query(params, event)
+    if event is not None:
+        event.request_bytes = len(url) + len(param_string)
+    return param_string
 
 
-def _process_response(response):
-    """Make the request and handle exception processing"""
-    # Read the response as JSON
+def _with_retries(send, retry_policy=None, retry=True, event=None):
+    """Calls send until it succeeds or the retry policy gives up"""
+    attempts = _Attempts(retry_policy, retry, event)
+    while True:
+        try:
+            return attempts.succeeded(send())
+        except FoursquareException as e:
+            delay = attempts.failed(e)
+            if delay is None:
+                raise
+        time.sleep(delay)
+
+
+def _open_stream(
+    method,
+    url,
+    headers={},
+    params=None,
+    data=None,
+    timeout=GET_TIMEOUT,
+    transport=None,
+    retry_policy=None,
+    retry=True,
+    event=None,
+):
+    """
+    Sends a request without reading its body
+
+    Returns the response headers and a file-like object over the raw body.
+    Error responses are read and raised just like _process_response does.
+    """
+    if ijson is None:
+        raise ImportError(u"Streaming requires ijson (pip install foursquare[stream])")
+    transport = transport if transport else default_transport()
+    param_string = _encode_query(params, event) if params is not None else None
+
+    def send():
+        started = time.perf_counter()
+        try:
+            response = getattr(transport, method)(
+                url,
+                headers=headers,
+                params=param_string,
+                data=data,
+                verify=VERIFY_SSL,
+                timeout=timeout,
+                stream=True,
+            )
+        except requests.exceptions.RequestException as e:
+            _connection_failed(event, started, e)
+        if not _stream_opened(event, started, response.status_code, response.headers):
+            # Reads (and closes) the body; only conflicts come back from this
+            _process_response(response, event)
+            return response.headers, io.BytesIO(response.content)
+        # Let urllib3 undo any gzip/deflate content encoding as we read
+        response.raw.decode_content = True
+        return response.headers, response.raw
+
+    return _with_retries(send, retry_policy, retry, event=event)
+
+
+def _should_retry_post(retry_policy, files, idempotent):
+    """Whether a POST may be sent more than once"""
+    # Uploads may have consumed their file objects on the first attempt
+    if files:
+        return False
+    return idempotent or bool(retry_policy and retry_policy.retry_posts)
+
+
+def _parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
     try:
-        data = response.json()
+        return max(float(value), 0)
     except ValueError:
-        _log_and_raise_exception("Invalid response", response.text)
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(email.utils.mktime_tz(parsed) - time.time(), 0)
+
+
+def _connection_failed(event, started, e):
+    """Record a request that got no response, and raise for it"""
+    _observe_request(event, started)
+    _log_and_raise_exception("Error connecting with foursquare API", e)
+
+
+def _received(response, event, started, process=None):
+    """Record how a request went, then process its response"""
+    _observe_request(event, started, response)
+    return (process or _process_response)(response, event)
+
+
+def _stream_opened(event, started, status, headers):
+    """Record a streamed request's headers; True if its body is to be streamed"""
+    _observe_request(event, started)
+    if status != 200:
+        return False
+    if event is not None:
+        event.status = status
+        event.record_rate_limit(headers)
+    return True
+
+
+def _observe_request(event, started, response=None):
+    """Record how long a request took, split at the arrival of its headers"""
+    if event is None:
+        return
+    total = time.perf_counter() - started
+    elapsed = getattr(response, "elapsed", None)
+    # requests reports a timedelta, our aiohttp responses plain seconds
+    elapsed = getattr(elapsed, "total_seconds", lambda: elapsed)()
+    if elapsed is None:
+        event.timings["request"] = total
+    else:
+        event.timings["request"] = elapsed
+        event.timings["download"] = max(total - elapsed, 0)
+    body = getattr(getattr(response, "request", None), "body", None)
+    if body:
+        event.request_bytes = len(body)
+
 
-    # Default case, Got proper response
-    if response.status_code == 200:
-        return {"headers": response.headers, "data": data}
-    return _raise_error_from_response(data)
+def _process_response(response, event=None):
+    """Make the request and handle exception processing"""
+    if event is not None:
+        event.status = response.status_code
+        event.response_bytes = len(response.content)
+        event.record_rate_limit(response.headers)
+    if response.status_code == 304:
+        # Not Modified: only sent for conditional GETs, whose caller has the body
+        return {"headers": response.headers, "data": None}
+    decode_started = time.perf_counter()
+    try:
+        # Read the response as JSON
+        try:
+            data = response.json()
+        except ValueError:
+            _log_and_raise_exception("Invalid response", response.text)
+        if event is not None:
+            event.timings["decode"] = time.perf_counter() - decode_started
+
+        # Default case, Got proper response
+        if response.status_code == 200:
+            return {"headers": response.headers, "data": data}
+        error_started = time.perf_counter()
+        try:
+            return _raise_error_from_response(data)
+        finally:
+            if event is not None:
+                event.timings["error"] = time.perf_counter() - error_started
+    except FoursquareException as e:
+        # Keep the HTTP details around for retry decisions
+        e.status_code = response.status_code
+        e.headers = response.headers
+        raise
+
+
+def _raw_response(response, event=None):
+    """Like _process_response, but leaves the body of a 200 response undecoded"""
+    if response.status_code != 200:
+        return _process_response(response, event)
+    if event is not None:
+        event.status = response.status_code
+        event.response_bytes = len(response.content)
+        event.record_rate_limit(response.headers)
+    return {"headers": response.headers, "data": response.content}
 
 
 def _raise_error_from_response(data):
@@ -977,6 +3937,82 @@ def _raise_error_from_response(data):
         )
 
 
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _geohash(lat, lng, precision):
+    """Geohash of the cell of precision characters containing lat, lng"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = list()
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        value, interval = (lng, lng_range) if even else (lat, lat_range)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def _normalize_completion(text):
+    """Case- and whitespace-insensitive form of a completion query"""
+    return u" ".join(text.lower().split())
+
+
+def _completion_matches(name, text):
+    """Whether a word of name starts with the normalized query text"""
+    name = _normalize_completion(name or u"")
+    return name.startswith(text) or (u" " + text) in name
+
+
+def _key_path(directory, key):
+    """Path of the JSON file a key is stored in, for one-file-per-key stores"""
+    digest = hashlib.sha1(key.encode("utf8")).hexdigest()
+    return os.path.join(directory, digest + ".json")
+
+
+def _write_atomically(path, data):
+    """
+    Write bytes to path via a temporary file and a rename
+
+    Readers never see a partial file, and a crash leaves the old one intact.
+    The temporary file is unique to this call, even across processes.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        suffix=".tmp", dir=os.path.dirname(os.path.abspath(path))
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _token_digest(token):
+    """Digest of an access token, for keys that mustn't reveal the token"""
+    return hashlib.sha1(_as_bytes(token or u"")).hexdigest()
+
+
+def _as_bytes(s):
+    """UTF-8 bytes of s, for building request bodies"""
+    if isinstance(s, six.binary_type):
+        return s
+    return six.text_type(s).encode("utf8")
+
+
 def _as_utf8(s):
     try:
         return str(s)
@@ -984,13 +4020,43 @@ def _as_utf8(s):
         return unicode(s).encode("utf8")
 
 
-def _foursquare_urlencode(query, doseq=0, safe_chars="&/,+"):
+# Characters _foursquare_urlencode leaves unquoted by default
+URLENCODE_SAFE_CHARS = "&/,+"
+# Strings that parse.quote returns untouched with the default safe characters
+_unquoted = re.compile(r"[A-Za-z0-9_.~&/,+-]*\Z").match
+# Memo of quoted keys and values; repeated ones (lat/lngs, category ids...) are
+# only ever quoted once. Values of _CONSTANT_PARAMS are left out: credentials
+# mustn't outlive their client, and Requester._encode_params encodes them once
+QUOTE_CACHE_SIZE = 4096
+_quote_cache = dict()
+
+
+def _quote(value, safe_chars=URLENCODE_SAFE_CHARS, memoize=True):
+    """Same as parse.quote(_as_utf8(value), safe=safe_chars), memoized unless told not to"""
+    s = value if value.__class__ is str else _as_utf8(value)
+    if safe_chars != URLENCODE_SAFE_CHARS:
+        return parse.quote(s, safe=safe_chars)
+    quoted = _quote_cache.get(s) if memoize else None
+    if quoted is None:
+        quoted = s if _unquoted(s) else parse.quote(s, safe=safe_chars)
+        if memoize:
+            if len(_quote_cache) >= QUOTE_CACHE_SIZE:
+                _quote_cache.clear()
+            _quote_cache[s] = quoted
+    return quoted
+
+
+def _foursquare_urlencode(
+    query, doseq=0, safe_chars=URLENCODE_SAFE_CHARS, memoize=True
+):
     """Gnarly hack because Foursquare doesn't properly handle standard url encoding"""
     # Original doc: http://docs.python.org/2/library/urllib.html#urllib.urlencode
     # Works the same way as urllib.urlencode except two differences -
     # 1. it uses `quote()` instead of `quote_plus()`
     # 2. it takes an extra parameter called `safe_chars` which is a string
     #    having the characters which should not be encoded.
+    # Unless memoize is false, keys and values (other than those of
+    # _CONSTANT_PARAMS) are remembered in _quote_cache; see _quote.
     #
     # Courtesy of github.com/iambibhas
     if hasattr(query, "items"):
@@ -1014,29 +4080,32 @@ def _foursquare_urlencode(query, doseq=0, safe_chars="&/,+"):
                 "not a valid non-string sequence or mapping object"
             ).with_traceback(tb)
 
-    l = []
     if not doseq:
         # preserve old behavior
-        for k, v in query:
-            k = parse.quote(_as_utf8(k), safe=safe_chars)
+        return "&".join(
+            [
+                _quote(k, safe_chars, memoize)
+                + "="
+                + _quote(v, safe_chars, memoize and k not in _CONSTANT_PARAMS)
+                for k, v in query
+            ]
+        )
+    l = []
+    for k, v in query:
+        k = parse.quote(_as_utf8(k), safe=safe_chars)
+        if isinstance(v, six.string_types):
             v = parse.quote(_as_utf8(v), safe=safe_chars)
             l.append(k + "=" + v)
-    else:
-        for k, v in query:
-            k = parse.quote(_as_utf8(k), safe=safe_chars)
-            if isinstance(v, six.string_types):
+        else:
+            try:
+                # is this a sufficient test for sequence-ness?
+                len(v)
+            except TypeError:
+                # not a sequence
                 v = parse.quote(_as_utf8(v), safe=safe_chars)
                 l.append(k + "=" + v)
             else:
-                try:
-                    # is this a sufficient test for sequence-ness?
-                    len(v)
-                except TypeError:
-                    # not a sequence
-                    v = parse.quote(_as_utf8(v), safe=safe_chars)
-                    l.append(k + "=" + v)
-                else:
-                    # loop over the sequence
-                    for elt in v:
-                        l.append(k + "=" + parse.quote(_as_utf8(elt)))
+                # loop over the sequence
+                for elt in v:
+                    l.append(k + "=" + parse.quote(_as_utf8(elt)))
     return "&".join(l)
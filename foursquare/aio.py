@@ -0,0 +1,1152 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+"""asyncio flavour of the foursquare client
+
+Every endpoint method of AsyncFoursquare returns an awaitable instead of data:
+
+    api = AsyncFoursquare(access_token='USER_ACCESS_TOKEN')
+    venue = await api.venues('40a55d80f964a52020f31ee3')
+
+Requires aiohttp (pip install foursquare[async]).
+"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+import asyncio
+import collections
+import copy
+import io
+import itertools
+import os
+import threading
+import time
+from concurrent import futures
+
+import aiohttp
+import requests
+import yarl
+
+from . import (
+    CATEGORY_INDEX_MAX_AGE,
+    GET_TIMEOUT,
+    MAX_MULTI_REQUESTS,
+    PIPELINE_PAGES_PER_PROCESS,
+    POOL_MAXSIZE,
+    POST_TIMEOUT,
+    TOKEN_ENDPOINT,
+    VERIFY_SSL,
+    AutoBatcher,
+    CassetteTransport,
+    CategoryIndex,
+    Foursquare,
+    FoursquareException,
+    GeocodeTooBig,
+    MultipartEncoder,
+    SingleFlight,
+    VenueCompleter,
+    VenueCrawler,
+    _Attempts,
+    _chunked,
+    _connection_failed,
+    _decode_page,
+    _encode_get,
+    _encode_query,
+    _fail_futures,
+    _indexed_progress,
+    _missing_sub_response,
+    _multi_data,
+    _multi_request_url,
+    _page_items,
+    _page_offsets,
+    _process_response,
+    _raw_response,
+    _received,
+    _resolve_future,
+    _should_retry_post,
+    _stream_opened,
+    _unpack_multi_response,
+    _unpack_multi_responses,
+    ijson,
+    json,
+)
+
+
+class AsyncTransport(object):
+    """
+    Pooled, keep-alive HTTP transport backed by an aiohttp.ClientSession
+
+    pool_maxsize bounds the number of simultaneous connections, so any number
+    of in-flight calls can share one event loop without opening a socket each.
+    Sessions are tied to an event loop, so unless one is given, a session is
+    created lazily for each loop the transport is used from (e.g. successive
+    asyncio.run calls), and closed and forgotten as that loop shuts down its
+    async generators, which asyncio.run does before closing it. Loops closed
+    any other way should await close() first.
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, session=None):
+        self.pool_maxsize = pool_maxsize
+        self._session = session
+        self._sessions = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The session for the running event loop"""
+        if self._session is not None:
+            return self._session
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session, _ = self._sessions.get(loop, (None, None))
+            if session is None or session.closed:
+                # Don't keep loops that closed without shutting down alive
+                for other in [other for other in self._sessions if other.is_closed()]:
+                    del self._sessions[other]
+                connector = aiohttp.TCPConnector(
+                    limit=self.pool_maxsize, ssl=None if VERIFY_SSL else False
+                )
+                # Never keep cookies: one user's must not ride along on another's calls
+                session = aiohttp.ClientSession(
+                    connector=connector, cookie_jar=aiohttp.DummyCookieJar()
+                )
+                closer = self._closer(loop, session)
+                # Registers closer with the loop, see loop.shutdown_asyncgens
+                asyncio.ensure_future(closer.asend(None))
+                self._sessions[loop] = (session, closer)
+            return session
+
+    async def _closer(self, loop, session):
+        """Async generator that closes and forgets session when loop shuts down"""
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._sessions.get(loop, (None, None))[0] is session:
+                    del self._sessions[loop]
+            await session.close()
+
+    async def get(self, url, headers=None, params=None, timeout=GET_TIMEOUT):
+        """Send a GET over the pooled session"""
+        if params:
+            url = "{url}?{params}".format(url=url, params=params)
+        started = time.perf_counter()
+        async with self.session.get(
+            yarl.URL(url, encoded=True),
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            elapsed = time.perf_counter() - started
+            return _AsyncResponse(
+                response.status, response.headers, await response.read(), elapsed
+            )
+
+    async def post(
+        self, url, headers=None, data=None, files=None, timeout=POST_TIMEOUT
+    ):
+        """Send a POST over the pooled session, streaming any files"""
+        if files:
+            encoder = MultipartEncoder(data or {}, files)
+            headers = dict(headers or {}, **{"Content-Type": encoder.content_type})
+            if encoder.len is not None:
+                headers["Content-Length"] = str(encoder.len)
+            data = _aiter(encoder)
+        started = time.perf_counter()
+        async with self.session.post(
+            url,
+            headers=headers,
+            data=data,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            elapsed = time.perf_counter() - started
+            return _AsyncResponse(
+                response.status, response.headers, await response.read(), elapsed
+            )
+
+    async def open(
+        self, method, url, headers=None, params=None, data=None, timeout=GET_TIMEOUT
+    ):
+        """Send a request and return the aiohttp response without reading its body"""
+        if params:
+            url = "{url}?{params}".format(url=url, params=params)
+        return await self.session.request(
+            method.upper(),
+            yarl.URL(url, encoded=True),
+            headers=headers,
+            data=data,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+
+    async def close(self):
+        """Close every pooled connection of the running event loop"""
+        session = self._session
+        if session is None:
+            with self._lock:
+                session, _ = self._sessions.pop(
+                    asyncio.get_running_loop(), (None, None)
+                )
+        if session is not None:
+            await session.close()
+
+
+class _AsyncResponse(object):
+    """Fully read aiohttp response, shaped like the requests.Response we process"""
+
+    def __init__(self, status_code, headers, content, elapsed=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        # Seconds from sending the request until its headers arrived
+        self.elapsed = elapsed
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncCassetteTransport(CassetteTransport):
+    """
+    CassetteTransport for AsyncFoursquare clients
+
+        transport = AsyncCassetteTransport(u"venues.json.gz", mode=u"once")
+        client = AsyncFoursquare(access_token=ACCESS_TOKEN, transport=transport)
+        ...
+        await transport.close()  # Saves what was recorded
+    """
+
+    def _default_transport(self):
+        """Transport recordings are made through when none is given"""
+        return default_async_transport()
+
+    async def get(self, url, headers=None, params=None, timeout=GET_TIMEOUT):
+        key = self._key("GET", url, params)
+        if self.mode == u"replay":
+            return await self._replay_response(key)
+        response = await self.transport.get(
+            url, headers=headers, params=params, timeout=timeout
+        )
+        return self._record_response(key, response)
+
+    async def post(
+        self, url, headers=None, data=None, files=None, timeout=POST_TIMEOUT
+    ):
+        key = self._key("POST", url, data=data)
+        if self.mode == u"replay":
+            return await self._replay_response(key)
+        response = await self.transport.post(
+            url, headers=headers, data=data, files=files, timeout=timeout
+        )
+        return self._record_response(key, response)
+
+    async def open(
+        self, method, url, headers=None, params=None, data=None, timeout=GET_TIMEOUT
+    ):
+        key = self._key(method.upper(), url, params, data)
+        if self.mode == u"replay":
+            interaction = self._replay(key)
+            delay = self._delay()
+            if delay:
+                await asyncio.sleep(delay)
+        else:
+            response = await self.transport.open(
+                method, url, headers=headers, params=params, data=data, timeout=timeout
+            )
+            try:
+                content = await response.read()
+            finally:
+                response.release()
+            interaction = self._record(key, response.status, response.headers, content)
+        return _CassetteStreamResponse(interaction)
+
+    async def close(self):
+        """Save the cassette, if recording"""
+        if self.mode == u"record":
+            self.save()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _record_response(self, key, response):
+        interaction = self._record(
+            key, response.status_code, response.headers, response.content
+        )
+        return _AsyncResponse(*self._unpack(interaction))
+
+    async def _replay_response(self, key):
+        interaction = self._replay(key)
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return _AsyncResponse(*self._unpack(interaction))
+
+    def _unpack(self, interaction):
+        """Status, headers and body bytes of an interaction"""
+        return (
+            interaction["status"],
+            requests.structures.CaseInsensitiveDict(interaction["headers"]),
+            interaction["body"].encode("utf-8"),
+        )
+
+
+class _CassetteStreamResponse(object):
+    """aiohttp.ClientResponse stand-in for a recorded interaction, read as a stream"""
+
+    def __init__(self, interaction):
+        self.status = interaction["status"]
+        self.headers = requests.structures.CaseInsensitiveDict(interaction["headers"])
+        self._body = io.BytesIO(interaction["body"].encode("utf-8"))
+        # Streamed bodies are read from response.content
+        self.content = self
+
+    async def read(self, n=-1):
+        return self._body.read(n)
+
+    def release(self):
+        pass
+
+
+class AsyncAutoBatcher(AutoBatcher):
+    """
+    Transparently merges plain GETs into /multi requests on the event loop
+
+    Works like AutoBatcher, but the window is a loop timer and each submitter
+    awaits an asyncio future for its own sub-response.
+    """
+
+    def submit(self, path, params={}):
+        """Queue a GET and return the awaitable for its response"""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        url = _multi_request_url(path, params)
+        with self._lock:
+            self._queue.append((url, future))
+            if len(self._queue) >= self.max_size:
+                queue = self._take()
+            else:
+                queue = None
+                if self._timer is None:
+                    self._timer = loop.call_later(self.window, self.flush)
+        if queue:
+            asyncio.ensure_future(self._send(queue))
+        return future
+
+    def flush(self):
+        """Send whatever is queued without waiting for the window to close"""
+        with self._lock:
+            queue = self._take()
+        if queue:
+            asyncio.ensure_future(self._send(queue))
+
+    async def _send(self, queue):
+        """Send one multi request and resolve each submitter's future"""
+        try:
+            responses = await _multi_post(self.requester, [url for url, _ in queue])
+        except Exception as e:
+            # Nobody else will settle these futures, so never leave one pending
+            responses = [e] * len(queue)
+        for (_, future), response in zip(queue, responses):
+            if future.done():
+                continue
+            if isinstance(response, Exception):
+                future.set_exception(response)
+            else:
+                future.set_result(response)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    Collapses identical concurrent calls into one on the event loop
+
+    Works like SingleFlight, but function is a coroutine function whose call
+    runs as a task. Cancelling one waiter doesn't cancel the shared call.
+    """
+
+    async def do(self, key, function, *args):
+        """Returns await function(*args), sharing the call with others for key"""
+        task, leader = self._join(key, lambda: asyncio.ensure_future(function(*args)))
+        if leader:
+            task.add_done_callback(lambda task: self._done(key, task))
+            return await asyncio.shield(task)
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _done(self, key, task):
+        """Forget a finished call, so later calls start a new flight"""
+        self._forget(key)
+        # Don't warn about an exception every waiter walked away from
+        if not task.cancelled():
+            task.exception()
+
+
+_default_async_transport = None
+_default_async_transport_lock = threading.Lock()
+
+
+def default_async_transport():
+    """Returns the process-wide AsyncTransport shared by clients that don't supply one"""
+    global _default_async_transport
+    if _default_async_transport is None:
+        with _default_async_transport_lock:
+            if _default_async_transport is None:
+                _default_async_transport = AsyncTransport()
+    return _default_async_transport
+
+
+class _AsyncPaged(object):
+    """Async flavour of _Endpoint._paged, for endpoints with all_* utilities"""
+
+    async def _paged(self, path, key, limit, params={}, window=1, multi=False):
+        """
+        Async generator over every item of an offset-paged list, in order
+
+        The first page tells us the total count, so the remaining pages are
+        then fetched up to window at a time, or packed MAX_MULTI_REQUESTS to
+        a /multi request when multi is set.
+        """
+        params = dict(params, limit=limit)
+        first = (await self.GET(path, dict(params, offset=0)))[key]
+        for item in first["items"]:
+            yield item
+        offsets = _page_offsets(first["count"], len(first["items"]))
+        async for page in self._pages(path, params, offsets, window, multi):
+            for item in _page_items(page, key):
+                yield item
+
+    async def _paged_forward(self, path, key, limit, params={}, window=1, multi=False):
+        """
+        Async generator over every item of an offset-paged list, whatever its count says
+
+        See Foursquare._Endpoint._paged_forward.
+        """
+        params = dict(params, limit=limit)
+        pages = self._pages(path, params, itertools.count(0, limit), window, multi)
+        try:
+            async for page in pages:
+                items = _page_items(page, key)
+                for item in items:
+                    yield item
+                if len(items) < limit:
+                    return
+        finally:
+            # Cancel the pages fetched ahead of the short one
+            await pages.aclose()
+
+    async def _pages(self, path, params, offsets, window=1, multi=False):
+        """Async generator over the page at each offset, in order; offsets may be endless"""
+        if multi:
+            batches = _map_window(
+                lambda chunk: _multi_post(self.requester, chunk),
+                self._page_chunks(path, params, offsets),
+                window,
+            )
+            try:
+                async for batch in batches:
+                    for page in batch:
+                        yield page
+            finally:
+                await batches.aclose()
+        else:
+            pages = _map_window(
+                lambda o: self.GET(path, dict(params, offset=o)), offsets, window
+            )
+            try:
+                async for page in pages:
+                    yield page
+            finally:
+                await pages.aclose()
+
+    def _pipelined(self, path, key, limit, transform, processes, window, params={}):
+        """
+        Async generator over transform(item) for every item of an offset-paged list
+
+        See Foursquare._Endpoint._pipelined.
+        """
+        return _pipeline(
+            self._raw_pages(path, limit, params), key, transform, processes, window
+        )
+
+
+class _AsyncMany(object):
+    """Async flavour of _Endpoint._many, for endpoints with a many utility"""
+
+    async def _many(self, ids, max_workers=1):
+        """
+        Each ID's details, keyed by ID, fetched MAX_MULTI_REQUESTS to a /multi
+
+        Duplicate IDs are fetched once and cached responses aren't fetched
+        at all; up to max_workers /multi requests are in flight at once.
+        Each value is the response, or the FoursquareException for that ID.
+        """
+        results, pending = self._many_pending(ids)
+        chunks = _chunked(pending, MAX_MULTI_REQUESTS)
+        async for index, responses in _map_chunks(
+            self._many_process, chunks, max_workers, ordered=False
+        ):
+            for ID, response in zip(chunks[index], responses):
+                results[ID] = self._many_store(ID, response)
+        return results
+
+    async def _many_process(self, chunk):
+        """Fetch one chunk, turning a failed /multi call into per-ID errors"""
+        try:
+            return await _multi_post(self.requester, self._many_urls(chunk))
+        except FoursquareException as e:
+            return [e] * len(chunk)
+
+
+class AsyncVenueCrawler(VenueCrawler):
+    """
+    VenueCrawler that sweeps on the event loop
+
+        async for venue in api.venues.crawl(sw, ne, window=4):
+            ...
+    """
+
+    def __iter__(self):
+        raise TypeError(u"AsyncVenueCrawler is iterated with async for")
+
+    async def __aiter__(self):
+        queue = collections.deque(self.pending)
+        in_flight = dict()
+        try:
+            while queue or in_flight:
+                while queue and len(in_flight) < self.window:
+                    tile = queue.popleft()
+                    in_flight[asyncio.ensure_future(self._search(tile))] = tile
+                done, _ = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    tile = in_flight.pop(task)
+                    venues, saturated = task.result()
+                    for venue in self._unseen(venues):
+                        yield venue
+                    queue.extend(self._settle(tile, saturated))
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _search(self, tile):
+        """Search one tile; returns its venues and whether it needs splitting"""
+        self.searches += 1
+        try:
+            venues = (await self.venues.search(self._search_params(tile)))["venues"]
+        except GeocodeTooBig:
+            return [], True
+        return venues, len(venues) >= self.limit
+
+
+class AsyncVenueCompleter(VenueCompleter):
+    """
+    VenueCompleter on the event loop
+
+    Calling it returns an awaitable, and submit() returns a task. A newer
+    submit cancels the previous task, including its API call if in flight.
+    """
+
+    async def __call__(self, query, params={}):
+        """suggestcompletion response for query, served locally when possible"""
+        key = self._key(params)
+        response = self._lookup(key, query, params)
+        if response is None:
+            response = await self._fetch(key, query, params)
+        return response
+
+    def submit(self, query, params={}):
+        """Task for query's response, superseding the previous submit"""
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = asyncio.ensure_future(self._run(query, params))
+        return self._pending
+
+    async def _run(self, query, params):
+        """Answer locally, or fetch once no newer submit came within debounce"""
+        key = self._key(params)
+        response = self._lookup(key, query, params)
+        if response is None:
+            await asyncio.sleep(self.debounce)
+            response = await self._fetch(key, query, params)
+        return response
+
+    async def _fetch(self, key, query, params):
+        """Call the API and remember its suggestions"""
+        self.fetches += 1
+        response = await self.venues.suggestcompletion(dict(params, query=query))
+        self._store(key, query, params, response.get("minivenues", []))
+        return response
+
+
+class AsyncCategoryIndex(CategoryIndex):
+    """CategoryIndex whose refreshes run on the event loop"""
+
+    async def refresh(self, venues, path=None):
+        """Fetch the taxonomy now, saving it to path if given"""
+        response = await venues.categories()
+        self.update(response["categories"], venues.requester.version)
+        if path:
+            self.save(path)
+        return self
+
+    def refresh_in_background(self, venues, path=None):
+        """Start refreshing in a task; the old taxonomy serves until then"""
+
+        async def run():
+            try:
+                await self.refresh(venues, path)
+            except (FoursquareException, IOError, OSError) as e:
+                log.warning(u"Category index refresh failed: %s", e)
+
+        return asyncio.ensure_future(run())
+
+
+class AsyncFoursquare(Foursquare):
+    """foursquare V2 API wrapper whose endpoints return awaitables"""
+
+    class OAuth(Foursquare.OAuth):
+        """Handles OAuth authentication procedures and helps retrieve tokens"""
+
+        def _default_transport(self):
+            """Transport used when the client doesn't supply one"""
+            return default_async_transport()
+
+        async def get_token(self, code):
+            """Gets the auth token from a user's response"""
+            if not code:
+                log.error(u"Code not provided")
+                return None
+            # Get the response from the token uri and attempt to parse
+            result = await _get(
+                TOKEN_ENDPOINT, params=self._token_query(code), transport=self.transport
+            )
+            return result["data"]["access_token"]
+
+    class Requester(Foursquare.Requester):
+        """Api requesting object whose GET/POST are coroutines"""
+
+        def _default_transport(self):
+            """Transport used when the client doesn't supply one"""
+            return default_async_transport()
+
+        def _auto_batcher(self, window):
+            """AutoBatcher used when auto batching is enabled"""
+            return AsyncAutoBatcher(self, window)
+
+        def _single_flight(self):
+            """SingleFlight used when single flight is enabled"""
+            return AsyncSingleFlight()
+
+        async def _throttle(self):
+            """Wait for the rate governor to let the next call through"""
+            if self.rate_governor is not None:
+                delay = self.rate_governor.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        def GET(self, path, params={}, **kwargs):
+            """
+            GET request that returns an awaitable for the processed data
+
+            With stream, returns an async generator over the response's items instead.
+            """
+            if kwargs.get("stream"):
+                return self._stream("get", path, kwargs["stream"], params=params.copy())
+            return self._get_response(path, params, **kwargs)
+
+        async def _get_response(self, path, params={}, **kwargs):
+            """GET request that returns processed data"""
+            params = params.copy()
+            # Short-circuit multi requests
+            if kwargs.get("multi") is True:
+                return self.add_multi_request(path, params)
+            # Identical GETs already in flight share their result
+            if self.single_flight is not None:
+                key = self._request_key(path, params)
+                return await self.single_flight.do(key, self._fetch, path, params)
+            return await self._fetch(path, params)
+
+        async def _fetch(self, path, params):
+            """GET from the cache, the auto batcher or the network"""
+            # Serve read-only reference data from the cache when we can
+            cache_key, response, stale = self._cached(path, params)
+            if response is not None:
+                return response
+            # Coalesce with other GETs into a shared multi request
+            if self.auto_batcher is not None:
+                response = await self.auto_batcher.submit(path, params)
+                return self._cache_batched(cache_key, path, response)
+            # Continue processing normal requests
+            await self._throttle()
+            result = await _get(**self._get_request(path, params, stale))
+            return self._cache_result(cache_key, path, stale, result)
+
+        async def _get_raw(self, path, params={}):
+            """GET that returns the undecoded body, e.g. for another process to parse"""
+            await self._throttle()
+            return self._unpack_raw(
+                await _get(**self._get_request(path, params, process=_raw_response))
+            )
+
+        def POST(self, path, data={}, files=None, idempotent=False, stream=None):
+            """
+            POST request that returns an awaitable for the processed data
+
+            With stream, returns an async generator over the response's items instead.
+            """
+            if stream:
+                data = data.copy() if data is not None else None
+                return self._stream(
+                    "post", path, stream, data=data, idempotent=idempotent
+                )
+            return self._post_response(path, data, files, idempotent)
+
+        async def _post_response(self, path, data={}, files=None, idempotent=False):
+            """
+            POST request that returns processed data
+
+            Only idempotent POSTs (or every POST, if the retry policy opts in) are retried.
+            """
+            if data is not None:
+                data = data.copy()
+            if files is not None:
+                files = files.copy()
+            await self._throttle()
+            return self._unpack(
+                await _post(**self._post_request(path, data, files, idempotent))
+            )
+
+        async def _stream(
+            self, method, path, items, params=None, data=None, idempotent=False
+        ):
+            """Async generator over the items of a response, decoded as they arrive"""
+            await self._throttle()
+            headers, body, release = await _open_stream(
+                **self._stream_request(method, path, params, data, idempotent)
+            )
+            self._record_rate_limit(headers)
+            prefix = "response." + items
+            try:
+                if isinstance(body, bytes):
+                    for item in ijson.items(io.BytesIO(body), prefix, use_float=True):
+                        yield item
+                else:
+                    async for item in ijson.items_async(body, prefix, use_float=True):
+                        yield item
+            finally:
+                release()
+
+    class Batch(Foursquare.Batch):
+        """
+        Explicit /multi batch for the asyncio client
+
+            async with api.batch() as b:
+                venue = b.venues(VENUE_ID)
+            venue.result()
+        """
+
+        def __enter__(self):
+            raise TypeError(u"Use 'async with' with the asyncio client's batch")
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc_value, traceback):
+            if exc_type is None:
+                await self.execute()
+            else:
+                self.cancel()
+
+        async def execute(self):
+            """Send the queued sub-requests and resolve their futures"""
+            queue = self._drain()
+            chunks = _chunked(queue, MAX_MULTI_REQUESTS)
+            try:
+                async for index, responses in _map_chunks(
+                    self._process, chunks, self.max_workers, ordered=False
+                ):
+                    for (_, future), response in zip(chunks[index], responses):
+                        _resolve_future(future, response)
+            except BaseException as e:
+                _fail_futures([future for _, future in queue], e)
+                raise
+            _fail_futures([future for _, future in queue], _missing_sub_response())
+
+        async def _process(self, chunk):
+            """Send one chunk, turning a failed /multi call into per-request errors"""
+            try:
+                return await self.client.multi._process([url for url, _ in chunk])
+            except Exception as e:
+                return [e] * len(chunk)
+
+    class Users(_AsyncPaged, _AsyncMany, Foursquare.Users):
+        """User specific endpoint"""
+
+        async def sync_checkins(self, store, USER_ID=u"self", window=1, multi=False):
+            """
+            Utility function: Async generator over the checkins made since the last sync
+
+            See Foursquare.Users.sync_checkins.
+            """
+            cursor, args = self._checkins_sync(store, USER_ID)
+            try:
+                async for checkin in self._paged_forward(
+                    *args, window=window, multi=multi
+                ):
+                    cursor.advance(checkin["createdAt"])
+                    yield checkin
+            finally:
+                cursor.save()
+
+    class Venues(_AsyncPaged, _AsyncMany, Foursquare.Venues):
+        """Venue specific endpoint"""
+
+        def _crawler(self, *args):
+            """AsyncVenueCrawler used by crawl"""
+            return AsyncVenueCrawler(self, *args)
+
+        def _completer(self, *args):
+            """AsyncVenueCompleter used by completer"""
+            return AsyncVenueCompleter(self, *args)
+
+        async def category_index(self, path=None, max_age=CATEGORY_INDEX_MAX_AGE):
+            """
+            Utility function: CategoryIndex of the venue category taxonomy
+
+            With a path, the index is loaded from there when it was saved for
+            this API version, refreshed in the background once older than
+            max_age seconds, and saved back after every fetch.
+            """
+            index = (
+                AsyncCategoryIndex.load(path, self.requester.version) if path else None
+            )
+            if index is None:
+                index = AsyncCategoryIndex()
+                await index.refresh(self, path)
+            elif index.age() > max_age:
+                index.refresh_in_background(self, path)
+            return index
+
+    class Tips(_AsyncMany, Foursquare.Tips):
+        """Tips specific endpoint"""
+
+    class Lists(_AsyncMany, Foursquare.Lists):
+        """Lists specific endpoint"""
+
+    class Photos(_AsyncMany, Foursquare.Photos):
+        """Photo specific endpoint"""
+
+        def add_many(
+            self, uploads, window=4, photo_content_type="image/jpeg", progress=None
+        ):
+            """
+            Utility function: Add each (photo_data, params) pair, window at a time
+
+            An async generator over each upload's response or FoursquareException,
+            in order. progress is called as progress(index, bytes_sent, total_bytes).
+            """
+            return _map_window(
+                self._add_one,
+                (
+                    (index, upload, photo_content_type, progress)
+                    for index, upload in enumerate(uploads)
+                ),
+                window,
+            )
+
+        async def _add_one(self, job):
+            """Add one photo of add_many, returning any error instead of raising"""
+            index, (photo_data, params), photo_content_type, progress = job
+            try:
+                return await self.add(
+                    photo_data,
+                    params,
+                    photo_content_type,
+                    _indexed_progress(progress, index),
+                )
+            except FoursquareException as e:
+                return e
+
+    class Pages(_AsyncPaged, Foursquare.Pages):
+        """Pages specific endpoint"""
+
+    class Multi(Foursquare.Multi):
+        """Multi request endpoint handler"""
+
+        async def __call__(self, max_workers=1, as_completed=False, stream=False):
+            """
+            Async generator to process the current queue of multi's
+
+            note: This generator will yield both data and FoursquareException's
+            The code processing this sequence must check the yields for their type.
+            The exceptions should be handled by the calling code, or raised.
+
+            max_workers > 1 keeps that many /multi chunks in flight on the event
+            loop; responses are still yielded in the order they were queued.
+            With as_completed, (index, response) pairs are yielded as soon as
+            each chunk returns, where index is the sub-request's position in the queue.
+            With stream, each sub-response is yielded as soon as it has been decoded.
+            """
+            if max_workers > 1 or as_completed:
+                async for response in self._dispatch(max_workers, as_completed):
+                    yield response
+                return
+            while True:
+                # Pull n requests from the multi-request queue
+                requests = self.requester.pop_multi_requests(MAX_MULTI_REQUESTS)
+                if not requests:
+                    break
+                if stream:
+                    async for response in self._stream(requests):
+                        yield response
+                else:
+                    for response in await self._process(requests):
+                        yield response
+
+        async def _stream(self, requests):
+            """Send one 4sq multi request and decode each sub-response as it arrives"""
+            async for response in self.POST(
+                data=_multi_data(requests), idempotent=True, stream="responses.item"
+            ):
+                yield _unpack_multi_response(response)
+
+        async def _dispatch(self, max_workers, as_completed):
+            """Send the whole queue as concurrent chunks, at most max_workers at a time"""
+            chunks = list()
+            while True:
+                requests = self.requester.pop_multi_requests(MAX_MULTI_REQUESTS)
+                if not requests:
+                    break
+                chunks.append(requests)
+            async for index, responses in _map_chunks(
+                self._process, chunks, max_workers, ordered=not as_completed
+            ):
+                for offset, response in enumerate(responses):
+                    if as_completed:
+                        yield (index * MAX_MULTI_REQUESTS + offset, response)
+                    else:
+                        yield response
+
+        async def _process(self, requests):
+            """Send one 4sq multi request and return each sub-response or exception"""
+            return await _multi_post(self.requester, requests)
+
+
+async def _map_chunks(process, chunks, max_workers=1, ordered=True):
+    """
+    Awaits process over each chunk, with at most max_workers in flight
+
+    Yields (chunk index, result) pairs, in chunk order or as each completes.
+    """
+    semaphore = asyncio.Semaphore(max(max_workers, 1))
+
+    async def run(index, chunk):
+        async with semaphore:
+            return index, await process(chunk)
+
+    tasks = [
+        asyncio.ensure_future(run(index, chunk)) for index, chunk in enumerate(chunks)
+    ]
+    try:
+        for task in tasks if ordered else asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _map_window(process, items, window=1):
+    """Yields await process(item) for each item, in order, with up to window in flight"""
+    pending = collections.deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(process(item)))
+            if len(pending) >= max(window, 1):
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _pipeline(fetch, key, transform=None, processes=None, window=1):
+    """
+    Yields transform(item) for every item of an offset-paged list, in order
+
+    Like foursquare._pipeline, but fetch(offset) is a coroutine and the
+    process pool is awaited through the event loop.
+    """
+    processes = processes or os.cpu_count() or 1
+    max_pending = processes * PIPELINE_PAGES_PER_PROCESS
+    loop = asyncio.get_event_loop()
+    pool = futures.ProcessPoolExecutor(processes)
+
+    def decode(body):
+        return loop.run_in_executor(pool, _decode_page, body, key, transform)
+
+    pending = collections.deque()
+    try:
+        count, page_size, items = await decode(await fetch(0))
+        for item in items:
+            yield item
+        offsets = _page_offsets(count, page_size)
+        async for body in _map_window(fetch, offsets, window):
+            pending.append(decode(body))
+            if len(pending) >= max_pending:
+                for item in (await pending.popleft())[2]:
+                    yield item
+        while pending:
+            for item in (await pending.popleft())[2]:
+                yield item
+    finally:
+        for future in pending:
+            future.cancel()
+        # Don't block the loop on pages nobody is waiting for anymore
+        pool.shutdown(wait=False)
+
+
+async def _aiter(iterable):
+    """Async generator over a plain iterable, such as a MultipartEncoder"""
+    for item in iterable:
+        yield item
+
+
+async def _multi_post(requester, urls):
+    """Send encoded sub-request urls as one /multi request; returns each sub-response"""
+    response = await requester.POST("/multi", data=_multi_data(urls), idempotent=True)
+    return _unpack_multi_responses(response)
+
+
+"""
+Network helper functions
+"""
+
+
+async def _get(
+    url,
+    headers={},
+    params=None,
+    timeout=GET_TIMEOUT,
+    transport=None,
+    retry_policy=None,
+    event=None,
+    process=None,
+):
+    """Tries to GET data from an endpoint using retries"""
+    transport = transport if transport else default_async_transport()
+    param_string = _encode_get(url, params, event)
+
+    async def send():
+        started = time.perf_counter()
+        try:
+            response = await transport.get(
+                url, headers=headers, params=param_string, timeout=timeout
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _connection_failed(event, started, e)
+        return _received(response, event, started, process)
+
+    return await _with_retries(send, retry_policy, event=event)
+
+
+async def _post(
+    url,
+    headers={},
+    data=None,
+    files=None,
+    timeout=POST_TIMEOUT,
+    transport=None,
+    retry_policy=None,
+    idempotent=False,
+    event=None,
+):
+    """Tries to POST data to an endpoint, retrying only if it is safe to"""
+    transport = transport if transport else default_async_transport()
+
+    async def send():
+        started = time.perf_counter()
+        try:
+            response = await transport.post(
+                url, headers=headers, data=data, files=files, timeout=timeout
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _connection_failed(event, started, e)
+        return _received(response, event, started)
+
+    return await _with_retries(
+        send,
+        retry_policy,
+        _should_retry_post(retry_policy, files, idempotent),
+        event=event,
+    )
+
+
+async def _open_stream(
+    method,
+    url,
+    headers={},
+    params=None,
+    data=None,
+    timeout=GET_TIMEOUT,
+    transport=None,
+    retry_policy=None,
+    retry=True,
+    event=None,
+):
+    """
+    Sends a request without reading its body
+
+    Returns the response headers, the body (a stream, or bytes when an error
+    response had to be read) and a callable that releases the connection.
+    """
+    if ijson is None:
+        raise ImportError(u"Streaming requires ijson (pip install foursquare[stream])")
+    transport = transport if transport else default_async_transport()
+    param_string = _encode_query(params, event) if params is not None else None
+
+    async def send():
+        started = time.perf_counter()
+        try:
+            response = await transport.open(
+                method,
+                url,
+                headers=headers,
+                params=param_string,
+                data=data,
+                timeout=timeout,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _connection_failed(event, started, e)
+        if not _stream_opened(event, started, response.status, response.headers):
+            # Only conflicts come back from _process_response
+            content = await response.read()
+            response.release()
+            _process_response(
+                _AsyncResponse(response.status, response.headers, content), event
+            )
+            return response.headers, content, response.release
+        return response.headers, response.content, response.release
+
+    return await _with_retries(send, retry_policy, retry, event=event)
+
+
+async def _with_retries(send, retry_policy=None, retry=True, event=None):
+    """Awaits send until it succeeds or the retry policy gives up"""
+    attempts = _Attempts(retry_policy, retry, event)
+    while True:
+        try:
+            return attempts.succeeded(await send())
+        except FoursquareException as e:
+            delay = attempts.failed(e)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
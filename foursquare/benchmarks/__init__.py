@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+"""Benchmarks for the client's own overhead, run against a local mock API
+
+    python -m foursquare.benchmarks --output results.json
+
+Nothing here touches the real API or spends quota. Every scenario runs
+against MockFoursquareServer, which replays canned meta/response payloads.
+"""
@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+from .runner import main
+
+main()
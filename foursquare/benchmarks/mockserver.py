@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+"""Local stand-in for the foursquare API that replays canned payloads"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+import collections
+import email.parser
+import email.utils
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from six.moves.urllib import parse
+
+from .. import json
+
+# Checkins in the mock user's history
+CHECKIN_COUNT = 1000
+
+RATE_LIMIT = 5000
+
+
+def _venue(venue_id):
+    return {
+        "id": venue_id,
+        "name": u"Mock Venue {0}".format(venue_id),
+        "location": {
+            "address": u"1 Main St",
+            "lat": 40.7,
+            "lng": -74.0,
+            "formattedAddress": [u"1 Main St", u"New York, NY 10001"],
+        },
+        "categories": [{"id": u"4bf58dd8d48988d1e0931735", "name": u"Coffee Shop"}],
+        "stats": {"tipCount": 12, "usersCount": 345, "checkinsCount": 6789},
+        "rating": 8.4,
+    }
+
+
+# createdAt of the first checkin; the others follow a minute apart
+CHECKIN_EPOCH = 1500000000
+
+# Names given to venues since, by venue id; renaming one changes its ETag
+venue_names = dict()
+
+
+def _checkin(index):
+    return {
+        "id": u"checkin{0}".format(index),
+        "createdAt": CHECKIN_EPOCH + index * 60,
+        "type": u"checkin",
+        "venue": _venue(u"venue{0}".format(index % 50)),
+    }
+
+
+def _checkins(params):
+    limit = int(params.get("limit", 20))
+    offset = int(params.get("offset", 0))
+    # Oldest first; like the API, count ignores what afterTimestamp filters out
+    after = params.get("afterTimestamp")
+    first = 0
+    if after is not None:
+        first = min(max((int(after) - CHECKIN_EPOCH) // 60 + 1, 0), CHECKIN_COUNT)
+    start = first + offset
+    items = [_checkin(i) for i in range(start, min(start + limit, CHECKIN_COUNT))]
+    return {"checkins": {"count": CHECKIN_COUNT, "items": items}}
+
+
+def _conditional(payload, headers, request_headers):
+    """
+    A 200 with payload and its validators, or a 304 if the client's copy is current
+
+    ETag validators win over Last-Modified ones, as in HTTP.
+    """
+    if "ETag" in headers:
+        current = request_headers.get("If-None-Match") == headers["ETag"]
+    else:
+        current = request_headers.get("If-Modified-Since") == headers["Last-Modified"]
+    if current:
+        return 304, None, headers
+    return 200, payload, headers
+
+
+def _error(error_type, code=400):
+    return code, {
+        "meta": {
+            "code": code,
+            "errorType": error_type,
+            "errorDetail": u"Mock {0}".format(error_type),
+        },
+        "response": {},
+    }
+
+
+# Requests seen per /flaky/<name> path, so each can fail a set number of times
+_flaky_attempts = collections.Counter()
+_flaky_lock = threading.Lock()
+
+
+def _flaky(name, params):
+    """
+    Fail the first `failures` requests for name, then succeed
+
+    Failures are errorType errors with the given HTTP status, and a
+    Retry-After header when retryAfter is given.
+    """
+    with _flaky_lock:
+        _flaky_attempts[name] += 1
+        attempts = _flaky_attempts[name]
+    if attempts <= int(params.get("failures", 1)):
+        status, payload = _error(
+            params.get("errorType", "server_error"), int(params.get("status", 400))
+        )
+        if "retryAfter" in params:
+            return status, payload, {"Retry-After": params["retryAfter"]}
+        return status, payload
+    return 200, {"meta": {"code": 200}, "response": {"attempts": attempts}}
+
+
+def respond(method, path, params, headers={}):
+    """
+    Returns the (status, payload) the mock API gives for a request
+
+    Responses that need headers of their own come back as
+    (status, payload, headers).
+    """
+    if path == "/oauth2/access_token":
+        # Token responses are bare, without meta
+        return 200, {"access_token": u"MOCKACCESSTOKEN"}
+    segments = [s for s in path.split("/") if s][1:]  # Drop the /v2 prefix
+    if segments[:1] == ["flaky"] and len(segments) == 2:
+        return _flaky(segments[1], params)
+    if method == "GET":
+        if segments[:1] == ["errors"] and len(segments) == 2:
+            return _error(segments[1])
+        if segments == ["ratelimit"]:
+            # Whatever quota the request asks to be told it has left
+            headers = {"X-RateLimit-Remaining": params.get("remaining", RATE_LIMIT)}
+            if "reset" in params:
+                headers["X-RateLimit-Reset"] = params["reset"]
+            return 200, {"meta": {"code": 200}, "response": {}}, headers
+        if segments == ["echo"]:
+            # What the request arrived with, e.g. to look for cookies or tokens
+            return 200, {
+                "meta": {"code": 200},
+                "response": {"headers": headers, "params": params},
+            }
+        if segments == ["cookies", "set"]:
+            return (
+                200,
+                {"meta": {"code": 200}, "response": {}},
+                {"Set-Cookie": u"mock_session=MOCKSESSION; Path=/"},
+            )
+        if (
+            segments[:1] == ["users"]
+            and len(segments) == 3
+            and segments[2] == "checkins"
+        ):
+            return 200, {"meta": {"code": 200}, "response": _checkins(params)}
+        if segments[:1] == ["users"] and len(segments) == 2:
+            # Users are only ever validated by date, venues by ETag
+            payload = {
+                "meta": {"code": 200},
+                "response": {"user": {"id": segments[1], "firstName": u"Mock"}},
+            }
+            last_modified = email.utils.formatdate(CHECKIN_EPOCH, usegmt=True)
+            return _conditional(payload, {"Last-Modified": last_modified}, headers)
+        if segments[:1] == ["venues"] and len(segments) == 2:
+            venue = _venue(segments[1])
+            venue["name"] = venue_names.get(segments[1], venue["name"])
+            payload = {"meta": {"code": 200}, "response": {"venue": venue}}
+            digest = hashlib.sha1(json.dumps(payload).encode("utf8")).hexdigest()
+            return _conditional(payload, {"ETag": u'"{0}"'.format(digest)}, headers)
+    elif method == "POST":
+        if segments == ["multi"]:
+            responses = list()
+            for request in params.get("requests", "").split(","):
+                sub_path, _, query = parse.unquote_plus(request).partition("?")
+                sub_params = dict(parse.parse_qsl(query))
+                responses.append(respond("GET", "/v2" + sub_path, sub_params)[1])
+            return 200, {"meta": {"code": 200}, "response": {"responses": responses}}
+        if segments == ["photos", "add"]:
+            # Echo what arrived, so uploads can be checked end to end
+            photo = params.get("photo", b"")
+            return 200, {
+                "meta": {"code": 200},
+                "response": {
+                    "photo": {
+                        "id": u"photo1",
+                        "size": len(photo),
+                        "venueId": params.get("venueId"),
+                    }
+                },
+            }
+    return _error("endpoint_error", 404)
+
+
+def _multipart_params(content_type, body):
+    """Form fields of a multipart body: text for fields, bytes for files"""
+    message = email.parser.BytesParser().parsebytes(
+        b"Content-Type: " + content_type.encode("latin1") + b"\r\n\r\n" + body
+    )
+    params = dict()
+    for part in message.get_payload():
+        payload = part.get_payload(decode=True)
+        if part.get_filename() is None:
+            payload = payload.decode("utf8")
+        params[part.get_param("name", header="content-disposition")] = payload
+    return params
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+    def do_GET(self):
+        url = parse.urlparse(self.path)
+        params = dict(parse.parse_qsl(url.query))
+        self._send(*respond("GET", url.path, params, dict(self.headers.items())))
+
+    def do_POST(self):
+        body = self._read_body()
+        content_type = self.headers.get("Content-Type", "")
+        params = dict()
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            params = dict(parse.parse_qsl(body.decode("utf8")))
+        elif content_type.startswith("multipart/form-data"):
+            params = _multipart_params(content_type, body)
+        path = parse.urlparse(self.path).path
+        self._send(*respond("POST", path, params, dict(self.headers.items())))
+
+    def _read_body(self):
+        """The request body, whether sized or sent chunked"""
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunks = list()
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if not size:
+                # Skip any trailers, up to the blank line that ends the body
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def _send(self, status, payload, headers={}):
+        # Not Modified responses have no body at all
+        body = b"" if payload is None else json.dumps(payload).encode("utf8")
+        headers = dict(
+            {
+                "X-RateLimit-Limit": str(RATE_LIMIT),
+                "X-RateLimit-Remaining": str(RATE_LIMIT),
+            },
+            **headers
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request, e.g. a cancelled read-ahead
+            self.close_connection = True
+
+
+class MockFoursquareServer(object):
+    """
+    Threaded HTTP server on localhost that speaks the foursquare response format
+
+        with MockFoursquareServer() as server:
+            foursquare.API_ENDPOINT = server.api_endpoint
+            foursquare.TOKEN_ENDPOINT = server.token_endpoint
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_endpoint(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{0}:{1}/v2".format(host, port)
+
+    @property
+    def token_endpoint(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{0}:{1}/oauth2/access_token".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
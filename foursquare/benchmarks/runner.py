@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+"""Times each benchmark scenario and reports machine-readable results"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+import argparse
+import io
+import platform
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import foursquare
+
+from .. import json
+from .mockserver import MockFoursquareServer
+
+VENUE_ID = u"40a55d80f964a52020f31ee3"
+USER_ID = u"1070527"
+
+# Size of the image sent by the photo upload scenario
+PHOTO_SIZE = 256 * 1024
+
+URLENCODE_PARAMS = {
+    "ll": u"40.7233,-74.0030",
+    "query": u"coffee & tea",
+    "categoryId": u"4bf58dd8d48988d1e0931735,4bf58dd8d48988d16d941735",
+    "limit": 50,
+    "v": foursquare.API_VERSION,
+    "oauth_token": u"MOCKACCESSTOKEN",
+}
+
+
+def _single_get(api):
+    api.venues(VENUE_ID)
+
+
+def _error_get(api):
+    try:
+        api.base_requester.GET("/errors/param_error")
+    except foursquare.ParamError:
+        pass
+
+
+def _multi_batch(api):
+    for _ in range(foursquare.MAX_MULTI_REQUESTS * 5):
+        api.venues(VENUE_ID, multi=True)
+    for _ in api.multi():
+        pass
+
+
+def _all_checkins(api):
+    for _ in api.users.all_checkins(USER_ID):
+        pass
+
+
+def _photo_upload(api):
+    api.photos.add(io.BytesIO(b"\0" * PHOTO_SIZE), {"venueId": VENUE_ID})
+
+
+def _urlencode(api):
+    foursquare._foursquare_urlencode(URLENCODE_PARAMS)
+
+
+# (name, function, iterations)
+SCENARIOS = (
+    ("single_get", _single_get, 500),
+    ("error_get", _error_get, 500),
+    ("multi_batch", _multi_batch, 100),
+    ("all_checkins", _all_checkins, 20),
+    ("photo_upload", _photo_upload, 100),
+    ("urlencode", _urlencode, 20000),
+)
+
+
+def _percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _peak_rss_kb():
+    """Peak resident set size of this process so far, in KiB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _allocated(function, api):
+    """
+    Peak bytes allocated during one call, over what was held before it
+
+    Memory the call frees again before returning still counts, unlike the
+    traced size left at the end, which is ~0 for calls that only allocate
+    temporaries.
+    """
+    if hasattr(tracemalloc, "reset_peak"):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    else:  # Python < 3.9: restarting is the only way to reset the peak
+        tracemalloc.stop()
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    function(api)
+    return tracemalloc.get_traced_memory()[1] - before
+
+
+def measure(name, function, api, iterations):
+    """Runs one scenario and returns its results"""
+    # Warm up connections and caches before timing anything
+    for _ in range(max(iterations // 10, 1)):
+        function(api)
+
+    latencies = list()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        function(api)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    # Allocations are counted in a separate, shorter pass: tracing skews timings
+    alloc_iterations = max(iterations // 10, 1)
+    allocations = [_allocated(function, api) for _ in range(alloc_iterations)]
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "iterations": iterations,
+        "calls_per_sec": iterations / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "alloc_bytes_per_call": sum(allocations) // alloc_iterations,
+        "alloc_peak_bytes": max(allocations),
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def run(names=None, scale=1.0, cassette=None):
+    """
+    Runs the named scenarios (default: all) against a fresh mock server
+
+    With a cassette path, the mock server's responses are recorded there on
+    the first run and replayed from it afterwards, leaving HTTP out entirely.
+    """
+    results = list()
+    endpoint = foursquare.API_ENDPOINT
+    with MockFoursquareServer() as server:
+        foursquare.API_ENDPOINT = server.api_endpoint
+        transport = foursquare.Transport()
+        if cassette:
+            transport = foursquare.CassetteTransport(
+                cassette, mode=u"once", transport=transport
+            )
+        try:
+            api = foursquare.Foursquare(
+                access_token=u"MOCKACCESSTOKEN", transport=transport
+            )
+            for name, function, iterations in SCENARIOS:
+                if names and name not in names:
+                    continue
+                log.info(u"Running %s", name)
+                results.append(
+                    measure(name, function, api, max(int(iterations * scale), 1))
+                )
+        finally:
+            foursquare.API_ENDPOINT = endpoint
+            transport.close()
+    return {
+        "foursquare": foursquare.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the foursquare client against a local mock API"
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="scenarios to run: {0} (default: all)".format(
+            ", ".join(name for name, _, _ in SCENARIOS)
+        ),
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiply every iteration count"
+    )
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument(
+        "--cassette", help="record responses here once, then replay them without HTTP"
+    )
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run(args.scenarios, args.scale, args.cassette))
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
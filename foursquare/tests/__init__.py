@@ -7,6 +7,13 @@ import time
 import unittest
 
 import foursquare
+from foursquare.benchmarks.mockserver import MockFoursquareServer
+
+# With FOURSQUARE_CASSETTE_DIR set, each test records its API traffic to a
+# cassette there, or replays it offline if it was recorded before (see
+# FOURSQUARE_CASSETTE_MODE: once, record or replay)
+CASSETTE_DIR = os.environ.get("FOURSQUARE_CASSETTE_DIR")
+CASSETTE_MODE = os.environ.get("FOURSQUARE_CASSETTE_MODE", "once")
 
 if (
     "CLIENT_ID" in os.environ
@@ -20,9 +27,15 @@ else:
     try:
         from foursquare.tests._creds import *
     except ImportError:
-        print(
-            "Please create a creds.py file in this package, based upon creds.example.py"
-        )
+        if CASSETTE_DIR:
+            # Cassettes never contain credentials, so any will do for replays.
+            # Recording with them would only capture invalid_auth errors
+            CLIENT_ID = CLIENT_SECRET = ACCESS_TOKEN = u"CASSETTE"
+            CASSETTE_MODE = "replay"
+        else:
+            print(
+                "Please create a creds.py file in this package, based upon creds.example.py"
+            )
 
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "testdata")
@@ -42,7 +55,23 @@ class BaseEndpointTestCase(unittest.TestCase):
     default_eventid = u"4e173d2cbd412187aabb3c04"
     default_pageid = u"1070527"
 
+    _cassette = None
+
+    @property
+    def transport(self):
+        """This test's CassetteTransport, or None to use the network"""
+        if CASSETTE_DIR and self._cassette is None:
+            path = os.path.join(CASSETTE_DIR, self.id() + ".json.gz")
+            if CASSETTE_MODE == "replay" and not os.path.exists(path):
+                self.skipTest(u"No cassette recorded for {0}".format(self.id()))
+            self._cassette = foursquare.CassetteTransport(path, mode=CASSETTE_MODE)
+        return self._cassette
+
     def tearDown(self):
+        if self._cassette is not None:
+            self._cassette.close()
+            if self._cassette.mode == "replay":
+                return
         # If `FOURSQUARE_TEST_THROTTLE` is passed as an environmental
         # variable, it will sleep for that many seconds at the end
         # of every test. This is useful for the CI system to ensure
@@ -59,18 +88,21 @@ class BaseAuthenticationTestCase(BaseEndpointTestCase):
             client_id=CLIENT_ID,
             client_secret=CLIENT_SECRET,
             redirect_uri="http://example.org",
+            transport=self.transport,
         )
 
 
 class BaseAuthenticatedEndpointTestCase(BaseEndpointTestCase):
     def setUp(self):
-        self.api = foursquare.Foursquare(access_token=ACCESS_TOKEN)
+        self.api = foursquare.Foursquare(
+            access_token=ACCESS_TOKEN, transport=self.transport
+        )
 
 
 class BaseUserlessEndpointTestCase(BaseEndpointTestCase):
     def setUp(self):
         self.api = foursquare.Foursquare(
-            client_id=CLIENT_ID, client_secret=CLIENT_SECRET
+            client_id=CLIENT_ID, client_secret=CLIENT_SECRET, transport=self.transport
         )
 
 
@@ -80,6 +112,34 @@ class MultilangEndpointTestCase(BaseEndpointTestCase):
         for lang in ("es", "fr", "de", "it", "ja", "th", "ko", "ru", "pt", "id"):
             self.apis.append(
                 foursquare.Foursquare(
-                    client_id=CLIENT_ID, client_secret=CLIENT_SECRET, lang=lang
+                    client_id=CLIENT_ID,
+                    client_secret=CLIENT_SECRET,
+                    lang=lang,
+                    transport=self.transport,
                 )
             )
+
+
+class BaseMockEndpointTestCase(BaseEndpointTestCase):
+    """Runs against a local MockFoursquareServer, without network or credentials"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockFoursquareServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self._endpoints = foursquare.API_ENDPOINT, foursquare.TOKEN_ENDPOINT
+        foursquare.API_ENDPOINT = self.server.api_endpoint
+        foursquare.TOKEN_ENDPOINT = self.server.token_endpoint
+        self.api = self.mock_api()
+
+    def tearDown(self):
+        foursquare.API_ENDPOINT, foursquare.TOKEN_ENDPOINT = self._endpoints
+
+    def mock_api(self, **kwargs):
+        """A client of the mock API; kwargs are passed on to Foursquare"""
+        return foursquare.Foursquare(access_token=u"MOCKACCESSTOKEN", **kwargs)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+import logging
+
+log = logging.getLogger(__name__)
+
+import asyncio
+import io
+import unittest
+
+import foursquare
+
+try:
+    from foursquare import aio
+except ImportError:
+    aio = None
+
+from foursquare.benchmarks import mockserver
+
+from . import BaseMockEndpointTestCase
+
+
+async def _collect(items):
+    """List of what an async generator yields"""
+    return [item async for item in items]
+
+
+@unittest.skipIf(aio is None, u"The asyncio client requires aiohttp")
+class AsyncMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    The asyncio client, against the mock API
+    """
+
+    def mock_api(self, **kwargs):
+        kwargs.setdefault("transport", aio.AsyncTransport())
+        return aio.AsyncFoursquare(access_token=u"MOCKACCESSTOKEN", **kwargs)
+
+    def run_async(self, awaitable):
+        """Run awaitable to completion on a new event loop, then close the client"""
+
+        async def run():
+            try:
+                return await awaitable
+            finally:
+                await self.api.base_requester.transport.close()
+
+        return asyncio.run(run())
+
+    def _requests(self, histogram, key=u"GET /users"):
+        return histogram.snapshot().get(key, {}).get("count", 0)
+
+    def test_get(self):
+        response = self.run_async(self.api.venues(self.default_venueid))
+        assert response["venue"]["id"] == self.default_venueid
+
+    def test_error(self):
+        with self.assertRaises(foursquare.ParamError):
+            self.run_async(self.api.base_requester.GET("/errors/param_error"))
+
+    def test_many(self):
+        ids = [u"a", u"b", u"a", 3, u"c", u"d", u"e", u"f"]
+        responses = self.run_async(self.api.venues.many(ids, max_workers=2))
+        assert list(responses) == [u"a", u"b", 3, u"c", u"d", u"e", u"f"]
+        assert responses[3]["venue"]["id"] == u"3"
+
+    def test_all_checkins(self):
+        api = foursquare.Foursquare(access_token=u"MOCKACCESSTOKEN")
+        ids = [c["id"] for c in api.users.all_checkins()]
+        # Each run is on a new event loop, which gets its own session
+        for kwargs in ({}, {"window": 3}, {"multi": True, "window": 2}):
+            checkins = self.run_async(_collect(self.api.users.all_checkins(**kwargs)))
+            assert [c["id"] for c in checkins] == ids
+
+    def test_sync_checkins(self):
+        histogram = foursquare.HistogramObserver()
+        self.api = self.mock_api(observers=[histogram])
+        store = foursquare.MemoryCursorStore()
+        key = self.api.users._cursor_key(u"checkins", u"self")
+        checkins = self.run_async(_collect(self.api.users.sync_checkins(store)))
+        assert len(checkins) == mockserver.CHECKIN_COUNT
+        assert self._requests(histogram) == 5
+        # Same paging as the blocking client: one short page for a small delta
+        store.set(key, checkins[-4]["createdAt"])
+        newer = self.run_async(_collect(self.api.users.sync_checkins(store)))
+        assert [c["id"] for c in newer] == [c["id"] for c in checkins[-3:]]
+        assert self._requests(histogram) == 6
+        assert store.get(key) == checkins[-1]["createdAt"]
+
+    def test_retry(self):
+        histogram = foursquare.HistogramObserver()
+        self.api = self.mock_api(
+            observers=[histogram], retry_policy=foursquare.RetryPolicy(base_delay=0)
+        )
+        response = self.run_async(
+            self.api.base_requester.GET("/flaky/aio_retry", {"failures": 2})
+        )
+        assert response["attempts"] == 3
+        series = histogram.snapshot()[u"GET /flaky"]
+        assert (series["count"], series["errors"], series["retries"]) == (1, 0, 2)
+        # The failed attempts' error phase isn't carried over
+        assert "error" not in series["phases"]
+
+    def test_stream(self):
+        checkins = self.api.users.checkins(params={"limit": 100}, stream=True)
+        assert len(self.run_async(_collect(checkins))) == 100
+
+    def test_multi(self):
+        async def run():
+            for ID in range(7):
+                await self.api.venues(ID, multi=True)
+            return await _collect(self.api.multi(max_workers=2))
+
+        responses = self.run_async(run())
+        assert [r["venue"]["id"] for r in responses] == [str(i) for i in range(7)]
+
+    def test_batch(self):
+        async def run():
+            async with self.api.batch() as batch:
+                venue = batch.venues(self.default_venueid)
+                error = batch.venues.tips(self.default_venueid)
+            return venue, error
+
+        venue, error = self.run_async(run())
+        assert venue.result()["venue"]["id"] == self.default_venueid
+        assert isinstance(error.exception(), foursquare.EndpointError)
+
+    def test_batch_sync_with(self):
+        with self.assertRaises(TypeError):
+            with self.api.batch() as batch:
+                batch.venues(self.default_venueid)
+
+    def test_batch_error(self):
+        class FailingMulti(aio.AsyncFoursquare.Multi):
+            async def _process(self, requests):
+                raise ValueError(u"Mock failure")
+
+        class FailingFoursquare(aio.AsyncFoursquare):
+            Multi = FailingMulti
+
+        self.api = FailingFoursquare(
+            access_token=u"MOCKACCESSTOKEN", transport=aio.AsyncTransport()
+        )
+
+        async def run():
+            async with self.api.batch() as batch:
+                venue = batch.venues(self.default_venueid)
+                user = batch.users()
+            return venue, user
+
+        for future in self.run_async(run()):
+            assert isinstance(future.exception(), ValueError)
+
+    def test_auto_batch(self):
+        histogram = foursquare.HistogramObserver()
+        self.api = self.mock_api(auto_batch_window=0.05, observers=[histogram])
+
+        async def run():
+            return await asyncio.gather(*[self.api.venues(ID) for ID in range(7)])
+
+        responses = self.run_async(run())
+        assert [r["venue"]["id"] for r in responses] == [str(ID) for ID in range(7)]
+        # One full batch right away, then the rest when the window closes
+        assert self._requests(histogram, u"POST /multi") == 2
+        assert self._requests(histogram, u"GET /venues") == 0
+
+    def test_single_flight(self):
+        histogram = foursquare.HistogramObserver()
+        self.api = self.mock_api(single_flight=True, observers=[histogram])
+
+        async def run():
+            return await asyncio.gather(
+                *[self.api.venues(self.default_venueid) for _ in range(10)]
+            )
+
+        responses = self.run_async(run())
+        assert len(responses) == 10
+        assert self.api.single_flight.stats() == {"collapsed": 9, "in_flight": 0}
+        assert self._requests(histogram, u"GET /venues") == 1
+        # Each caller has its own copy to mutate
+        assert len(set(id(r) for r in responses)) == 10
+        responses[0]["venue"]["stats"]["tipCount"] = 0
+        assert all(r["venue"]["stats"]["tipCount"] == 12 for r in responses[1:])
+
+    def test_sessions(self):
+        transport = self.api.base_requester.transport
+        sessions = list()
+
+        async def run():
+            await self.api.venues(self.default_venueid)
+            sessions.append(transport.session)
+
+        # Without an explicit close, each loop's session is closed and
+        # forgotten as asyncio.run shuts the loop down
+        for _ in range(3):
+            asyncio.run(run())
+        assert len(set(sessions)) == 3
+        assert all(session.closed for session in sessions)
+        assert len(transport._sessions) == 0
+
+    def test_revalidate(self):
+        cache = foursquare.ResponseCache(ttls=(("/venues/*", 0.05),))
+        self.api = self.mock_api(cache=cache)
+
+        async def run():
+            first = await self.api.venues(self.default_venueid)
+            await asyncio.sleep(0.1)
+            return first, await self.api.venues(self.default_venueid)
+
+        first, revalidated = self.run_async(run())
+        assert revalidated == first
+        assert cache.stats()["revalidations"] == 1
+
+    def test_cookies(self):
+        async def run():
+            await self.api.base_requester.GET("/cookies/set")
+            return await self.api.base_requester.GET("/echo")
+
+        assert "Cookie" not in self.run_async(run())["headers"]
+
+    def test_photo_add(self):
+        photo = io.BytesIO(b"\xff\xd8" + b"\x00" * 100000)
+        response = self.run_async(
+            self.api.photos.add(photo, {"venueId": self.default_venueid})
+        )
+        assert response["photo"]["size"] == 100002
+
+    def test_photo_add_many(self):
+        chunks = [b"\xff\xd8", b"\x00" * 100000]
+        uploads = [
+            (b"".join(chunks), {"venueId": u"venue0"}),
+            (iter(chunks), {"venueId": u"venue1"}),
+        ]
+        responses = self.run_async(_collect(self.api.photos.add_many(uploads)))
+        assert [r["photo"]["venueId"] for r in responses] == [u"venue0", u"venue1"]
+        assert [r["photo"]["size"] for r in responses] == [100002, 100002]
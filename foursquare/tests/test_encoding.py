@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# (c) 2020 Mike Lewis
+import logging
+
+log = logging.getLogger(__name__)
+
+import unittest
+
+from six.moves.urllib import parse
+
+import foursquare
+
+
+def _reference_urlencode(query, safe_chars=foursquare.URLENCODE_SAFE_CHARS):
+    """The encoder as it was before quoting was memoized, for comparison"""
+    if hasattr(query, "items"):
+        query = query.items()
+    return "&".join(
+        parse.quote(foursquare._as_utf8(k), safe=safe_chars)
+        + "="
+        + parse.quote(foursquare._as_utf8(v), safe=safe_chars)
+        for k, v in query
+    )
+
+
+class UrlencodeTestCase(unittest.TestCase):
+    """
+    _foursquare_urlencode
+    """
+
+    queries = (
+        {"ll": u"40.7,-74.0", "limit": 50, "radius": 100.5, "intent": None},
+        {"query": u"café & crêpes", "near": u"東京", "mood": u"☕"},
+        {"path": u"a/b,c+d&e", "unreserved": u"a-b_c.d~e", "tilde": u"~user"},
+        {"reserved": u";:@=?#[]!$'()*%", "spaces": u" a  b ", "empty": u""},
+        {"bytes": b"raw", "flag": True, u"ключ": u"значение"},
+        {"ids": [u"4bf58dd8d48988d1e0931735", u"4bf58dd8d48988d16d941735"]},
+        (("repeated", 1), ("repeated", 2), ("~", u"~")),
+    )
+
+    def test_matches_reference(self):
+        # Twice, so memoized quotes are checked as well as fresh ones
+        for _ in range(2):
+            for query in self.queries:
+                assert foursquare._foursquare_urlencode(query) == _reference_urlencode(
+                    query
+                ), query
+
+    def test_every_ascii_character(self):
+        # The fast path must leave alone exactly what parse.quote leaves alone
+        for c in map(chr, range(128)):
+            value = u"x{0}y".format(c)
+            assert foursquare._quote(value) == parse.quote(
+                value, safe=foursquare.URLENCODE_SAFE_CHARS
+            ), repr(c)
+
+    def test_safe_chars(self):
+        for query in self.queries:
+            assert foursquare._foursquare_urlencode(
+                query, safe_chars="/"
+            ) == _reference_urlencode(query, safe_chars="/"), query
+
+    def test_doseq(self):
+        query = {"ids": [u"a~b", u"c d", 3], "name": u"é~", "n": 1}
+        assert foursquare._foursquare_urlencode(query, doseq=1) == (
+            "ids=a~b&ids=c%20d&ids=3&name=%C3%A9~&n=1"
+        )
+
+    def test_encode_params(self):
+        requester = foursquare.Foursquare(access_token=u"TOKEN~1").base_requester
+        for query in self.queries:
+            if hasattr(query, "items"):
+                expected = _reference_urlencode(requester._enrich_params(dict(query)))
+                assert requester._encode_params(dict(query)) == expected, query
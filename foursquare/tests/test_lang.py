@@ -5,7 +5,11 @@ import logging
 
 log = logging.getLogger(__name__)
 
-from . import MultilangEndpointTestCase
+import threading
+
+import foursquare
+
+from . import BaseMockEndpointTestCase, MultilangEndpointTestCase
 
 
 class MultiLangTestCase(MultilangEndpointTestCase):
@@ -19,3 +23,75 @@ class MultiLangTestCase(MultilangEndpointTestCase):
             categories = api.venues.categories()
             assert "categories" in categories, u"'categories' not in response"
             assert len(categories["categories"]) > 1, u"Expected multiple categories"
+
+
+class ViewsMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Client views, against the mock API
+    """
+
+    def _echo(self, api):
+        return api.base_requester.GET("/echo")
+
+    def test_for_token(self):
+        view = self.api.for_token(u"OTHERTOKEN")
+        assert self._echo(view)["params"]["oauth_token"] == u"OTHERTOKEN"
+        assert self._echo(self.api)["params"]["oauth_token"] == u"MOCKACCESSTOKEN"
+        # Userless views sign with the client credentials instead
+        api = foursquare.Foursquare(
+            client_id=u"MOCKCLIENTID", client_secret=u"MOCKSECRET"
+        )
+        params = self._echo(api.for_token(u"OTHERTOKEN"))["params"]
+        assert params["oauth_token"] == u"OTHERTOKEN"
+        params = self._echo(api.for_token(None))["params"]
+        assert "oauth_token" not in params and params["client_id"] == u"MOCKCLIENTID"
+
+    def test_with_lang(self):
+        view = self.api.with_lang(u"ja")
+        assert self._echo(view)["headers"]["Accept-Language"] == u"ja"
+        assert "Accept-Language" not in self._echo(self.api)["headers"]
+
+    def test_with_version(self):
+        view = self.api.with_version(u"20200101")
+        assert self._echo(view)["params"]["v"] == u"20200101"
+        assert self._echo(self.api)["params"]["v"] == foursquare.API_VERSION
+
+    def test_shared(self):
+        """Views share the engine, and keep their own queues and rate limits"""
+        histogram = foursquare.HistogramObserver()
+        api = self.mock_api(
+            observers=[histogram], rate_governor=foursquare.RateGovernor()
+        )
+        view = api.for_token(u"OTHERTOKEN").with_lang(u"es")
+        for attribute in (
+            "transport",
+            "cache",
+            "rate_governor",
+            "retry_policy",
+            "observers",
+        ):
+            assert getattr(view.base_requester, attribute) is getattr(
+                api.base_requester, attribute
+            ), attribute
+        assert view.oauth is api.oauth
+        api.venues(self.default_venueid, multi=True)
+        assert (len(api.multi), len(view.multi)) == (1, 0)
+        view.venues(self.default_venueid)
+        assert api.rate_remaining is None
+        assert histogram.snapshot()[u"GET /venues"]["count"] == 1
+
+    def test_threads(self):
+        """Views of one client can be used from many threads at once"""
+        tokens = [u"TOKEN{0}".format(i) for i in range(8)]
+        seen = dict()
+
+        def run(token):
+            view = self.api.for_token(token)
+            seen[token] = [self._echo(view)["params"]["oauth_token"] for _ in range(5)]
+
+        threads = [threading.Thread(target=run, args=(token,)) for token in tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert seen == dict((token, [token] * 5) for token in tokens)
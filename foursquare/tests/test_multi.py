@@ -5,9 +5,14 @@ import logging
 
 log = logging.getLogger(__name__)
 
+import threading
+import unittest
+
 from six.moves import zip
 
-from . import BaseAuthenticatedEndpointTestCase
+import foursquare
+
+from . import BaseAuthenticatedEndpointTestCase, BaseMockEndpointTestCase
 
 
 class MultiEndpointTestCase(BaseAuthenticatedEndpointTestCase):
@@ -60,3 +65,170 @@ class MultiEndpointTestCase(BaseAuthenticatedEndpointTestCase):
             assert expected_response in response, "{0} not in response".format(
                 expected_response
             )
+
+    def test_batch(self):
+        """Queue sub-requests on an explicit batch and make sure each future resolves"""
+        with self.api.batch() as batch:
+            user = batch.users()
+            venue = batch.venues(self.default_venueid)
+            categories = batch.venues.categories()
+            tip = batch.tips(self.default_tipid)
+            photo = batch.photos(self.default_photoid)
+            pages = batch.pages.venues(self.default_pageid, params={"limit": 10})
+            # Nothing has been sent until the block exits
+            assert len(batch) == 6
+        # A batch doesn't touch the client's shared multi queue
+        assert len(self.api.multi) == 0
+        assert "user" in user.result()
+        assert "venue" in venue.result()
+        assert "categories" in categories.result()
+        assert "tip" in tip.result()
+        assert "photo" in photo.result()
+        assert "venues" in pages.result()
+
+
+class _FailingMultiFoursquare(foursquare.Foursquare):
+    """Client whose /multi calls fail with the exception set on the class"""
+
+    error = ValueError(u"Mock failure")
+
+    class Multi(foursquare.Foursquare.Multi):
+        def _process(self, requests):
+            raise _FailingMultiFoursquare.error
+
+
+class _ShortMultiFoursquare(foursquare.Foursquare):
+    """Client whose /multi responses drop the last sub-response"""
+
+    class Multi(foursquare.Foursquare.Multi):
+        def _process(self, requests):
+            return super(_ShortMultiFoursquare.Multi, self)._process(requests)[:-1]
+
+
+class _BarrierMultiFoursquare(foursquare.Foursquare):
+    """Client whose /multi chunks wait for each other before they are sent"""
+
+    class Multi(foursquare.Foursquare.Multi):
+        barrier = None
+
+        def _process(self, requests):
+            # Only chunks sent concurrently can all get past the barrier
+            self.barrier.wait()
+            return super(_BarrierMultiFoursquare.Multi, self)._process(requests)
+
+
+class MultiMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Multi and batches, against the mock API
+    """
+
+    def _queue(self, api, count):
+        for ID in range(count):
+            api.venues(ID, multi=True)
+
+    def test_multi_concurrent(self):
+        """max_workers chunks are in flight at once, yet responses keep their order"""
+        histogram = foursquare.HistogramObserver()
+        api = _BarrierMultiFoursquare(
+            access_token=u"MOCKACCESSTOKEN", observers=[histogram]
+        )
+        api.multi.barrier = threading.Barrier(3, timeout=10)
+        count = foursquare.MAX_MULTI_REQUESTS * 6
+        self._queue(api, count)
+        assert api.multi.num_required_api_calls == 6
+        responses = list(api.multi(max_workers=3))
+        assert [r["venue"]["id"] for r in responses] == [str(i) for i in range(count)]
+        assert histogram.snapshot()[u"POST /multi"]["count"] == 6
+        assert len(api.multi) == 0
+
+    def _concurrently(self, calls):
+        """Run each call on its own thread, all at once; returns results or errors"""
+        results = [None] * len(calls)
+        start = threading.Barrier(len(calls))
+
+        def run(index):
+            start.wait()
+            try:
+                results[index] = calls[index]()
+            except foursquare.FoursquareException as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(calls))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_auto_batch(self):
+        """Concurrent GETs are coalesced, full batches going out without waiting"""
+        histogram = foursquare.HistogramObserver()
+        api = self.mock_api(auto_batch_window=10, observers=[histogram])
+        count = foursquare.MAX_MULTI_REQUESTS * 2
+        calls = [lambda ID=ID: api.venues(ID) for ID in range(count)]
+        calls[3] = lambda: api.base_requester.GET("/errors/param_error")
+        results = self._concurrently(calls)
+        assert isinstance(results.pop(3), foursquare.ParamError)
+        assert sorted(int(r["venue"]["id"]) for r in results) == [
+            ID for ID in range(count) if ID != 3
+        ]
+        snapshot = histogram.snapshot()
+        assert snapshot[u"POST /multi"]["count"] == 2
+        assert u"GET /venues" not in snapshot
+
+    def test_auto_batch_window(self):
+        """A lone GET goes out once its window closes"""
+        histogram = foursquare.HistogramObserver()
+        api = self.mock_api(auto_batch_window=0.05, observers=[histogram])
+        assert api.venues(self.default_venueid)["venue"]["id"] == self.default_venueid
+        assert histogram.snapshot()[u"POST /multi"]["count"] == 1
+
+    def test_multi_as_completed(self):
+        api = self.mock_api()
+        count = foursquare.MAX_MULTI_REQUESTS * 3 + 2
+        self._queue(api, count)
+        pairs = list(api.multi(max_workers=2, as_completed=True))
+        assert sorted(index for index, _ in pairs) == list(range(count))
+        for index, response in pairs:
+            assert response["venue"]["id"] == str(index)
+
+    @unittest.skipIf(foursquare.ijson is None, u"Streaming requires ijson")
+    def test_multi_stream(self):
+        api = self.mock_api()
+        self._queue(api, foursquare.MAX_MULTI_REQUESTS + 1)
+        api.base_requester.GET("/errors/param_error", multi=True)
+        responses = list(api.multi(stream=True))
+        assert [r["venue"]["id"] for r in responses[:-1]] == [
+            str(i) for i in range(foursquare.MAX_MULTI_REQUESTS + 1)
+        ]
+        assert isinstance(responses[-1], foursquare.ParamError)
+
+    def test_batch_error(self):
+        """Any failure of a /multi call settles every future of its chunk"""
+        api = _FailingMultiFoursquare(access_token=u"MOCKACCESSTOKEN")
+        with api.batch() as batch:
+            venue = batch.venues(self.default_venueid)
+            user = batch.users()
+        assert venue.exception() is _FailingMultiFoursquare.error
+        assert user.exception() is _FailingMultiFoursquare.error
+
+    def test_batch_interrupted(self):
+        """Futures are cancelled when the batch is interrupted"""
+        api = _FailingMultiFoursquare(access_token=u"MOCKACCESSTOKEN")
+        _FailingMultiFoursquare.error = KeyboardInterrupt()
+        try:
+            batch = api.batch()
+            venue = batch.venues(self.default_venueid)
+            with self.assertRaises(KeyboardInterrupt):
+                batch.execute()
+        finally:
+            _FailingMultiFoursquare.error = ValueError(u"Mock failure")
+        assert venue.cancelled()
+
+    def test_batch_missing_sub_response(self):
+        api = _ShortMultiFoursquare(access_token=u"MOCKACCESSTOKEN")
+        with api.batch() as batch:
+            venue = batch.venues(self.default_venueid)
+            user = batch.users()
+        assert "venue" in venue.result()
+        assert isinstance(user.exception(), foursquare.FoursquareException)
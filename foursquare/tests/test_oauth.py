@@ -5,7 +5,9 @@ import logging
 
 log = logging.getLogger(__name__)
 
-from . import BaseAuthenticationTestCase
+import foursquare
+
+from . import BaseAuthenticationTestCase, BaseMockEndpointTestCase
 import six
 
 
@@ -17,3 +19,19 @@ class OAuthEndpointTestCase(BaseAuthenticationTestCase):
     def test_get_token(self):
         # Honestly, not much we can do to test here
         pass
+
+
+class OAuthMockEndpointTestCase(BaseMockEndpointTestCase):
+    def test_get_token(self):
+        api = foursquare.Foursquare(
+            client_id=u"MOCKCLIENTID",
+            client_secret=u"MOCKCLIENTSECRET",
+            redirect_uri=u"https://example.org/callback?state=MOCKSTATE",
+        )
+        assert api.oauth.get_token(u"MOCKCODE") == u"MOCKACCESSTOKEN"
+        # None of the token request's params, quoted or not, is memoized
+        memo = u" ".join(
+            list(foursquare._quote_cache) + list(foursquare._quote_cache.values())
+        )
+        for secret in (u"MOCKCLIENTID", u"MOCKCLIENTSECRET", u"MOCKSTATE", u"MOCKCODE"):
+            assert secret not in memo, secret
@@ -21,6 +21,11 @@ class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         response = self.api.pages.venues(self.default_pageid)
         assert "venues" in response
 
+    def test_all_venues(self):
+        venues = list(self.api.pages.all_venues(self.default_pageid))
+        response = self.api.pages.venues(self.default_pageid)
+        assert len(venues) == response["venues"]["count"]
+
 
 class VenuesUserlessEndpointTestCase(BaseUserlessEndpointTestCase):
     """
@@ -34,3 +39,8 @@ class VenuesUserlessEndpointTestCase(BaseUserlessEndpointTestCase):
     def test_venues(self):
         response = self.api.pages.venues(self.default_pageid)
         assert "venues" in response
+
+    def test_all_venues(self):
+        venues = list(self.api.pages.all_venues(self.default_pageid))
+        response = self.api.pages.venues(self.default_pageid)
+        assert len(venues) == response["venues"]["count"]
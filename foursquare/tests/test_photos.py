@@ -8,10 +8,38 @@ log = logging.getLogger(__name__)
 from . import (
     TEST_DATA_DIR,
     BaseAuthenticatedEndpointTestCase,
+    BaseMockEndpointTestCase,
     BaseUserlessEndpointTestCase,
 )
 
+import email.parser
+import io
 import os
+import shutil
+import tempfile
+import unittest
+
+import foursquare
+
+# A few upload chunks' worth of bytes, ending part way into a chunk
+PHOTO_DATA = bytes(bytearray(range(256))) * 600
+
+
+def _chunks(data, size=10000):
+    """Generator over data in pieces, for uploads of unknown size"""
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def _parts(encoder):
+    """The (headers, payload) of each part of a MultipartEncoder's body"""
+    body = b"".join(encoder)
+    if encoder.len is not None:
+        assert len(body) == encoder.len
+    message = email.parser.BytesParser().parsebytes(
+        b"Content-Type: " + encoder.content_type.encode("ascii") + b"\r\n\r\n" + body
+    )
+    return [(part, part.get_payload(decode=True)) for part in message.get_payload()]
 
 
 class PhotosEndpointTestCase(BaseAuthenticatedEndpointTestCase):
@@ -49,3 +77,134 @@ class PhotosEndpointTestCase(BaseAuthenticatedEndpointTestCase):
             print(
                 u"Put a 'test-photo.jpg' file in the testdata/ directory to enable this test."
             )
+
+
+class UploadTestCase(unittest.TestCase):
+    """
+    Upload
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, u"photo.jpg")
+        with open(self.path, "wb") as f:
+            f.write(PHOTO_DATA)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sources(self):
+        with open(self.path, "rb") as binary, open(self.path, "r") as text:
+            sources = (PHOTO_DATA, self.path, binary, text, io.BytesIO(PHOTO_DATA))
+            for source in sources:
+                upload = foursquare.Upload(source)
+                assert upload.size() == len(PHOTO_DATA), source
+                chunks = list(upload.chunks())
+                assert max(map(len, chunks)) == foursquare.UPLOAD_CHUNK_SIZE
+                assert b"".join(chunks) == PHOTO_DATA, source
+
+    def test_iterable(self):
+        upload = foursquare.Upload(_chunks(PHOTO_DATA))
+        assert upload.size() is None
+        assert b"".join(upload.chunks()) == PHOTO_DATA
+
+    def test_progress(self):
+        for source, total in (
+            (PHOTO_DATA, len(PHOTO_DATA)),
+            (_chunks(PHOTO_DATA), None),
+        ):
+            calls = list()
+            upload = foursquare.Upload(
+                source, progress=lambda sent, total: calls.append((sent, total))
+            )
+            for _ in upload.chunks():
+                pass
+            assert calls[-1] == (len(PHOTO_DATA), total)
+            assert [sent for sent, _ in calls] == sorted(set(sent for sent, _ in calls))
+
+
+class MultipartEncoderTestCase(unittest.TestCase):
+    """
+    MultipartEncoder
+    """
+
+    def test_body(self):
+        encoder = foursquare.MultipartEncoder(
+            {"venueId": u"venue1", "ll": None, "tags": [u"café", u"two"]},
+            {"photo": foursquare.Upload(PHOTO_DATA)},
+        )
+        assert encoder.content_type.startswith(u"multipart/form-data; boundary=")
+        parts = _parts(encoder)
+        names = [
+            part.get_param("name", header="content-disposition") for part, _ in parts
+        ]
+        # Fields whose value is None are left out; lists repeat their field
+        assert names == ["venueId", "tags", "tags", "photo"]
+        assert [payload for _, payload in parts[:3]] == [
+            b"venue1",
+            u"café".encode("utf8"),
+            b"two",
+        ]
+        photo, payload = parts[3]
+        assert photo.get_filename() == u"photo"
+        assert photo.get_content_type() == u"image/jpeg"
+        assert payload == PHOTO_DATA
+
+    def test_streamed(self):
+        """An upload of unknown size makes the body be sent chunked"""
+        encoder = foursquare.MultipartEncoder(
+            {"venueId": u"venue1"},
+            {"photo": (u"photo.png", _chunks(PHOTO_DATA), u"image/png")},
+        )
+        assert encoder.len is None
+        (_, venue), (photo, payload) = _parts(encoder)
+        assert venue == b"venue1"
+        assert photo.get_filename() == u"photo.png"
+        assert photo.get_content_type() == u"image/png"
+        assert payload == PHOTO_DATA
+
+
+class PhotosMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Uploads, against the mock API
+    """
+
+    def test_add(self):
+        response = self.api.photos.add(PHOTO_DATA, {"venueId": self.default_venueid})
+        assert response["photo"]["size"] == len(PHOTO_DATA)
+        assert response["photo"]["venueId"] == self.default_venueid
+
+    def test_add_many(self):
+        """Every kind of source arrives intact, iterators included"""
+        sources = [
+            PHOTO_DATA,
+            io.BytesIO(PHOTO_DATA),
+            _chunks(PHOTO_DATA),
+            _chunks(PHOTO_DATA, foursquare.UPLOAD_CHUNK_SIZE * 2),
+        ]
+        progress = dict()
+
+        def report(index, sent, total):
+            progress[index] = (sent, total)
+
+        responses = list(
+            self.api.photos.add_many(
+                (
+                    (source, {"venueId": u"venue{0}".format(index)})
+                    for index, source in enumerate(sources)
+                ),
+                window=2,
+                progress=report,
+            )
+        )
+        assert [r["photo"]["venueId"] for r in responses] == [
+            u"venue{0}".format(index) for index in range(len(sources))
+        ]
+        assert all(r["photo"]["size"] == len(PHOTO_DATA) for r in responses)
+        size = len(PHOTO_DATA)
+        assert progress == {
+            0: (size, size),
+            1: (size, size),
+            2: (size, None),
+            3: (size, None),
+        }
@@ -5,7 +5,17 @@ import logging
 
 log = logging.getLogger(__name__)
 
-from . import BaseAuthenticatedEndpointTestCase, BaseUserlessEndpointTestCase
+import email.utils
+import time
+import unittest
+
+import foursquare
+
+from . import (
+    BaseAuthenticatedEndpointTestCase,
+    BaseMockEndpointTestCase,
+    BaseUserlessEndpointTestCase,
+)
 
 
 class RateLimitTestCase(BaseAuthenticatedEndpointTestCase):
@@ -22,3 +32,230 @@ class RateLimitTestCase(BaseAuthenticatedEndpointTestCase):
         # A call is needed to load the value
         self.api.venues(self.default_venueid)
         assert int(self.api.rate_remaining) > 0
+
+
+def _headers(remaining, reset=None, limit=500):
+    headers = {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining)}
+    if reset is not None:
+        headers["X-RateLimit-Reset"] = str(reset)
+    return headers
+
+
+class RateGovernorTestCase(unittest.TestCase):
+    """
+    RateGovernor
+    """
+
+    def test_unknown_quota(self):
+        """Nothing is paced before the first response's headers"""
+        governor = foursquare.RateGovernor(burst=1)
+        assert [governor.reserve() for _ in range(20)] == [0] * 20
+
+    def test_pacing(self):
+        """The quota left is spread evenly over the time left in the window"""
+        governor = foursquare.RateGovernor(burst=2)
+        governor.update(_headers(remaining=100, reset=time.time() + 100))
+        delays = [governor.reserve() for _ in range(5)]
+        assert delays[:2] == [0, 0]
+        # One token a second, each waiting for the ones before it
+        for delay, expected in zip(delays[2:], (1, 2, 3)):
+            self.assertAlmostEqual(delay, expected, delta=0.05)
+        state = governor.state()
+        assert (state["calls"], state["delayed"]) == (5, 3)
+        self.assertAlmostEqual(state["total_delay"], 6, delta=0.15)
+
+    def test_exhausted(self):
+        """Without quota left, calls wait for the window to reset"""
+        governor = foursquare.RateGovernor()
+        governor.update(_headers(remaining=0, reset=time.time() + 30))
+        self.assertAlmostEqual(governor.reserve(), 30, delta=0.5)
+
+    def test_new_window(self):
+        """Once the reset time has passed, the full limit is available again"""
+        governor = foursquare.RateGovernor(window=100, burst=3)
+        governor.update(_headers(remaining=0, reset=time.time() - 1, limit=500))
+        assert [governor.reserve() for _ in range(3)] == [0, 0, 0]
+        assert governor.state()["rate"] == 5.0
+
+    def test_shared(self):
+        first = foursquare.Foursquare(access_token=u"MOCKTOKEN1", rate_governor=True)
+        second = foursquare.Foursquare(access_token=u"MOCKTOKEN1", rate_governor=True)
+        other = foursquare.Foursquare(access_token=u"MOCKTOKEN2", rate_governor=True)
+        assert first.rate_governor is second.rate_governor
+        assert first.rate_governor is not other.rate_governor
+        assert second.for_token(u"MOCKTOKEN2").rate_governor is other.rate_governor
+
+
+class RateGovernorMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Pacing, against the mock API
+    """
+
+    def test_paced_requests(self):
+        governor = foursquare.RateGovernor(burst=1)
+        api = self.mock_api(rate_governor=governor)
+        params = {"remaining": 50, "reset": time.time() + 10}
+        started = time.time()
+        for _ in range(5):
+            api.base_requester.GET("/ratelimit", params)
+        elapsed = time.time() - started
+        # The first call isn't paced, and pacing starts with a full bucket
+        # (one call); then 50 calls left in 10s allow one every 200ms, less
+        # the time each call took
+        state = governor.state()
+        assert (state["remaining"], state["delayed"]) == (50, 3)
+        assert 0.4 < state["total_delay"] <= 0.6
+        assert elapsed >= state["total_delay"]
+        assert api.rate_remaining == u"50"
+
+
+def _error(error_type=u"server_error", status_code=400, retry_after=None):
+    """An API error as _process_response raises it"""
+    e = foursquare.error_types[error_type](u"Mock {0}".format(error_type))
+    e.status_code = status_code
+    e.headers = {} if retry_after is None else {"Retry-After": retry_after}
+    return e
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    """
+    RetryPolicy
+    """
+
+    def test_should_retry(self):
+        policy = foursquare.RetryPolicy(max_attempts=3)
+        assert policy.should_retry(_error(), 0)
+        assert policy.should_retry(_error(), 1)
+        assert not policy.should_retry(_error(), 2)
+        assert not policy.should_retry(_error(u"param_error"), 0)
+        policy = foursquare.RetryPolicy(no_retry_error_types=())
+        assert policy.should_retry(_error(u"param_error"), 0)
+
+    def test_backoff(self):
+        """Full jitter below an exponentially growing cap"""
+        policy = foursquare.RetryPolicy(base_delay=1, max_delay=5)
+        for attempt, cap in ((0, 1), (1, 2), (2, 4), (3, 5), (10, 5)):
+            delays = [policy.delay(_error(), attempt) for _ in range(200)]
+            assert all(0 <= delay <= cap for delay in delays), attempt
+            # Spread out, not clustered at the cap
+            assert min(delays) < cap / 4.0 and max(delays) > cap * 3 / 4.0
+
+    def test_retry_after(self):
+        policy = foursquare.RetryPolicy(base_delay=0)
+        for status_code in (429, 503):
+            assert (
+                policy.delay(_error(status_code=status_code, retry_after="7"), 0) == 7
+            )
+        http_date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        delay = policy.delay(_error(status_code=429, retry_after=http_date), 0)
+        assert 55 < delay <= 60
+        # Only rate limiting and unavailability responses are taken at their word
+        assert policy.delay(_error(status_code=500, retry_after="7"), 0) == 0
+        assert policy.delay(_error(status_code=429, retry_after="soon"), 0) == 0
+
+    def test_deadline(self):
+        policy = foursquare.RetryPolicy(deadline=10)
+        e = _error(status_code=429, retry_after="5")
+        assert policy.backoff(e, 0, time.time()) == 5
+        assert policy.backoff(e, 0, time.time() - 6) is None
+
+
+class _RecordingObserver(foursquare.Observer):
+    """Keeps what each event looked like when the observer was told of it"""
+
+    def __init__(self):
+        self.events = list()
+
+    def _record(self, kind, event):
+        self.events.append(
+            (kind, event.attempt, sorted(event.timings), event.status, event.error)
+        )
+
+    def on_retry(self, event):
+        self._record("retry", event)
+
+    def on_response(self, event):
+        self._record("response", event)
+
+    def on_error(self, event):
+        self._record("error", event)
+
+
+class RetryMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Retries, against the mock API
+    """
+
+    def test_attempt_timings(self):
+        """Each attempt is observed with its own timings and status"""
+        observer = _RecordingObserver()
+        api = self.mock_api(
+            observers=[observer], retry_policy=foursquare.RetryPolicy(base_delay=0)
+        )
+        response = api.base_requester.GET(
+            "/flaky/attempt_timings", {"failures": 2, "errorType": "server_error"}
+        )
+        assert response["attempts"] == 3
+        assert [(kind, attempt) for kind, attempt, _, _, _ in observer.events] == [
+            ("retry", 0),
+            ("retry", 1),
+            ("response", 2),
+        ]
+        for _, _, phases, status, error in observer.events[:2]:
+            assert phases == ["decode", "download", "encode", "error", "request"]
+            assert status == 400
+            assert isinstance(error, foursquare.ServerError)
+        # Nothing of the failed attempts is left on the successful one
+        _, _, phases, status, error = observer.events[2]
+        assert phases == ["decode", "download", "encode", "request"]
+        assert status == 200
+        assert error is None
+
+    def test_retry_after(self):
+        """A 429's Retry-After is waited out instead of the backoff"""
+        histogram = foursquare.HistogramObserver()
+        api = self.mock_api(
+            observers=[histogram], retry_policy=foursquare.RetryPolicy(base_delay=60)
+        )
+        params = {
+            "errorType": "rate_limit_exceeded",
+            "status": 429,
+            "retryAfter": "0.1",
+        }
+        started = time.time()
+        response = api.base_requester.GET("/flaky/retry_after", params)
+        assert response["attempts"] == 2
+        assert 0.1 <= time.time() - started < 5
+        assert histogram.snapshot()[u"GET /flaky"]["retries"] == 1
+
+    def test_no_retry(self):
+        """Errors that won't go away by themselves are raised at once"""
+        observer = _RecordingObserver()
+        api = self.mock_api(
+            observers=[observer], retry_policy=foursquare.RetryPolicy(base_delay=0)
+        )
+        with self.assertRaises(foursquare.ParamError):
+            api.base_requester.GET("/flaky/no_retry", {"errorType": "param_error"})
+        assert [(kind, attempt) for kind, attempt, _, _, _ in observer.events] == [
+            ("error", 0)
+        ]
+
+    def test_give_up(self):
+        api = self.mock_api(
+            retry_policy=foursquare.RetryPolicy(max_attempts=2, base_delay=0)
+        )
+        with self.assertRaises(foursquare.ServerError):
+            api.base_requester.GET("/flaky/give_up", {"failures": 2})
+
+    def test_post(self):
+        """POSTs are only retried when they are safe to repeat, or opted in"""
+        policy = foursquare.RetryPolicy(base_delay=0)
+        api = self.mock_api(retry_policy=policy)
+        with self.assertRaises(foursquare.ServerError):
+            api.base_requester.POST("/flaky/post", {"failures": 1})
+        response = api.base_requester.POST("/flaky/idempotent", {}, idempotent=True)
+        assert response["attempts"] == 2
+        api = self.mock_api(
+            retry_policy=foursquare.RetryPolicy(base_delay=0, retry_posts=True)
+        )
+        assert api.base_requester.POST("/flaky/post_opted_in", {})["attempts"] == 2
@@ -6,8 +6,20 @@ import logging
 log = logging.getLogger(__name__)
 
 import os
+import shutil
+import tempfile
+import unittest
 
-from . import TEST_DATA_DIR, BaseAuthenticatedEndpointTestCase
+import foursquare
+
+from foursquare.benchmarks import mockserver
+
+from . import TEST_DATA_DIR, BaseAuthenticatedEndpointTestCase, BaseMockEndpointTestCase
+
+
+def _checkin_row(checkin):
+    """map_checkins transform; module-level so worker processes can unpickle it"""
+    return checkin["id"], checkin["createdAt"]
 
 
 class UsersEndpointTestCase(BaseAuthenticatedEndpointTestCase):
@@ -19,6 +31,22 @@ class UsersEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         response = self.api.users()
         assert "user" in response
 
+    def test_many(self):
+        self.api.base_requester.cache = cache = foursquare.ResponseCache()
+        self.api.users(self.default_userid)
+        user_id = int(self.default_userid)
+        responses = self.api.users.many(
+            [self.default_userid, self.default_userid, user_id, u"notauser"]
+        )
+        # Duplicates are fetched once; keys are the IDs exactly as passed
+        assert list(responses) == [self.default_userid, user_id, u"notauser"]
+        # The user fetched above came from the cache, asked for by str or int ID
+        assert cache.stats()["hits"] == 2
+        assert "user" in responses[self.default_userid]
+        assert "user" in responses[user_id]
+        # A bad ID fails on its own, without failing the others
+        assert isinstance(responses[u"notauser"], foursquare.FoursquareException)
+
     def test_requests(self):
         response = self.api.users.requests()
         assert "requests" in response
@@ -43,6 +71,38 @@ class UsersEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         checkins = list(self.api.users.all_checkins())
         assert isinstance(checkins, list)
 
+    def test_all_checkins_window(self):
+        ids = [checkin["id"] for checkin in self.api.users.all_checkins(window=4)]
+        # Concurrent pages still come back in order, without gaps or repeats
+        assert ids == [checkin["id"] for checkin in self.api.users.all_checkins()]
+
+    def test_all_checkins_multi(self):
+        ids = [checkin["id"] for checkin in self.api.users.all_checkins(multi=True)]
+        assert ids == [checkin["id"] for checkin in self.api.users.all_checkins()]
+
+    def test_map_checkins(self):
+        rows = list(self.api.users.map_checkins(_checkin_row, processes=2, window=2))
+        # Same checkins, in the same order, as decoding them in this process
+        assert rows == [_checkin_row(c) for c in self.api.users.all_checkins()]
+
+    def test_sync_checkins(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = foursquare.FileCursorStore(directory)
+            key = self.api.users._cursor_key(u"checkins", u"self")
+            checkins = list(self.api.users.sync_checkins(store))
+            # Oldest first, and the mark is the newest checkin synced
+            assert checkins[-1]["createdAt"] == store.get(key)
+            # Nothing new since the last sync
+            assert list(self.api.users.sync_checkins(store)) == []
+            # Rewind the mark: only the checkins made after it come back
+            store.set(key, checkins[-3]["createdAt"])
+            newer = list(self.api.users.sync_checkins(store))
+            assert [c["id"] for c in newer] == [c["id"] for c in checkins[-2:]]
+            assert store.get(key) == checkins[-1]["createdAt"]
+        finally:
+            shutil.rmtree(directory)
+
     def test_lists(self):
         response = self.api.users.lists()
         assert "lists" in response
@@ -75,10 +135,18 @@ class UsersEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         response = self.api.users.photos(params={"offset": 3})
         assert "photos" in response
 
+    def test_all_photos(self):
+        photos = list(self.api.users.all_photos())
+        assert len(photos) == self.api.users.photos()["photos"]["count"]
+
     def test_tips(self):
         response = self.api.users.tips()
         assert "tips" in response
 
+    def test_all_tips(self):
+        tips = list(self.api.users.all_tips(window=2))
+        assert len(tips) == self.api.users.tips()["tips"]["count"]
+
     def test_venuehistory(self):
         response = self.api.users.venuehistory()
         assert "venues" in response
@@ -105,3 +173,90 @@ class UsersEndpointTestCase(BaseAuthenticatedEndpointTestCase):
             print(
                 u"Put a 'test-photo.jpg' file in the testdata/ directory to enable this test."
             )
+
+
+class UsersMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Utilities, against the mock API
+    """
+
+    def test_subclass_endpoints(self):
+        class Client(foursquare.Foursquare):
+            class Users(foursquare.Foursquare.Users):
+                def first_name(self, USER_ID=u"self"):
+                    return self(USER_ID)["user"]["firstName"]
+
+            class Places(foursquare.Foursquare._Endpoint):
+                endpoint = "places"
+
+        api = Client(access_token=u"MOCKACCESSTOKEN")
+        assert api.users.first_name(self.default_userid) == u"Mock"
+        assert isinstance(api.places, Client.Places)
+        # Endpoint classes the subclass doesn't override are inherited
+        assert type(api.venues) is foursquare.Foursquare.Venues
+        # Batches build the subclass's endpoints too
+        batch = api.batch()
+        assert isinstance(batch.users, Client.Users)
+        assert isinstance(batch.places, Client.Places)
+        batch.cancel()
+        # The base class is left alone
+        assert "places" not in foursquare.Foursquare._endpoints
+        assert type(self.api.users) is foursquare.Foursquare.Users
+
+    def _requests(self, histogram):
+        return histogram.snapshot().get("GET /users", {}).get("count", 0)
+
+    def test_sync_checkins_requests(self):
+        histogram = foursquare.HistogramObserver()
+        self.api = self.mock_api(observers=[histogram])
+        store = foursquare.MemoryCursorStore()
+        key = self.api.users._cursor_key(u"checkins", u"self")
+        checkins = list(self.api.users.sync_checkins(store))
+        assert len(checkins) == mockserver.CHECKIN_COUNT
+        # Four full pages of 250, then an empty one
+        assert self._requests(histogram) == 5
+        # Three newer checkins than the mark fit on one short page, though the
+        # mock (like the API) still counts the whole history
+        store.set(key, checkins[-4]["createdAt"])
+        newer = list(self.api.users.sync_checkins(store))
+        assert [c["id"] for c in newer] == [c["id"] for c in checkins[-3:]]
+        assert self._requests(histogram) == 6
+        assert store.get(key) == checkins[-1]["createdAt"]
+
+    def test_sync_checkins_window(self):
+        store = foursquare.MemoryCursorStore()
+        key = self.api.users._cursor_key(u"checkins", u"self")
+        store.set(key, mockserver.CHECKIN_EPOCH + 600 * 60)
+        ids = [c["id"] for c in self.api.users.sync_checkins(store, window=3)]
+        assert ids == [u"checkin{0}".format(i) for i in range(601, 1000)]
+        store.set(key, mockserver.CHECKIN_EPOCH + 600 * 60)
+        ids = [c["id"] for c in self.api.users.sync_checkins(store, multi=True)]
+        assert ids == [u"checkin{0}".format(i) for i in range(601, 1000)]
+
+    @unittest.skipIf(foursquare.ijson is None, u"Streaming requires ijson")
+    def test_checkins_stream(self):
+        """Streamed items are the ones a plain request decodes"""
+        params = {"limit": 250, "offset": 100}
+        response = self.api.users.checkins(params=params)
+        streamed = list(self.api.users.checkins(params=params, stream=True))
+        assert streamed == response["checkins"]["items"]
+        assert self.api.rate_remaining == str(mockserver.RATE_LIMIT)
+
+    @unittest.skipIf(foursquare.ijson is None, u"Streaming requires ijson")
+    def test_stream_lazy(self):
+        """Nothing is sent until the stream is read, and it can be left early"""
+        histogram = foursquare.HistogramObserver()
+        self.api = self.mock_api(observers=[histogram])
+        checkins = self.api.users.checkins(params={"limit": 250}, stream=True)
+        assert self._requests(histogram) == 0
+        first = [next(checkins) for _ in range(3)]
+        assert [c["id"] for c in first] == [u"checkin0", u"checkin1", u"checkin2"]
+        checkins.close()
+        # The connection is still good for the next request
+        assert self.api.users(self.default_userid)["user"]["id"] == self.default_userid
+
+    @unittest.skipIf(foursquare.ijson is None, u"Streaming requires ijson")
+    def test_stream_error(self):
+        items = self.api.base_requester.GET("/errors/param_error", stream="items.item")
+        with self.assertRaises(foursquare.ParamError):
+            list(items)
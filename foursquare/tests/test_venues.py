@@ -5,7 +5,25 @@ import logging
 
 log = logging.getLogger(__name__)
 
-from . import BaseAuthenticatedEndpointTestCase, BaseUserlessEndpointTestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import gzip
+
+import requests
+
+import foursquare
+from foursquare.benchmarks import mockserver, runner
+
+from . import (
+    BaseAuthenticatedEndpointTestCase,
+    BaseMockEndpointTestCase,
+    BaseUserlessEndpointTestCase,
+)
 
 
 class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
@@ -17,10 +35,40 @@ class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         response = self.api.venues(self.default_venueid)
         assert "venue" in response
 
+    def test_many(self):
+        self.api.base_requester.cache = cache = foursquare.ResponseCache()
+        self.api.venues(self.default_venueid)
+        responses = self.api.venues.many(
+            [self.default_venueid, self.default_venueid, u"notavenue"]
+        )
+        # Duplicates are fetched once
+        assert list(responses) == [self.default_venueid, u"notavenue"]
+        # The venue fetched above came from the cache
+        assert cache.stats()["hits"] == 1
+        assert "venue" in responses[self.default_venueid]
+        # A bad ID fails on its own, without failing the others
+        assert isinstance(responses[u"notavenue"], foursquare.FoursquareException)
+
     def test_categories(self):
         response = self.api.venues.categories()
         assert "categories" in response
 
+    def test_category_index(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "categories.json")
+            index = self.api.venues.category_index(path)
+            coffee = index.search(u"coffee shop")[0]
+            # Every ancestor's descendants include the category
+            for ancestor in index.ancestors(coffee["id"]):
+                assert coffee["id"] in index.descendants(ancestor["id"])
+            # The taxonomy was saved for the next run
+            saved = foursquare.CategoryIndex.load(path, self.api.base_requester.version)
+            assert len(saved) == len(index)
+            assert saved[coffee["id"]] == coffee
+        finally:
+            shutil.rmtree(directory)
+
     def test_explore(self):
         response = self.api.venues.explore(params={"ll": self.default_geo})
         assert "groups" in response
@@ -53,6 +101,24 @@ class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         )
         assert "groups" in response
 
+    def test_crawl(self):
+        sw, ne = (40.7200, -74.0050), (40.7250, -74.0000)
+        crawler = self.api.venues.crawl(sw, ne, window=2)
+        ids = [venue["id"] for venue in crawler]
+        # Each venue is yielded once, however many tiles it turned up in
+        assert ids and len(set(ids)) == len(ids)
+        assert crawler.checkpoint()["pending"] == []
+
+    def test_crawl_checkpoint(self):
+        sw, ne = (40.7200, -74.0050), (40.7250, -74.0000)
+        crawler = self.api.venues.crawl(sw, ne)
+        first = next(iter(crawler))
+        # Checkpoints survive a round trip through JSON
+        state = json.loads(json.dumps(crawler.checkpoint()))
+        resumed = [v["id"] for v in self.api.venues.crawl(sw, ne, checkpoint=state)]
+        # The resumed crawl doesn't yield what was yielded before the checkpoint
+        assert first["id"] not in resumed
+
     def test_managed(self):
         response = self.api.venues.managed()
         assert "venues" in response
@@ -87,6 +153,25 @@ class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         )
         assert "minivenues" in response
 
+    def test_completer(self):
+        completer = self.api.venues.completer()
+        params = {"ll": self.default_geo}
+        response = completer(u"coffee", params)
+        assert "minivenues" in response
+        # Asking again is answered from the trie
+        assert completer(u"coffee", params) == response
+        assert completer.fetches == 1 and completer.local_hits == 1
+
+    def test_completer_submit(self):
+        completer = self.api.venues.completer(debounce=0.5)
+        params = {"ll": self.default_geo}
+        first = completer.submit(u"cof", params)
+        second = completer.submit(u"coff", params)
+        # Typing on supersedes the first keystroke before it reaches the API
+        assert first.cancelled()
+        assert "minivenues" in second.result()
+        assert completer.fetches == 1
+
     def test_trending(self):
         response = self.api.venues.trending(params={"ll": self.default_geo})
         assert "venues" in response
@@ -155,6 +240,10 @@ class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         response = self.api.venues.photos(self.default_venueid, params={"offset": 3})
         assert "photos" in response
 
+    def test_all_photos(self):
+        photos = list(self.api.venues.all_photos(self.default_venueid, window=2))
+        assert len(set(photo["id"] for photo in photos)) == len(photos)
+
     def test_similar(self):
         response = self.api.venues.similar(self.default_venueid)
         assert "similarVenues" in response
@@ -177,6 +266,10 @@ class VenuesEndpointTestCase(BaseAuthenticatedEndpointTestCase):
         response = self.api.venues.tips(self.default_venueid, params={"offset": 3})
         assert "tips" in response
 
+    def test_all_tips(self):
+        tips = list(self.api.venues.all_tips(self.default_venueid, multi=True))
+        assert len(set(tip["id"] for tip in tips)) == len(tips)
+
 
 class VenuesUserlessEndpointTestCase(BaseUserlessEndpointTestCase):
     """
@@ -306,6 +399,10 @@ class VenuesUserlessEndpointTestCase(BaseUserlessEndpointTestCase):
         response = self.api.venues.photos(self.default_venueid, params={"offset": 3})
         assert "photos" in response
 
+    def test_all_photos(self):
+        photos = list(self.api.venues.all_photos(self.default_venueid, window=2))
+        assert len(set(photo["id"] for photo in photos)) == len(photos)
+
     def test_tips(self):
         response = self.api.venues.tips(self.default_venueid)
         assert "tips" in response
@@ -323,3 +420,228 @@ class VenuesUserlessEndpointTestCase(BaseUserlessEndpointTestCase):
     def test_tips_offset(self):
         response = self.api.venues.tips(self.default_venueid, params={"offset": 3})
         assert "tips" in response
+
+    def test_all_tips(self):
+        tips = list(self.api.venues.all_tips(self.default_venueid, multi=True))
+        assert len(set(tip["id"] for tip in tips)) == len(tips)
+
+
+class VenuesMockEndpointTestCase(BaseMockEndpointTestCase):
+    """
+    Venues, against the mock API
+    """
+
+    def setUp(self):
+        super(VenuesMockEndpointTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.directory, u"venues.json.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(VenuesMockEndpointTestCase, self).tearDown()
+
+    def _calls(self, api):
+        """A mix of requests, and what came of each"""
+        api.venues(1, multi=True)
+        api.venues(2, multi=True)
+        results = [api.venues(self.default_venueid), api.users.checkins()]
+        results.extend(api.multi())
+        try:
+            api.base_requester.GET("/errors/param_error")
+        except foursquare.ParamError as e:
+            results.append(type(e))
+        return results
+
+    def test_revalidate_etag(self):
+        """A stale entry is revalidated, and kept on a 304"""
+        histogram = foursquare.HistogramObserver()
+        cache = foursquare.ResponseCache(ttls=(("/venues/*", 0.05),))
+        api = self.mock_api(cache=cache, observers=[histogram])
+        venue_id = u"revalidated"
+        first = api.venues(venue_id)
+        assert api.venues(venue_id) == first
+        assert cache.stats() == {"hits": 1, "misses": 1, "revalidations": 0}
+        time.sleep(0.1)
+        assert api.venues(venue_id) == first
+        assert cache.stats()["revalidations"] == 1
+        assert histogram.snapshot()[u"GET /venues"]["count"] == 2
+        # Fresh again for another ttl
+        assert api.venues(venue_id) == first
+        assert histogram.snapshot()[u"GET /venues"]["count"] == 2
+        # A changed venue fails revalidation and is downloaded again
+        mockserver.venue_names[venue_id] = u"Renamed"
+        try:
+            time.sleep(0.1)
+            assert api.venues(venue_id)["venue"]["name"] == u"Renamed"
+        finally:
+            del mockserver.venue_names[venue_id]
+        assert cache.stats()["revalidations"] == 1
+
+    def test_revalidate_last_modified(self):
+        cache = foursquare.ResponseCache(ttls=(("/users/*", 0.05),))
+        api = self.mock_api(cache=cache)
+        first = api.users(self.default_userid)
+        time.sleep(0.1)
+        assert api.users(self.default_userid) == first
+        assert cache.stats()["revalidations"] == 1
+
+    def test_revalidate_expired(self):
+        """Past keep_stale, an entry is gone and fetched without validators"""
+        cache = foursquare.ResponseCache(ttls=(("/venues/*", 0.05),), keep_stale=0)
+        api = self.mock_api(cache=cache)
+        api.venues(self.default_venueid)
+        time.sleep(0.1)
+        assert api.venues(self.default_venueid)["venue"]["id"] == self.default_venueid
+        assert cache.stats()["revalidations"] == 0
+
+    def test_cassette(self):
+        """What was recorded replays without the network, credentials left out"""
+        with foursquare.CassetteTransport(
+            self.cassette, mode=u"record", transport=foursquare.Transport()
+        ) as transport:
+            recorded = self._calls(self.mock_api(transport=transport))
+        with gzip.open(self.cassette, "rb") as f:
+            assert b"MOCKACCESSTOKEN" not in f.read()
+        with foursquare.CassetteTransport(self.cassette) as transport:
+            assert transport.transport is None
+            # Replays don't depend on the token either
+            api = foursquare.Foursquare(access_token=u"OTHERTOKEN", transport=transport)
+            assert self._calls(api) == recorded
+            with self.assertRaises(foursquare.CassetteMiss):
+                api.venues(u"unrecorded")
+
+    def test_cassette_once(self):
+        transport = foursquare.CassetteTransport(self.cassette, mode=u"once")
+        assert transport.mode == u"record"
+        transport.close()
+        assert (
+            foursquare.CassetteTransport(self.cassette, mode=u"once").mode == u"replay"
+        )
+
+    def test_cassette_errors(self):
+        """Injected errors come from a seeded generator, so runs repeat exactly"""
+        with foursquare.CassetteTransport(self.cassette, mode=u"record") as transport:
+            self.mock_api(transport=transport).venues(self.default_venueid)
+        outcomes = list()
+        for _ in range(2):
+            transport = foursquare.CassetteTransport(
+                self.cassette, error_rate=0.5, errors=(503,), seed=7
+            )
+            api = self.mock_api(
+                transport=transport, retry_policy=foursquare.RetryPolicy(max_attempts=1)
+            )
+            run = list()
+            for _ in range(20):
+                try:
+                    run.append(api.venues(self.default_venueid)["venue"]["id"])
+                except foursquare.ServerError as e:
+                    assert e.status_code == 503
+                    run.append(None)
+            outcomes.append(run)
+        assert outcomes[0] == outcomes[1]
+        assert 0 < outcomes[0].count(None) < 20
+
+    def test_benchmarks(self):
+        """The benchmark runner records a cassette once, then replays it"""
+        scenarios = [u"single_get", u"multi_batch", u"urlencode"]
+        for _ in range(2):
+            report = runner.run(scenarios, scale=0.01, cassette=self.cassette)
+            assert [r["name"] for r in report["results"]] == scenarios
+            for result in report["results"]:
+                assert result["calls_per_sec"] > 0
+                assert result["p50_ms"] <= result["p99_ms"]
+        output = os.path.join(self.directory, u"report.json")
+        runner.main([u"single_get", u"--scale", u"0.01", u"--output", output])
+        with open(output) as f:
+            assert json.load(f)["results"][0]["name"] == u"single_get"
+        # The runner puts back the endpoint it found
+        assert foursquare.API_ENDPOINT == self.server.api_endpoint
+
+    def test_shared_transport(self):
+        """Clients for different tokens send over one pooled connection"""
+        default = [
+            foursquare.Foursquare(access_token=u"MOCKTOKEN{0}".format(i))
+            for i in range(3)
+        ]
+        assert all(
+            api.base_requester.transport is foursquare.default_transport()
+            and api.oauth.transport is foursquare.default_transport()
+            for api in default
+        )
+        transport = foursquare.Transport()
+        try:
+            clients = [
+                foursquare.Foursquare(
+                    access_token=u"MOCKTOKEN{0}".format(i), transport=transport
+                )
+                for i in range(3)
+            ]
+            for _ in range(2):
+                for api in clients:
+                    api.venues(self.default_venueid)
+            pools = transport.session.get_adapter(
+                foursquare.API_ENDPOINT
+            ).poolmanager.pools
+            assert [pools[key].num_connections for key in pools.keys()] == [1]
+        finally:
+            transport.close()
+
+    def test_cookies(self):
+        """A cookie set on one client's response is never sent by another"""
+        transport = foursquare.Transport()
+        try:
+            self.mock_api(transport=transport).base_requester.GET("/cookies/set")
+            other = foursquare.Foursquare(
+                access_token=u"OTHERTOKEN", transport=transport
+            )
+            assert "Cookie" not in other.base_requester.GET("/echo")["headers"]
+            assert len(transport.session.cookies) == 0
+        finally:
+            transport.close()
+        # A session passed in is the caller's, cookie policy included
+        transport = foursquare.Transport(session=requests.Session())
+        try:
+            self.mock_api(transport=transport).base_requester.GET("/cookies/set")
+            headers = self.mock_api(transport=transport).base_requester.GET("/echo")[
+                "headers"
+            ]
+            assert headers["Cookie"] == u"mock_session=MOCKSESSION"
+        finally:
+            transport.close()
+
+    def test_single_flight(self):
+        """Concurrent identical GETs make one request, and each gets its own copy"""
+        histogram = foursquare.HistogramObserver()
+        api = self.mock_api(single_flight=True, observers=[histogram])
+        requester = api.base_requester
+        release = threading.Event()
+        fetch = requester._fetch
+
+        def held_fetch(*args):
+            # Keep the first call in flight until every other thread has joined it
+            release.wait(10)
+            return fetch(*args)
+
+        requester._fetch = held_fetch
+        responses = [None] * 5
+
+        def get(index):
+            responses[index] = api.venues(self.default_venueid)
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        deadline = time.time() + 10
+        while api.single_flight.stats()["collapsed"] < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert api.single_flight.stats() == {"collapsed": 4, "in_flight": 0}
+        assert histogram.snapshot()[u"GET /venues"]["count"] == 1
+        assert all(r == responses[0] for r in responses)
+        # A caller mutating its response leaves everyone else's alone
+        responses[0]["venue"]["name"] = u"Changed"
+        assert [r["venue"]["name"] for r in responses[1:]] == [
+            u"Mock Venue {0}".format(self.default_venueid)
+        ] * 4
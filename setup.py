@@ -23,11 +23,15 @@ setuptools.setup(
         "Natural Language :: English",
         "Operating System :: OS Independent",
         "Programming Language :: Python",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "Topic :: Internet :: WWW/HTTP :: Dynamic Content",
         "License :: OSI Approved :: MIT License",
     ],
     packages=setuptools.find_packages(),
+    python_requires=">=3.7",
     install_requires=["requests>=2.1", "six"],
+    extras_require={"async": ["aiohttp>=3.3"], "stream": ["ijson>=3.1"]},
     license="MIT License",
     keywords="foursquare api",
     include_package_data=True,